@@ -7,6 +7,8 @@ import hashlib
 from typing import Any, Dict, Optional
 from datetime import datetime, timedelta
 
+from utils.durable_write import atomic_write
+
 class CacheManager:
     """
     Manages caching of data to reduce API calls and improve performance.
@@ -74,19 +76,15 @@ class CacheManager:
         cache_file = self._get_cache_file_path(key)
         
         try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-            
             # Create metadata
             metadata = {
                 'created_at': datetime.now(),
                 'key': key
             }
             
-            # Write to cache file
-            with open(cache_file, 'wb') as f:
-                pickle.dump(metadata, f)
-                pickle.dump(value, f)
+            # Replace the cache file atomically so readers never see a partial
+            # entry (no fsync: losing a cache entry on power loss is harmless)
+            atomic_write(cache_file, pickle.dumps(metadata) + pickle.dumps(value), fsync=False)
                 
             return True
         except Exception as e:
@@ -7,6 +7,8 @@ from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 import pickle
 
+from utils.durable_write import atomic_write, atomic_write_json
+
 class CacheManager:
     """
     Manages caching of market data to reduce API calls and speed up responses.
@@ -101,19 +103,18 @@ class CacheManager:
             "_timestamp": timestamp
         }
         
-        # Write to disk
+        # Write to disk, replacing files atomically so readers never see a
+        # partial entry (no fsync: losing a cache entry on power loss is harmless)
         if use_pickle:
             cache_path = os.path.join(self.cache_dir, f"{key}.pickle")
             try:
-                with open(cache_path, 'wb') as f:
-                    pickle.dump(cache_data, f)
+                atomic_write(cache_path, pickle.dumps(cache_data), fsync=False)
             except Exception as e:
                 print(f"Error writing pickle cache for {key}: {e}")
         else:
             cache_path = os.path.join(self.cache_dir, f"{key}.json")
             try:
-                with open(cache_path, 'w') as f:
-                    json.dump(cache_data, f, indent=2)
+                atomic_write_json(cache_path, cache_data, fsync=False, indent=2)
             except Exception as e:
                 print(f"Error writing JSON cache for {key}: {e}")
     
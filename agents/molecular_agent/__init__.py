@@ -1,5 +1,14 @@
 # agents/molecular_agent/__init__.py
 
-from agents.molecular_agent.txgemma_agent import molecular_agent_executor
 
-__all__ = ["molecular_agent_executor"]
\ No newline at end of file
+def __getattr__(name):
+    # Building the executor needs credentials and starts the memory manager,
+    # so it's deferred until first use; that keeps light submodules (the
+    # client, batcher and local stand-in server) importable on their own
+    if name == "molecular_agent_executor":
+        from agents.molecular_agent.txgemma_agent import molecular_agent_executor
+        return molecular_agent_executor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["molecular_agent_executor"]
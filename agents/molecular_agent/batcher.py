@@ -0,0 +1,194 @@
+# agents/molecular_agent/batcher.py
+
+from typing import Dict, Any, List, Optional, Tuple
+import os
+import json
+import asyncio
+import threading
+
+import httpx
+
+from agents.molecular_agent.txgemma_client import TxGemmaClient, get_txgemma_client
+from utils.metrics import metrics
+from utils.usage_tracker import estimate_tokens
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent TxGemma completions into batched requests.
+
+    Requests with identical parameters (everything except the prompt) are
+    held for up to max_wait_ms, or until max_batch_size have gathered, then
+    sent as a single completions call with a list of prompts. vLLM schedules
+    the whole batch together, and each caller gets back its own choice, with
+    its share of the batch's reported usage. If the endpoint rejects a batch
+    (a 4xx, typically caused by one bad prompt), its prompts are resent one
+    by one so only the offending request fails. All batching state lives on
+    the client's event loop, so no locks are needed.
+    """
+
+    def __init__(self, client: TxGemmaClient, max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        """
+        Initialize the micro-batcher.
+
+        Args:
+            client (TxGemmaClient): Pooled client used to send batches
+            max_batch_size (int): Maximum prompts per batch request
+            max_wait_ms (float): Longest a request waits for others to join its batch
+        """
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # Parameter key -> pending (prompt, future) pairs and the timer that flushes them
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def submit(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a completion request and wait for its result.
+
+        Must run on the client's event loop (see complete_sync for other callers).
+
+        Args:
+            request_data (Dict[str, Any]): Completions request with a single string prompt
+
+        Returns:
+            Dict[str, Any]: A completions response containing only this request's choice
+        """
+        params = {k: v for k, v in request_data.items() if k != "prompt"}
+        key = json.dumps(params, sort_keys=True)
+        future = self.client.loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((request_data["prompt"], future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key, params)
+        elif key not in self._timers:
+            self._timers[key] = self.client.loop.call_later(self.max_wait, self._flush, key, params)
+
+        return await future
+
+    def complete_sync(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Blocking wrapper around submit() for synchronous callers."""
+        return asyncio.run_coroutine_threadsafe(self.submit(request_data), self.client.loop).result()
+
+    def _flush(self, key: str, params: Dict[str, Any]) -> None:
+        """Send everything pending for a parameter key as one request."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            self.client.loop.create_task(self._send_batch(params, batch))
+
+    async def _send_batch(self, params: Dict[str, Any], batch: List[Tuple[str, asyncio.Future]]) -> None:
+        prompts = [prompt for prompt, _ in batch]
+        metrics.increment("txgemma_batches_sent")
+        metrics.increment("txgemma_batched_prompts", len(prompts))
+
+        # A lone prompt is sent as a plain string, exactly as without batching
+        body = dict(params, prompt=prompts if len(prompts) > 1 else prompts[0])
+
+        try:
+            response = await self.client.complete(body)
+        except httpx.HTTPStatusError as e:
+            if len(batch) > 1 and e.response.status_code < 500:
+                # Isolate the prompt the endpoint rejected
+                metrics.increment("txgemma_batches_split")
+                await asyncio.gather(*(self._send_batch(params, [entry]) for entry in batch))
+            else:
+                _fail(batch, e)
+            return
+        except Exception as e:
+            # The endpoint is down or unreachable (the client already retried)
+            _fail(batch, e)
+            return
+
+        # Completions choices carry the index of the prompt they answer
+        choices_by_index = {choice.get("index", i): choice for i, choice in enumerate(response.get("choices", []))}
+        usages = _split_usage(response.get("usage"), prompts, [choices_by_index.get(i) for i in range(len(batch))])
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            choice = choices_by_index.get(i)
+            if choice is None:
+                future.set_exception(RuntimeError(f"TxGemma batch response is missing choice {i}"))
+                continue
+            result = {
+                "id": response.get("id"),
+                "object": response.get("object", "text_completion"),
+                "created": response.get("created"),
+                "model": response.get("model"),
+                "choices": [dict(choice, index=0)]
+            }
+            if usages is not None:
+                result["usage"] = usages[i]
+            future.set_result(result)
+
+
+def _fail(batch: List[Tuple[str, asyncio.Future]], error: Exception) -> None:
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
+
+def _split_usage(usage: Optional[Dict[str, Any]], prompts: List[str],
+                 choices: List[Optional[Dict[str, Any]]]) -> Optional[List[Dict[str, int]]]:
+    """
+    Divide a batch's reported usage among its prompts.
+
+    The completions API reports usage for the whole request, so prompt
+    tokens are split in proportion to each prompt's length and completion
+    tokens in proportion to each choice's text; the parts add up exactly to
+    the reported totals.
+
+    Returns:
+        Optional[List[Dict[str, int]]]: Usage per prompt, or None when the response has none
+    """
+    if not usage:
+        return None
+    prompt_tokens = _apportion(usage.get("prompt_tokens", 0), [estimate_tokens(p) for p in prompts])
+    completion_tokens = _apportion(usage.get("completion_tokens", 0),
+                                   [estimate_tokens((c or {}).get("text", "")) for c in choices])
+    return [
+        {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+        for p, c in zip(prompt_tokens, completion_tokens)
+    ]
+
+
+def _apportion(total: int, weights: List[int]) -> List[int]:
+    """Split an integer total by weight (largest remainder), summing exactly to total."""
+    if sum(weights) == 0:
+        weights = [1] * len(weights)
+    weight_sum = sum(weights)
+    shares = [total * w / weight_sum for w in weights]
+    parts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - parts[i], reverse=True)
+    for i in by_remainder[:total - sum(parts)]:
+        parts[i] += 1
+    return parts
+
+
+_batchers: Dict[str, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_micro_batcher(base_url: str, api_key: Optional[str] = None) -> Optional[MicroBatcher]:
+    """
+    Get the shared micro-batcher for an endpoint, or None when batching is disabled.
+
+    Configured through TXGEMMA_BATCHING, TXGEMMA_MAX_BATCH_SIZE and TXGEMMA_BATCH_WAIT_MS.
+    """
+    if os.getenv("TXGEMMA_BATCHING", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    with _batchers_lock:
+        if base_url not in _batchers:
+            _batchers[base_url] = MicroBatcher(
+                get_txgemma_client(base_url, api_key),
+                max_batch_size=int(os.getenv("TXGEMMA_MAX_BATCH_SIZE", "8")),
+                max_wait_ms=float(os.getenv("TXGEMMA_BATCH_WAIT_MS", "5"))
+            )
+        return _batchers[base_url]
@@ -0,0 +1,286 @@
+# agents/molecular_agent/local_server.py
+
+"""
+Local stand-in for the TxGemma serving endpoint.
+
+Speaks the subset of the vLLM OpenAI-compatible API the molecular agent
+uses (POST /v1/completions with string or list prompts, streaming, usage),
+with latency shaped by a profile: time to first token, then a steady token
+rate. A batched request pays the first-token latency once and decodes its
+prompts side by side, as vLLM does, so batching and streaming behave
+realistically without a cloud endpoint.
+
+Run it as a subprocess:
+
+    python -m agents.molecular_agent.local_server --port 8900 --profile realistic
+
+and point the agent at it:
+
+    TXGEMMA_USE_LIVE_API=true TXGEMMA_API_BASE=http://127.0.0.1:8900/v1
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+
+# Latency profiles: time to first token (ms), decode rate (tokens/s) and relative jitter
+PROFILES = {
+    "instant": {"ttft_ms": 0, "tokens_per_second": 0, "jitter": 0.0},
+    "fast": {"ttft_ms": 50, "tokens_per_second": 400, "jitter": 0.1},
+    "realistic": {"ttft_ms": 350, "tokens_per_second": 45, "jitter": 0.2},
+    "slow": {"ttft_ms": 1500, "tokens_per_second": 15, "jitter": 0.3},
+}
+
+_VOCABULARY = (
+    "the molecule binds target protein with high affinity through hydrogen bonding and "
+    "hydrophobic interactions in the active site which may modulate downstream signaling "
+    "pathways while its solubility permeability and metabolic stability suggest favorable "
+    "pharmacokinetic properties for further optimization"
+).split()
+
+
+class StandInConfig:
+    """Behaviour of a stand-in server."""
+
+    def __init__(self, profile: str = "fast", model: str = "txgemma-latest", output_tokens: int = 64,
+                 error_rate: float = 0.0, max_concurrent_sequences: int = 64):
+        """
+        Initialize the server configuration.
+
+        Args:
+            profile (str): Name of a latency profile in PROFILES
+            model (str): Model name reported in responses
+            output_tokens (int): Tokens generated per prompt, capped by the request's max_tokens
+            error_rate (float): Fraction of requests answered with 503, for resilience testing
+            max_concurrent_sequences (int): Sequences decoded at once; further requests queue, like a saturated GPU
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile '{profile}'. Choose from: {', '.join(PROFILES)}")
+        self.profile = profile
+        self.model = model
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.max_concurrent_sequences = max_concurrent_sequences
+        self.free_slots = max_concurrent_sequences
+        self._slots_changed = threading.Condition()
+
+    def acquire_slots(self, n: int) -> int:
+        """
+        Wait for n sequence slots and take them together.
+
+        Taking a batch's slots one at a time would let two batches each hold
+        part of what they need and wait on each other forever.
+
+        Returns:
+            int: Slots taken (n, capped at the server's total)
+        """
+        n = min(n, self.max_concurrent_sequences)
+        with self._slots_changed:
+            self._slots_changed.wait_for(lambda: self.free_slots >= n)
+            self.free_slots -= n
+        return n
+
+    def release_slots(self, n: int) -> None:
+        with self._slots_changed:
+            self.free_slots += n
+            self._slots_changed.notify_all()
+
+    def delay(self, seconds: float) -> None:
+        """Sleep for a profile delay, with jitter."""
+        jitter = PROFILES[self.profile]["jitter"]
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - jitter, 1 + jitter))
+
+    def ttft(self) -> float:
+        return PROFILES[self.profile]["ttft_ms"] / 1000.0
+
+    def token_interval(self) -> float:
+        rate = PROFILES[self.profile]["tokens_per_second"]
+        return 1.0 / rate if rate else 0.0
+
+
+def generate_tokens(prompt: str, count: int) -> List[str]:
+    """Deterministic pseudo-completion for a prompt, one word per token."""
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    return [rng.choice(_VOCABULARY) + " " for _ in range(count)]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the completions API."""
+
+    protocol_version = "HTTP/1.1"
+    config: StandInConfig = None
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok", "profile": self.config.profile})
+        elif self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": self.config.model, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Request body is not valid JSON"}})
+            return
+
+        prompt = body.get("prompt")
+        prompts = prompt if isinstance(prompt, list) else [prompt]
+        if not prompts or not all(isinstance(p, str) for p in prompts):
+            self._send_json(400, {"error": {"message": "prompt must be a string or a list of strings"}})
+            return
+
+        if random.random() < self.config.error_rate:
+            self._send_json(503, {"error": {"message": "Injected failure"}}, headers={"Retry-After": "0"})
+            return
+
+        count = min(int(body.get("max_tokens") or self.config.output_tokens), self.config.output_tokens)
+        completions = [generate_tokens(p, count) for p in prompts]
+
+        # Each prompt occupies one sequence slot for the whole generation
+        acquired = self.config.acquire_slots(len(prompts))
+        try:
+            self.config.delay(self.config.ttft())
+            if body.get("stream"):
+                self._stream(completions)
+            else:
+                self.config.delay(self.config.token_interval() * count)
+                self._send_json(200, self._completion_response(prompts, completions))
+        finally:
+            self.config.release_slots(acquired)
+
+    def _completion_response(self, prompts: List[str], completions: List[List[str]]) -> Dict[str, Any]:
+        prompt_tokens = sum(max(1, len(p) // 4) for p in prompts)
+        completion_tokens = sum(len(c) for c in completions)
+        return {
+            "id": f"cmpl-{uuid.uuid4().hex[:12]}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": self.config.model,
+            "choices": [
+                {"text": "".join(tokens).strip(), "index": i, "finish_reason": "length"}
+                for i, tokens in enumerate(completions)
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def _stream(self, completions: List[List[str]]) -> None:
+        """Send server-sent events, one chunk per token step across all prompts."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        completion_id = f"cmpl-{uuid.uuid4().hex[:12]}"
+        steps = max((len(c) for c in completions), default=0)
+        try:
+            for step in range(steps):
+                for i, tokens in enumerate(completions):
+                    if step < len(tokens):
+                        self._write_event({
+                            "id": completion_id,
+                            "object": "text_completion",
+                            "created": int(time.time()),
+                            "model": self.config.model,
+                            "choices": [{"text": tokens[step], "index": i, "finish_reason": None}]
+                        })
+                self.config.delay(self.config.token_interval())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream
+            self.close_connection = True
+
+    def _write_event(self, payload: Dict[str, Any]) -> None:
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _make_server(host: str, port: int, config: StandInConfig) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_local_server(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start a stand-in server on a background thread.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free port
+        **config: StandInConfig options (profile, model, output_tokens, error_rate, max_concurrent_sequences)
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server (call shutdown() when done) and its API base URL
+    """
+    server = _make_server(host, port, StandInConfig(**config))
+    threading.Thread(target=server.serve_forever, name="txgemma-stand-in", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in TxGemma completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--profile", default="fast", choices=sorted(PROFILES))
+    parser.add_argument("--model", default="txgemma-latest")
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrent-sequences", type=int, default=64)
+    args = parser.parse_args()
+
+    server = _make_server(args.host, args.port, StandInConfig(
+        profile=args.profile,
+        model=args.model,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        max_concurrent_sequences=args.max_concurrent_sequences
+    ))
+    print(f"TxGemma stand-in serving http://{args.host}:{args.port}/v1 (profile: {args.profile})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
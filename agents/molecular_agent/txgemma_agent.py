@@ -1,9 +1,61 @@
 # agents/molecular_agent/txgemma_agent.py
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Iterator
 import os
-import requests
+import re
+import time
 import json
+import hashlib
+import atexit
+import threading
+from collections import deque
+
+from utils.usage_tracker import usage_tracker, estimate_tokens
+from utils.semantic_cache import get_semantic_cache
+from agents.molecular_agent.txgemma_client import get_txgemma_client
+from agents.molecular_agent.batcher import get_micro_batcher
+
+DEFAULT_API_BASE_URL = "https://api.txgemma.google.com/v1"
+
+# Keywords used to classify queries by domain
+CHEMISTRY_KEYWORDS = [
+    "solubility", "reaction", "synthesis", "molecule", "compound",
+    "chemical", "formulation", "acid", "base", "pH", "catalyst"
+]
+
+BIOLOGY_KEYWORDS = [
+    "crispr", "genome", "dna", "rna", "protein", "cell", "enzyme",
+    "receptor", "antibody", "binding", "inhibitor", "pathway"
+]
+
+_DOMAIN_TERMS = {
+    **{keyword.lower(): ("chemistry", keyword) for keyword in CHEMISTRY_KEYWORDS},
+    **{keyword.lower(): ("biology", keyword) for keyword in BIOLOGY_KEYWORDS},
+}
+
+# One alternation over every keyword, longest first, matched on word boundaries
+# so "base" no longer matches "database" or "cell" "cellular"; plurals still count
+_DOMAIN_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(term) for term in sorted(_DOMAIN_TERMS, key=len, reverse=True)) + r")(?:e?s)?\b",
+    re.IGNORECASE
+)
+
+
+def find_domain_terms(query: str) -> List[Dict[str, Any]]:
+    """
+    Find chemistry and biology keywords in a query in a single scan.
+    
+    Args:
+        query: The query text
+        
+    Returns:
+        One hit per match, in order: {"term", "domain", "start", "end"}
+    """
+    hits = []
+    for match in _DOMAIN_PATTERN.finditer(query):
+        domain, term = _DOMAIN_TERMS[match.group(1).lower()]
+        hits.append({"term": term, "domain": domain, "start": match.start(), "end": match.end()})
+    return hits
 
 class TxGemmaAgent:
     """
@@ -12,26 +64,49 @@ class TxGemmaAgent:
     molecular structures, reactions, and biological mechanisms.
     """
     
-    def __init__(self, api_key: Optional[str] = None, model_version: str = "latest"):
+    def __init__(self, api_key: Optional[str] = None, model_version: str = "latest",
+                 api_base_url: Optional[str] = None, memory_manager: Optional[Any] = None):
         """
         Initialize the TxGemma agent.
         
         Args:
             api_key: API key for TxGemma. If None, will attempt to read from environment.
             model_version: Version of TxGemma to use.
+            api_base_url: Base URL of the completions API. If None, reads TXGEMMA_API_BASE
+                or uses the hosted endpoint.
+            memory_manager: Memory store that knowledge is restored from and persisted to.
+                If None, the global memory manager is used.
         """
         self.api_key = api_key or os.getenv("TXGEMMA_API_KEY")
-        if not self.api_key:
-            raise ValueError("TxGemma API key not found. Please provide it or set TXGEMMA_API_KEY env variable.")
         
         self.model_version = model_version
-        self.api_base_url = "https://api.txgemma.google.com/v1"
+        # TXGEMMA_API_BASE points the agent at another endpoint, e.g. the local stand-in server
+        self.api_base_url = api_base_url or os.getenv("TXGEMMA_API_BASE", DEFAULT_API_BASE_URL)
         
-        # Initialize memory structures
+        # Development uses simulated completions unless the live API is enabled
+        self.use_live_api = os.getenv("TXGEMMA_USE_LIVE_API", "false").lower() == "true"
+        
+        # Only the hosted endpoint needs credentials; local and self-hosted servers may not
+        if not self.api_key and self.api_base_url == DEFAULT_API_BASE_URL:
+            raise ValueError("TxGemma API key not found. Please provide it or set TXGEMMA_API_KEY env variable.")
+        
+        # Initialize memory structures: a ring buffer of recent queries and
+        # bounded, deduplicated knowledge lists (with content hashes per key)
+        self.max_knowledge_items = int(os.getenv("MOLECULAR_MEMORY_MAX_ITEMS", "500"))
+        self.memory_persist_interval = float(os.getenv("MOLECULAR_MEMORY_PERSIST_INTERVAL", "30"))
         self.memory = {
-            "recent_queries": [],
+            "recent_queries": deque(maxlen=10),
             "molecular_knowledge": {},
         }
+        self._knowledge_hashes: Dict[str, set] = {}
+        self._memory_lock = threading.Lock()
+        self._memory_dirty = False
+        self._last_persist = time.time()
+        self._memory_manager = memory_manager
+        
+        # Knowledge survives restarts through the central memory store
+        self._restore_memory()
+        atexit.register(self.persist_memory)
     
     def invoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -48,20 +123,12 @@ class TxGemmaAgent:
         query = inputs.get("input", "")
         context = inputs.get("context", {})
         
-        # Add domain-specific context for molecular queries
-        domain_context = self._determine_domain_context(query)
-        
         # Prepare the request to TxGemma API
-        request_data = {
-            "model": f"txgemma-{self.model_version}",
-            "prompt": self._format_query(query, domain_context, context),
-            "temperature": 0.2,
-            "max_tokens": 1024
-        }
+        request_data = self._build_request(query, context)
         
         # Call TxGemma API
         try:
-            response = self._call_txgemma_api(request_data)
+            response = self._cached_call(query, context, request_data)
             
             # Extract and process the response
             processed_response = self._process_response(response, query)
@@ -69,19 +136,77 @@ class TxGemmaAgent:
             # Update memory with this interaction
             self._update_memory(query, processed_response)
             
+            return self._build_result(processed_response)
+            
+        except Exception as e:
             return {
-                "response": processed_response.get("text", ""),
-                "molecular_insights": processed_response.get("molecular_insights", {}),
-                "confidence": processed_response.get("confidence", 0.0),
-                "memory_updates": processed_response.get("memory_updates", {})
+                "response": f"Error processing molecular query: {str(e)}",
+                "error": str(e)
             }
+    
+    def stream(self, inputs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Process a molecular query, yielding completion tokens as they arrive.
+        
+        Args:
+            inputs: Dictionary containing input query and context
+                - input (str): The query to process
+                - context (Optional[Dict]): Additional context
+                
+        Yields:
+            {"type": "token", "text": ...} for each streamed chunk, then one
+            {"type": "final", ...} event carrying the same fields as invoke()
+        """
+        query = inputs.get("input", "")
+        context = inputs.get("context", {})
+        
+        request_data = self._build_request(query, context)
+        request_data["stream"] = True
+        
+        try:
+            start_time = time.time()
+            chunks = []
+            for text in self._stream_txgemma_api(request_data):
+                chunks.append(text)
+                yield {"type": "token", "text": text}
+            
+            # Reassemble the completion so the normal post-processing applies
+            response = {"choices": [{"text": "".join(chunks), "index": 0, "finish_reason": "stop"}]}
+            self._record_usage(request_data, response, time.time() - start_time)
+            
+            processed_response = self._process_response(response, query)
+            self._update_memory(query, processed_response)
+            
+            yield {"type": "final", **self._build_result(processed_response)}
             
         except Exception as e:
-            return {
+            yield {
+                "type": "final",
                 "response": f"Error processing molecular query: {str(e)}",
                 "error": str(e)
             }
     
+    def _build_request(self, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the completion request for a query."""
+        # Add domain-specific context for molecular queries
+        domain_context = self._determine_domain_context(query)
+        
+        return {
+            "model": f"txgemma-{self.model_version}",
+            "prompt": self._format_query(query, domain_context, context),
+            "temperature": 0.2,
+            "max_tokens": 1024
+        }
+    
+    def _build_result(self, processed_response: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a processed response into the agent's public result."""
+        return {
+            "response": processed_response.get("text", ""),
+            "molecular_insights": processed_response.get("molecular_insights", {}),
+            "confidence": processed_response.get("confidence", 0.0),
+            "memory_updates": processed_response.get("memory_updates", {})
+        }
+    
     def _format_query(self, query: str, domain_context: Dict[str, Any], user_context: Dict[str, Any]) -> str:
         """Format the query with appropriate context for TxGemma."""
         # Create a structured prompt that guides TxGemma to provide
@@ -110,67 +235,54 @@ class TxGemmaAgent:
     
     def _determine_domain_context(self, query: str) -> Dict[str, Any]:
         """Determine if the query is more chemistry or biology focused."""
-        # Simple keyword-based classification - could be enhanced with embeddings
-        chemistry_keywords = [
-            "solubility", "reaction", "synthesis", "molecule", "compound", 
-            "chemical", "formulation", "acid", "base", "pH", "catalyst"
-        ]
-        
-        biology_keywords = [
-            "crispr", "genome", "dna", "rna", "protein", "cell", "enzyme",
-            "receptor", "antibody", "binding", "inhibitor", "pathway"
-        ]
+        # Single pass of the compiled keyword matcher - could be enhanced with embeddings
+        hits = find_domain_terms(query)
         
-        # Count occurrences of domain-specific keywords
-        chem_count = sum(1 for word in chemistry_keywords if word.lower() in query.lower())
-        bio_count = sum(1 for word in biology_keywords if word.lower() in query.lower())
+        # Count distinct domain-specific keywords
+        chem_count = len({hit["term"] for hit in hits if hit["domain"] == "chemistry"})
+        bio_count = len({hit["term"] for hit in hits if hit["domain"] == "biology"})
         
         # Determine primary domain while including context from both
         if chem_count > bio_count:
             return {
                 "primary_domain": "chemistry",
                 "secondary_domain": "biology" if bio_count > 0 else None,
-                "relevant_chemistry_concepts": self._extract_chemistry_concepts(query),
+                "relevant_chemistry_concepts": self._extract_chemistry_concepts(query, hits),
                 "provide_chemical_structures": True
             }
         else:
             return {
                 "primary_domain": "biology",
                 "secondary_domain": "chemistry" if chem_count > 0 else None,
-                "relevant_biology_concepts": self._extract_biology_concepts(query),
+                "relevant_biology_concepts": self._extract_biology_concepts(query, hits),
                 "consider_molecular_mechanisms": True
             }
     
-    def _extract_chemistry_concepts(self, query: str) -> list:
-        """Extract chemistry concepts from the query - would be enhanced in production."""
-        # Placeholder for a more sophisticated concept extraction system
-        return []
+    def _extract_chemistry_concepts(self, query: str, hits: Optional[List[Dict[str, Any]]] = None) -> list:
+        """Extract chemistry concepts from the query, in order of first mention."""
+        return self._concepts(query, "chemistry", hits)
     
-    def _extract_biology_concepts(self, query: str) -> list:
-        """Extract biology concepts from the query - would be enhanced in production."""
-        # Placeholder for a more sophisticated concept extraction system
-        return []
+    def _extract_biology_concepts(self, query: str, hits: Optional[List[Dict[str, Any]]] = None) -> list:
+        """Extract biology concepts from the query, in order of first mention."""
+        return self._concepts(query, "biology", hits)
+    
+    def _concepts(self, query: str, domain: str, hits: Optional[List[Dict[str, Any]]]) -> list:
+        if hits is None:
+            hits = find_domain_terms(query)
+        concepts = []
+        for hit in hits:
+            if hit["domain"] == domain and hit["term"] not in concepts:
+                concepts.append(hit["term"])
+        return concepts
     
     def _call_txgemma_api(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Make the actual API call to TxGemma."""
-        # This is a placeholder for the actual API call implementation
-        # In production, this would use the appropriate API client library or REST calls
-        
-        # Simulated API call for development purposes
-        # In production, replace with actual API call:
-        """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(
-            f"{self.api_base_url}/completions",
-            headers=headers,
-            json=request_data
-        )
-        response.raise_for_status()
-        return response.json()
-        """
+        if self.use_live_api:
+            # Concurrent requests are coalesced into one batched completions call
+            batcher = get_micro_batcher(self.api_base_url, self.api_key)
+            if batcher is not None:
+                return batcher.complete_sync(request_data)
+            return self._client().complete_sync(request_data)
         
         # Simulated response for development
         return {
@@ -185,6 +297,62 @@ class TxGemmaAgent:
             }]
         }
     
+    def _stream_txgemma_api(self, request_data: Dict[str, Any]) -> Iterator[str]:
+        """Stream a completion from TxGemma, yielding text chunks as they arrive."""
+        if not self.use_live_api:
+            # Simulated stream for development: replay the simulated completion word by word
+            text = self._call_txgemma_api(request_data)["choices"][0]["text"]
+            for word in text.split(" "):
+                yield word + " "
+            return
+        
+        # The vLLM serving container speaks the OpenAI server-sent events format
+        yield from self._client().stream_sync(request_data)
+    
+    def _client(self):
+        """Shared pooled client for this agent's endpoint."""
+        return get_txgemma_client(self.api_base_url, self.api_key)
+    
+    def _cached_call(self, query: str, context: Dict[str, Any], request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Call TxGemma, serving repeated queries from the response cache."""
+        # Exact matches only: queries differing by one compound or atom look
+        # alike to an embedder but have different answers
+        cache = get_semantic_cache("txgemma", semantic=False)
+        
+        # Only the free-text query may vary; everything else in the request must match exactly
+        scope = hashlib.sha256(json.dumps({
+            "model": request_data["model"],
+            "temperature": request_data["temperature"],
+            "max_tokens": request_data["max_tokens"],
+            "context": context
+        }, sort_keys=True, default=str).encode()).hexdigest()
+        
+        if cache is not None:
+            cached_response = cache.lookup(query, scope=scope)
+            if cached_response is not None:
+                return cached_response
+        
+        start_time = time.time()
+        response = self._call_txgemma_api(request_data)
+        self._record_usage(request_data, response, time.time() - start_time)
+        
+        if cache is not None:
+            cache.store(query, response, scope=scope)
+        return response
+    
+    def _record_usage(self, request_data: Dict[str, Any], api_response: Dict[str, Any], latency: float) -> None:
+        """Record token usage for a completion, estimating it when the API doesn't report it."""
+        usage = api_response.get("usage")
+        if usage:
+            usage_tracker.record("molecular_agent", request_data["model"],
+                                 usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), latency)
+            return
+        
+        completion_text = "".join(choice.get("text", "") for choice in api_response.get("choices", []))
+        usage_tracker.record("molecular_agent", request_data["model"],
+                             estimate_tokens(request_data["prompt"]), estimate_tokens(completion_text),
+                             latency, estimated=True)
+    
     def _process_response(self, api_response: Dict[str, Any], original_query: str) -> Dict[str, Any]:
         """Process and enhance the raw API response."""
         # Extract the text from the API response
@@ -203,28 +371,113 @@ class TxGemmaAgent:
     
     def _update_memory(self, query: str, processed_response: Dict[str, Any]) -> None:
         """Update the agent's memory with new information from this interaction."""
-        # Add query to recent queries
-        self.memory["recent_queries"].append({
-            "query": query,
-            "timestamp": time.time(),
-            "response_summary": processed_response["text"][:100] + "..."
-        })
-        
-        # Limit recent queries to last 10
-        self.memory["recent_queries"] = self.memory["recent_queries"][-10:]
-        
-        # Update molecular knowledge with any new insights
-        if "memory_updates" in processed_response and processed_response["memory_updates"]:
-            for key, value in processed_response["memory_updates"].items():
-                if key not in self.memory["molecular_knowledge"]:
-                    self.memory["molecular_knowledge"][key] = []
-                self.memory["molecular_knowledge"][key].append(value)
-
-# Create an instance of the TxGemma agent
-molecular_agent_executor = TxGemmaAgent()
+        with self._memory_lock:
+            # Add query to recent queries; the deque keeps only the last 10
+            self.memory["recent_queries"].append({
+                "query": query,
+                "timestamp": time.time(),
+                "response_summary": processed_response["text"][:100] + "..."
+            })
+            self._memory_dirty = True
+            
+            # Update molecular knowledge with any new insights
+            if "memory_updates" in processed_response and processed_response["memory_updates"]:
+                for key, value in processed_response["memory_updates"].items():
+                    self._add_knowledge(key, value)
+        
+        if time.time() - self._last_persist >= self.memory_persist_interval:
+            self.persist_memory()
+    
+    def _add_knowledge(self, key: str, value: Any) -> bool:
+        """Add a knowledge item unless it is already known. Caller holds the memory lock."""
+        items = self.memory["molecular_knowledge"].setdefault(key, deque())
+        hashes = self._knowledge_hashes.setdefault(key, set())
+        
+        item_hash = _content_hash(value)
+        if item_hash in hashes:
+            return False
+        
+        # Drop the oldest item once the key is at capacity
+        if len(items) >= self.max_knowledge_items:
+            hashes.discard(_content_hash(items.popleft()))
+        
+        items.append(value)
+        hashes.add(item_hash)
+        self._memory_dirty = True
+        return True
+    
+    def _get_memory_manager(self):
+        """Get the memory store, defaulting to the global memory manager."""
+        if self._memory_manager is None:
+            # Imported lazily so the agent module doesn't pull in storage at import time
+            from utils.memory_manager import memory_manager
+            self._memory_manager = memory_manager
+        return self._memory_manager
+    
+    def _restore_memory(self) -> None:
+        """Load persisted recent queries and knowledge from the memory store."""
+        try:
+            memory_manager = self._get_memory_manager()
+            knowledge = memory_manager.get_agent_memory("molecular_agent", "molecular_knowledge")
+            recent = memory_manager.get_agent_memory("molecular_agent", "recent_queries")
+        except Exception as e:
+            print(f"Warning: Could not restore molecular agent memory: {e}")
+            return
+        
+        with self._memory_lock:
+            for key, values in knowledge.items():
+                for value in (values if isinstance(values, list) else [values]):
+                    self._add_knowledge(key, value)
+            self.memory["recent_queries"].extend(recent.get("queries", []))
+            self._memory_dirty = False
+    
+    def persist_memory(self) -> None:
+        """Write memory to the central memory store if it changed since the last write."""
+        with self._memory_lock:
+            self._last_persist = time.time()
+            if not self._memory_dirty:
+                return
+            knowledge = {key: list(items) for key, items in self.memory["molecular_knowledge"].items()}
+            recent = list(self.memory["recent_queries"])
+            self._memory_dirty = False
+        
+        try:
+            memory_manager = self._get_memory_manager()
+            if knowledge:
+                memory_manager.update_agent_memory("molecular_agent", "molecular_knowledge", knowledge)
+            memory_manager.update_agent_memory("molecular_agent", "recent_queries", {"queries": recent})
+        except Exception as e:
+            print(f"Error persisting molecular agent memory: {e}")
+            with self._memory_lock:
+                self._memory_dirty = True
+
+
+def _content_hash(value: Any) -> str:
+    """Stable hash of a JSON-like value, used to deduplicate knowledge items."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+_executor: Optional[TxGemmaAgent] = None
+_executor_lock = threading.Lock()
+
+
+def get_molecular_agent_executor() -> TxGemmaAgent:
+    """Get the shared TxGemma agent, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = TxGemmaAgent()
+        return _executor
+
+
+def __getattr__(name):
+    # The shared agent restores its memory from the memory store, so it's
+    # created on first use rather than whenever this module is imported
+    if name == "molecular_agent_executor":
+        return get_molecular_agent_executor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Example usage
 if __name__ == "__main__":
     test_query = "What is the mechanism of action of paclitaxel and how does it bind to tubulin?"
-    result = molecular_agent_executor.invoke({"input": test_query})
+    result = get_molecular_agent_executor().invoke({"input": test_query})
     print(f"Response: {result['response']}")
\ No newline at end of file
@@ -0,0 +1,412 @@
+# agents/molecular_agent/txgemma_client.py
+
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Callable
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import threading
+
+import httpx
+
+from utils.metrics import metrics
+
+# HTTP/2 needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Marks the end of a stream handed between event loops
+_STREAM_DONE = object()
+
+
+class CircuitOpenError(Exception):
+    """Raised when the TxGemma endpoint is failing and calls are short-circuited."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an endpoint is down.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected immediately. Once reset_timeout has passed a single trial
+    call is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            name (str): Name used in metrics
+            failure_threshold (int): Consecutive failures before opening
+            reset_timeout (float): Seconds to stay open before allowing a trial call
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._publish()
+
+    def allow_request(self) -> bool:
+        """Return whether a call may proceed."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._publish()
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Record a successful call."""
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._publish()
+
+    def record_failure(self) -> None:
+        """Record a failed call."""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.increment("txgemma_circuit_opened", labels={"endpoint": self.name})
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._publish()
+
+    def release_trial(self) -> None:
+        """Let another trial call through after one ended without an outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _publish(self) -> None:
+        # 0 = closed, 1 = half-open, 2 = open
+        value = {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[self.state]
+        metrics.set_gauge("txgemma_circuit_state", value, labels={"endpoint": self.name})
+
+
+class TxGemmaClient:
+    """
+    Pooled, keep-alive client for the TxGemma completions endpoint.
+
+    A single httpx.AsyncClient (HTTP/2 when h2 is installed) lives on a
+    dedicated event-loop thread, so every caller shares its connection pool
+    whether it is async or not; streams run there too and hand their chunks
+    back over a queue. Concurrency per endpoint is bounded by a semaphore,
+    retryable failures (429/5xx, connection errors) are retried with
+    full-jitter exponential backoff, and a circuit breaker rejects calls
+    immediately while the endpoint is down (rate limiting doesn't count).
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None,
+                 max_connections: int = 32, max_concurrency: int = 16,
+                 timeout: float = 120.0, connect_timeout: float = 5.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 http2: Optional[bool] = None):
+        """
+        Initialize the client.
+
+        Args:
+            base_url (str): Base URL of the OpenAI-compatible API (e.g. https://host/v1)
+            api_key (Optional[str]): Bearer token for the endpoint
+            max_connections (int): Size of the connection pool
+            max_concurrency (int): Maximum in-flight requests to this endpoint
+            timeout (float): Read timeout in seconds
+            connect_timeout (float): Connect timeout in seconds
+            max_retries (int): Retries after the first attempt for retryable failures
+            backoff_base (float): Base delay for exponential backoff
+            backoff_max (float): Cap on a single backoff delay
+            http2 (Optional[bool]): Use HTTP/2; defaults to TXGEMMA_HTTP2 env when h2 is installed
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        if http2 is None:
+            http2 = os.getenv("TXGEMMA_HTTP2", "true").lower() == "true"
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        self.breaker = CircuitBreaker(self.base_url)
+        self._labels = {"endpoint": self.base_url}
+        self._in_flight = 0
+
+        # Event loop thread that owns the async client and its pool
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="txgemma-client", daemon=True)
+        self._thread.start()
+        self._client = self._run(self._create_client())
+        self._semaphore = self._run(self._create_semaphore())
+
+    async def _create_client(self) -> httpx.AsyncClient:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=self.timeout,
+                                 limits=self.limits, http2=self.http2)
+
+    async def _create_semaphore(self) -> asyncio.Semaphore:
+        # Created on the client's loop so it can be awaited there
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def _run(self, coro):
+        """Run a coroutine on the client's loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def complete(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Request a completion.
+
+        Args:
+            request_data (Dict[str, Any]): OpenAI-style completions request body
+
+        Returns:
+            Dict[str, Any]: The completions response
+        """
+        # The pool and semaphore belong to the client's loop; hop over if called from another
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(self.complete(request_data), self.loop)
+            )
+        response = await self._send(request_data)
+        return response.json()
+
+    async def stream_completion(self, request_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Stream a completion, yielding text chunks as they arrive.
+
+        Only establishing the stream is retried; once tokens have been
+        yielded a failure is raised to the caller.
+
+        Args:
+            request_data (Dict[str, Any]): OpenAI-style completions request body
+
+        Yields:
+            str: Completion text chunks
+        """
+        if asyncio.get_running_loop() is self.loop:
+            async for text in self._stream(request_data):
+                yield text
+            return
+
+        # The pool and semaphore belong to the client's loop: stream there and
+        # pass the chunks back to the caller's loop
+        caller_loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        def put(item: Any) -> None:
+            try:
+                caller_loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                # The caller's loop has closed
+                pass
+
+        future = asyncio.run_coroutine_threadsafe(self._pump(request_data, put), self.loop)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Ends the stream, freeing its connection and slot, if the caller stopped early
+            future.cancel()
+
+    async def _pump(self, request_data: Dict[str, Any], put: Callable[[Any], None]) -> None:
+        """Run a stream on the client's loop, handing put each chunk, then any error, then _STREAM_DONE."""
+        try:
+            async for text in self._stream(request_data):
+                put(text)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_STREAM_DONE)
+
+    async def _stream(self, request_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a completion. Must run on the client's loop."""
+        request_data = dict(request_data, stream=True)
+        response = await self._send(request_data, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if chunk.get("choices"):
+                    text = chunk["choices"][0].get("text", "")
+                    if text:
+                        yield text
+        finally:
+            await response.aclose()
+            self._semaphore.release()
+            self._set_in_flight(-1)
+
+    async def _send(self, request_data: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """Send a request with concurrency bounding, retries and circuit breaking."""
+        if not self.breaker.allow_request():
+            metrics.increment("txgemma_client_requests", labels={**self._labels, "outcome": "short_circuited"})
+            raise CircuitOpenError(f"TxGemma endpoint {self.base_url} is unavailable (circuit open)")
+
+        outcome_recorded = False
+        release_slot = True
+        await self._semaphore.acquire()
+        self._set_in_flight(1)
+        try:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    request = self._client.build_request("POST", "/completions", json=request_data)
+                    response = await self._client.send(request, stream=stream)
+
+                    if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                        retry_after = response.headers.get("Retry-After")
+                        await response.aclose()
+                        metrics.increment("txgemma_client_retries", labels={**self._labels, "reason": str(response.status_code)})
+                    else:
+                        if response.status_code >= 400:
+                            if stream:
+                                await response.aread()
+                            # Client errors and rate limiting mean the endpoint is up;
+                            # only server errors trip the breaker
+                            if response.status_code >= 500:
+                                self.breaker.record_failure()
+                            else:
+                                self.breaker.record_success()
+                            outcome_recorded = True
+                            metrics.increment("txgemma_client_requests", labels={**self._labels, "outcome": "error"})
+                            response.raise_for_status()
+
+                        self.breaker.record_success()
+                        outcome_recorded = True
+                        metrics.increment("txgemma_client_requests", labels={**self._labels, "outcome": "success"})
+                        if stream:
+                            # The stream reader releases the slot when it finishes
+                            release_slot = False
+                        return response
+
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    if attempt >= self.max_retries:
+                        self.breaker.record_failure()
+                        outcome_recorded = True
+                        metrics.increment("txgemma_client_requests", labels={**self._labels, "outcome": "error"})
+                        raise
+                    metrics.increment("txgemma_client_retries", labels={**self._labels, "reason": type(e).__name__})
+
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        finally:
+            # Any other exit (an unexpected error, cancellation) must not leave
+            # a half-open circuit waiting forever on a trial that has ended
+            if not outcome_recorded:
+                self.breaker.release_trial()
+            if release_slot:
+                self._semaphore.release()
+                self._set_in_flight(-1)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when given."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _set_in_flight(self, delta: int) -> None:
+        self._in_flight += delta
+        metrics.set_gauge("txgemma_client_in_flight", self._in_flight, labels=self._labels)
+
+    def complete_sync(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Blocking wrapper around complete() for synchronous callers."""
+        return self._run(self.complete(request_data))
+
+    def stream_sync(self, request_data: Dict[str, Any]) -> Iterator[str]:
+        """Blocking wrapper around stream_completion() for synchronous callers."""
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._pump(request_data, chunks.put), self.loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get client state for monitoring.
+
+        Returns:
+            Dict[str, Any]: Circuit state, in-flight requests and pool configuration
+        """
+        return {
+            "endpoint": self.base_url,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "http2": self.http2
+        }
+
+    def close(self) -> None:
+        """Close the connection pool and stop the event loop thread."""
+        self._run(self._client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_clients: Dict[str, TxGemmaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_txgemma_client(base_url: str, api_key: Optional[str] = None) -> TxGemmaClient:
+    """
+    Get the shared client for an endpoint, creating it on first use.
+
+    Pool and retry settings come from TXGEMMA_MAX_CONNECTIONS,
+    TXGEMMA_MAX_CONCURRENCY, TXGEMMA_TIMEOUT and TXGEMMA_MAX_RETRIES.
+    """
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = TxGemmaClient(
+                base_url,
+                api_key=api_key,
+                max_connections=int(os.getenv("TXGEMMA_MAX_CONNECTIONS", "32")),
+                max_concurrency=int(os.getenv("TXGEMMA_MAX_CONCURRENCY", "16")),
+                timeout=float(os.getenv("TXGEMMA_TIMEOUT", "120")),
+                max_retries=int(os.getenv("TXGEMMA_MAX_RETRIES", "3"))
+            )
+        return _clients[base_url]
@@ -1,6 +1,7 @@
 # app.py
 
 import os
+import json
 import time
 import logging
 import jwt
@@ -22,19 +23,26 @@ endpoint = model.deploy(
 )
 
 # FastAPI and Web Frameworks
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # Import the router workflow
-from router.router_agent import create_copilot_app
+from router.router_agent import create_copilot_app, stream_copilot_query
 
 # Import memory manager
 from utils.memory_manager import memory_manager
 
+# Import usage accounting and metrics
+from utils.usage_tracker import usage_tracker
+from utils.metrics import metrics
+
+# Import workflow checkpoint errors
+from utils.checkpoint_store import IdempotencyConflictError
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -78,6 +86,9 @@ class QueryRequest(BaseModel):
 class SearchRequest(BaseModel):
     query: str
     limit: int = 5
+    offset: int = 0
+    # "keyword" (BM25), "semantic" (embedding similarity) or "hybrid"
+    mode: str = "keyword"
 
 # Define the response models
 class QueryResponse(BaseModel):
@@ -85,6 +96,8 @@ class QueryResponse(BaseModel):
     contributing_agents: List[str]
     agent_responses: Optional[Dict[str, str]] = None
     processing_time: Optional[float] = None
+    usage: Optional[Dict[str, Any]] = None
+    trace: Optional[Dict[str, Any]] = None
     user_context: Optional[Dict[str, Any]] = None
 
 class ConversationResponse(BaseModel):
@@ -97,10 +110,14 @@ class ConversationResponse(BaseModel):
 class SearchResponse(BaseModel):
     results: List[ConversationResponse]
 
+class HistoryResponse(BaseModel):
+    conversations: List[ConversationResponse]
+
 class MemoryStatsResponse(BaseModel):
     agent_memory: Dict[str, Any]
     shared_memory: Dict[str, Any]
     conversations: Dict[str, Any]
+    storage: Optional[Dict[str, Any]] = None
 
 def validate_token(token: str):
     """
@@ -121,12 +138,56 @@ def validate_token(token: str):
         logger.error("Invalid token provided")
         raise HTTPException(status_code=403, detail="Could not validate credentials")
 
+def record_query_result(schedule, user_query: str, response: str, contributing_agents: List[str],
+                        agent_responses: Dict[str, Any], user_context: Optional[Dict[str, Any]]):
+    """
+    Store a finished query's conversation and update agent memories.
+    
+    schedule(func, **kwargs) runs each update, e.g. BackgroundTasks.add_task
+    """
+    schedule(
+        memory_manager.record_conversation,
+        user_query=user_query,
+        agent_responses=agent_responses,
+        synthesis_response=response,
+        selected_agents=contributing_agents,
+        user_context=user_context
+    )
+    
+    for agent_name in contributing_agents:
+        if agent_name == "molecular_agent" and hasattr(agent_responses.get(agent_name, {}), "get"):
+            # Extract and update molecular agent's memories if available
+            agent_result = agent_responses.get(agent_name, {})
+            if isinstance(agent_result, dict):
+                molecular_knowledge = agent_result.get("molecular_insights")
+                
+                if molecular_knowledge:
+                    schedule(
+                        memory_manager.update_agent_memory,
+                        agent_name="molecular_agent",
+                        memory_type="molecular_knowledge",
+                        memory_data=molecular_knowledge
+                    )
+
+def require_user(token: Optional[str]):
+    """
+    Validate a token that must identify a user, for per-user endpoints
+    """
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_info = validate_token(token)
+    if not user_info.get('sub'):
+        # Without a subject the endpoint would fall back to everyone's data
+        raise HTTPException(status_code=403, detail="Token does not identify a user")
+    return user_info
+
 # Create the API endpoint with optional authentication
 @app.post("/api/query", response_model=QueryResponse)
 async def process_query(
     request: QueryRequest, 
     background_tasks: BackgroundTasks,
-    token: Optional[str] = Depends(oauth2_scheme)
+    token: Optional[str] = Depends(oauth2_scheme),
+    idempotency_key: Optional[str] = Header(None)
 ):
     try:
         # Validate token if provided
@@ -149,7 +210,9 @@ async def process_query(
         # Prepare query with optional user context
         query_input = {
             "query": request.query,
-            "user_context": user_context
+            "user_context": user_context,
+            # Retries carrying the same Idempotency-Key resume from checkpoints
+            "idempotency_key": idempotency_key
         }
         
         # Process the query using the router workflow
@@ -163,36 +226,18 @@ async def process_query(
             response = result.get("response", "")
             contributing_agents = result.get("selected_agents", [])
             agent_responses = result.get("agent_responses", {})
+            usage = result.get("usage")
+            trace = result.get("trace")
         else:
             response = result
             contributing_agents = ["unknown"]
             agent_responses = {}
+            usage = None
+            trace = None
         
-        # Store conversation in memory manager (in background)
-        background_tasks.add_task(
-            memory_manager.record_conversation,
-            user_query=request.query,
-            agent_responses=agent_responses,
-            synthesis_response=response,
-            selected_agents=contributing_agents,
-            user_context=user_context
-        )
-        
-        # Update agent memories (in background)
-        for agent_name in contributing_agents:
-            if agent_name == "molecular_agent" and hasattr(agent_responses.get(agent_name, {}), "get"):
-                # Extract and update molecular agent's memories if available
-                agent_result = agent_responses.get(agent_name, {})
-                if isinstance(agent_result, dict):
-                    molecular_knowledge = agent_result.get("molecular_insights")
-                    
-                    if molecular_knowledge:
-                        background_tasks.add_task(
-                            memory_manager.update_agent_memory,
-                            agent_name="molecular_agent",
-                            memory_type="molecular_knowledge",
-                            memory_data=molecular_knowledge
-                        )
+        # Store the conversation and agent memories (in background)
+        record_query_result(background_tasks.add_task, request.query, response,
+                            contributing_agents, agent_responses, user_context)
         
         # Create the response object with detailed information
         return QueryResponse(
@@ -200,36 +245,78 @@ async def process_query(
             contributing_agents=contributing_agents,
             agent_responses=agent_responses,
             processing_time=round(processing_time, 2),
+            usage=usage,
+            trace=trace,
             user_context=user_context
         )
     
+    except IdempotencyConflictError as e:
+        logger.warning(f"Idempotency key conflict: {str(e)}")
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Query processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+# Server-sent events endpoint that relays routing, molecular reasoning tokens
+# and the final synthesis as they become available
+@app.post("/api/query/stream")
+async def stream_query(
+    request: QueryRequest,
+    token: Optional[str] = Depends(oauth2_scheme)
+):
+    user_context = None
+    if token:
+        try:
+            user_info = validate_token(token)
+            user_context = {
+                "user_id": user_info.get('sub'),
+                "email": user_info.get('email'),
+                "name": user_info.get('name')
+            }
+        except HTTPException:
+            logger.warning("Authentication failed, proceeding without user context")
+    
+    query_input = {
+        "query": request.query,
+        "user_context": user_context
+    }
+    
+    def record_result(result):
+        # Same bookkeeping as /api/query, run on the stream's worker thread
+        try:
+            record_query_result(
+                lambda func, **kwargs: func(**kwargs), request.query, result.get("response", ""),
+                result.get("selected_agents", []), result.get("agent_responses", {}), user_context
+            )
+        except Exception as e:
+            logger.error(f"Error recording streamed query: {str(e)}")
+    
+    def event_stream():
+        for event in stream_copilot_query(copilot, query_input, on_result=record_result):
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 # Add endpoint for searching similar queries
 @app.post("/api/search", response_model=SearchResponse)
 async def search_conversations(
     request: SearchRequest,
     token: Optional[str] = Depends(oauth2_scheme)
 ):
+    # Search only covers the caller's own conversations, so a valid token is required
+    user_info = require_user(token)
+    user_context = {
+        "user_id": user_info.get('sub'),
+        "email": user_info.get('email')
+    }
+    
     try:
-        # Validate token if provided
-        user_context = None
-        if token:
-            try:
-                user_info = validate_token(token)
-                user_context = {
-                    "user_id": user_info.get('sub'),
-                    "email": user_info.get('email')
-                }
-            except HTTPException:
-                logger.warning("Authentication failed during search")
-        
         # Search for similar conversations
         results = memory_manager.search_conversations(
             query=request.query,
             limit=request.limit,
+            offset=request.offset,
+            mode=request.mode,
             user_context=user_context
         )
         
@@ -250,6 +337,39 @@ async def search_conversations(
         logger.error(f"Conversation search error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
 
+# Add endpoint for listing the signed-in user's past conversations
+@app.get("/api/history", response_model=HistoryResponse)
+async def get_history(
+    limit: int = 20,
+    offset: int = 0,
+    token: Optional[str] = Depends(oauth2_scheme)
+):
+    # History is per user, so a valid token is required
+    user_info = require_user(token)
+    user_context = {"user_id": user_info.get('sub')}
+    
+    try:
+        conversations = memory_manager.get_conversation_history(
+            user_context=user_context,
+            limit=limit,
+            offset=offset
+        )
+        
+        return HistoryResponse(conversations=[
+            ConversationResponse(
+                id=conv["id"],
+                timestamp=conv["timestamp"],
+                user_query=conv["user_query"],
+                synthesis_response=conv["synthesis_response"],
+                selected_agents=conv["selected_agents"]
+            )
+            for conv in conversations
+        ])
+    
+    except Exception as e:
+        logger.error(f"History retrieval error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting history: {str(e)}")
+
 # Add endpoint to get memory statistics
 @app.get("/api/memory/stats", response_model=MemoryStatsResponse)
 async def get_memory_stats(token: Optional[str] = Depends(oauth2_scheme)):
@@ -265,6 +385,34 @@ async def get_memory_stats(token: Optional[str] = Depends(oauth2_scheme)):
         logger.error(f"Memory stats retrieval error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting memory stats: {str(e)}")
 
+# Add endpoint to get token, cost and latency rollups
+@app.get("/api/usage")
+async def get_usage(token: Optional[str] = Depends(oauth2_scheme)):
+    # Spend is per user, so a valid token is required and only the
+    # caller's own entry of the per-user breakdown is returned
+    user_info = require_user(token)
+    
+    try:
+        return usage_tracker.get_rollups(user_id=user_info.get('sub'))
+    
+    except Exception as e:
+        logger.error(f"Usage retrieval error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting usage: {str(e)}")
+
+# Add endpoint to get operational metrics
+@app.get("/api/metrics")
+async def get_metrics(token: Optional[str] = Depends(oauth2_scheme)):
+    try:
+        # Optional token validation
+        if token:
+            validate_token(token)
+        
+        return metrics.snapshot()
+    
+    except Exception as e:
+        logger.error(f"Metrics retrieval error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting metrics: {str(e)}")
+
 # Add endpoint to clear specific memory
 @app.post("/api/memory/clear")
 async def clear_memory(
@@ -1,20 +1,46 @@
 # router/router_agent.py
 
+import os
 import json
-from typing import Dict, List, Any
+import time
+import queue
+import threading
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple, Callable, Iterator, Optional, Annotated, TypedDict
 
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 
 # Import molecular agent (TxGemma-based) instead of separate chem and bio agents
-from agents.molecular_agent.txgemma_agent import molecular_agent_executor
+from agents.molecular_agent.txgemma_agent import get_molecular_agent_executor
 
 # Import synthesis agent
 from synthesis.synthesis_agent import synthesis_agent
 
+# Import usage accounting
+from utils.usage_tracker import usage_tracker
+
+# Import prompt budgeting
+from utils.prompt_budget import fit_query
+
+# Import semantic caching
+from utils.semantic_cache import get_semantic_cache
+
+# Import workflow checkpointing
+from utils.checkpoint_store import get_checkpoint_store
+
+# Import speculative agent execution
+from router.speculation import SpeculativeExecutor
+
+# Every agent the router may select; unavailable ones answer with a fallback
+AGENT_NAMES = ("molecular_agent", "investor_agent", "market_agent", "ip_agent", "tech_stack_agent")
+
+# Upper bound on the user query inside the routing prompt
+ROUTER_MAX_QUERY_TOKENS = int(os.getenv("ROUTER_MAX_QUERY_TOKENS", "1000"))
+
 # Set up other domain agents as they become available
 # Placeholder for market_agent
 try:
@@ -46,7 +72,22 @@ def route_query(state):
     Returns a list of relevant agent names.
     """
     query = state["query"]
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
+    router_model = "gpt-4"
+    llm = ChatOpenAI(model=router_model, temperature=0)
+    
+    # Bound the query so a very long input can't blow past the context window
+    routing_query, budget_decision = fit_query(query, ROUTER_MAX_QUERY_TOKENS, router_model)
+    routing_trace = {"prompt_budget": {"decisions": [budget_decision]}}
+    state.setdefault("trace", {})["routing"] = routing_trace
+    
+    # Paraphrases of an already-routed query reuse its agent selection
+    routing_cache = get_semantic_cache("router")
+    if routing_cache is not None:
+        cached_agents = routing_cache.lookup(routing_query, scope=router_model)
+        routing_trace["semantic_cache"] = "hit" if cached_agents is not None else "miss"
+        if cached_agents is not None:
+            state["selected_agents"] = list(cached_agents)
+            return state
     
     # Create a prompt template for routing
     prompt = ChatPromptTemplate.from_template("""
@@ -71,7 +112,8 @@ def route_query(state):
     
     # Create a chain to get the agent names
     chain = prompt | llm | StrOutputParser()
-    agent_names_json = chain.invoke({"query": query})
+    with usage_tracker.track_openai_call("router", router_model):
+        agent_names_json = chain.invoke({"query": routing_query})
     
     # Parse the JSON response
     try:
@@ -91,36 +133,77 @@ def route_query(state):
         
         # Ensure we have a list of strings
         if isinstance(selected_agents, list):
-            selected_agents = [agent.strip().lower() for agent in selected_agents]
+            selected_agents = [str(agent).strip().lower() for agent in selected_agents]
         else:
             selected_agents = [str(selected_agents).strip().lower()]
+        
+        # Only cache selections the model returned cleanly
+        selected_agents = registered_agents(selected_agents)
+        if routing_cache is not None and selected_agents:
+            routing_cache.store(routing_query, list(selected_agents), scope=router_model)
             
     except Exception as e:
         # If JSON parsing fails, extract agent names using simple string matching
-        potential_agents = ["molecular_agent", "investor_agent", 
-                           "market_agent", "ip_agent", "tech_stack_agent"]
         selected_agents = []
         
-        for agent in potential_agents:
+        for agent in AGENT_NAMES:
             if agent.lower() in agent_names_json.lower():
                 selected_agents.append(agent)
-        
-        # If still no agents found, default to a primary agent based on keywords
-        if not selected_agents:
-            selected_agents = ["molecular_agent"]  # Default fallback
+    
+    # If still no agents found, default to a primary agent based on keywords
+    if not selected_agents:
+        selected_agents = ["molecular_agent"]  # Default fallback
     
     # Add the selected agents to the state
     state["selected_agents"] = selected_agents
     return state
 
-# Function to delegate the query to appropriate agents
-def delegate_to_agents(state):
-    selected_agents = state["selected_agents"]
-    query = state["query"]
+
+def registered_agents(agent_names: List[str]) -> List[str]:
+    """
+    Keep the names of known agents, deduplicated in order.
     
-    # Map agent names to the actual agent executors
+    Router output becomes graph node names, so anything else the model
+    returns (free text, reserved characters, or "join"/"synthesize") is dropped.
+    """
+    return [name for name in dict.fromkeys(agent_names) if name in AGENT_NAMES]
+
+# Agents whose input includes other agents' responses; they run after
+# their dependencies, everything else runs concurrently
+AGENT_DEPENDENCIES = {
+    "ip_agent": ["molecular_agent"],
+    "market_agent": ["molecular_agent"],
+}
+
+# Attempts per agent node before its error is recorded as the response
+AGENT_MAX_ATTEMPTS = int(os.getenv("AGENT_MAX_ATTEMPTS", "2"))
+
+
+def _merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer that lets concurrent nodes each contribute keys to a shared dict."""
+    merged = dict(left or {})
+    merged.update(right or {})
+    return merged
+
+
+class CopilotState(TypedDict, total=False):
+    """State passed between nodes of the router workflow."""
+    query: str
+    user_context: Dict[str, Any]
+    request_id: str
+    idempotency_key: str
+    selected_agents: List[str]
+    agent_responses: Annotated[Dict[str, Any], _merge_dicts]
+    speculative_responses: Dict[str, Any]
+    event_sink: Optional[Callable[[Dict[str, Any]], None]]
+    trace: Annotated[Dict[str, Any], _merge_dicts]
+    response: str
+
+
+def get_agent_map() -> Dict[str, Any]:
+    """Map agent names to the agent executors that are available."""
     agent_map = {
-        "molecular_agent": molecular_agent_executor,
+        "molecular_agent": get_molecular_agent_executor(),
     }
     
     # Add other agents to the map if they are available
@@ -133,89 +216,331 @@ def delegate_to_agents(state):
     if tech_stack_executor:
         agent_map["tech_stack_agent"] = tech_stack_executor
     
-    # Initialize responses dictionary to store results from each agent
-    agent_responses = {}
+    return agent_map
+
+
+def run_agent(agent_name: str, query: str, previous_responses: Dict[str, Any],
+              event_sink: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[Any, bool]:
+    """
+    Invoke a single agent, retrying failures, and return its response.
     
-    # Call each selected agent and store their responses
-    for agent_name in selected_agents:
-        if agent_name in agent_map and agent_map[agent_name] is not None:
-            try:
-                # Check if this is a molecular query that might need additional context
-                if agent_name == "molecular_agent":
-                    # Extract any relevant context from other agents' responses if they've already run
-                    context = {
-                        "previous_responses": {
-                            a: agent_responses[a] for a in agent_responses
-                            if a != "molecular_agent"
-                        }
-                    }
-                    # Invoke the molecular agent with both query and context
-                    result = agent_map[agent_name].invoke({
-                        "input": query,
-                        "context": context
-                    })
-                else:
-                    # Regular invocation for other agents
-                    result = agent_map[agent_name].invoke({"input": query})
-                
-                # Extract the response from the result
-                if isinstance(result, dict) and "response" in result:
-                    agent_responses[agent_name] = result["response"]
-                else:
-                    agent_responses[agent_name] = result
-            except Exception as e:
-                agent_responses[agent_name] = f"Error from {agent_name}: {str(e)}"
-        else:
-            # If we don't have the agent implemented yet, use a fallback
-            agent_responses[agent_name] = f"I'm still learning about {agent_name} topics. This feature will be available soon."
+    Args:
+        agent_name (str): Name of the agent to run
+        query (str): The user query
+        previous_responses (Dict[str, Any]): Responses from the agents this one depends on
+        event_sink (Optional[Callable]): Receives token events from agents that can stream
+        
+    Returns:
+        Tuple of the agent's response (or an error/fallback message) and
+        whether the agent completed successfully
+    """
+    executor = get_agent_map().get(agent_name)
+    if executor is None:
+        # If we don't have the agent implemented yet, use a fallback (not a
+        # completed answer, so synthesis doesn't pass it through as one)
+        return f"I'm still learning about {agent_name} topics. This feature will be available soon.", False
     
-    # Store all agent responses in the state
-    state["agent_responses"] = agent_responses
+    inputs = {"input": query}
+    if previous_responses or agent_name == "molecular_agent":
+        inputs["context"] = {"previous_responses": previous_responses}
     
-    return state
+    error = None
+    tokens_sent = 0
+    
+    def relay(event: Dict[str, Any]) -> None:
+        nonlocal tokens_sent
+        tokens_sent += 1
+        event_sink(event)
+    
+    for attempt in range(AGENT_MAX_ATTEMPTS):
+        tokens_sent = 0
+        try:
+            if event_sink is not None and hasattr(executor, "stream"):
+                result = _relay_agent_stream(agent_name, executor.stream(inputs), relay)
+            else:
+                result = executor.invoke(inputs)
+            
+            # Agents that catch their own exceptions report them in the result
+            if isinstance(result, dict) and result.get("error"):
+                raise RuntimeError(result["error"])
+            
+            # Extract the response from the result
+            if isinstance(result, dict) and "response" in result:
+                return result["response"], True
+            return result, True
+        except Exception as e:
+            error = e
+            if tokens_sent:
+                # The client already shows this attempt's tokens; have it drop them
+                event_sink({"type": "agent_reset", "agent": agent_name})
+            time.sleep(0.2 * (attempt + 1))
+    
+    return f"Error from {agent_name}: {str(error)}", False
+
+
+def _relay_agent_stream(agent_name: str, events: Iterator[Dict[str, Any]],
+                        event_sink: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Forward an agent's token events and return its final result."""
+    result = {}
+    for event in events:
+        if event.get("type") == "token":
+            event_sink({"type": "agent_token", "agent": agent_name, "text": event["text"]})
+        elif event.get("type") == "final":
+            result = {k: v for k, v in event.items() if k != "type"}
+    return result
+
+
+def _make_agent_node(agent_name: str, dependencies: List[str]):
+    """Create a workflow node that runs one agent and contributes its response."""
+    node_key = f"agent:{agent_name}"
+    
+    def agent_node(state: CopilotState) -> Dict[str, Any]:
+        # Resume from a checkpoint left by an earlier attempt at this request
+        idempotency_key = state.get("idempotency_key")
+        if idempotency_key:
+            saved_response = get_checkpoint_store().get(idempotency_key, node_key)
+            if saved_response is not None:
+                return {
+                    "agent_responses": {agent_name: saved_response},
+                    "trace": {node_key: {"resumed": True, "completed": True}}
+                }
+        
+        start_time = time.time()
+        speculative_run = state.get("speculative_responses", {}).get(agent_name)
+        if speculative_run is not None:
+            # Started while routing was in flight; just wait for it
+            response, completed = speculative_run.result()
+        else:
+            previous_responses = {
+                dep: state["agent_responses"][dep]
+                for dep in dependencies if dep in state.get("agent_responses", {})
+            }
+            response, completed = run_agent(agent_name, state["query"], previous_responses,
+                                            event_sink=state.get("event_sink"))
+        
+        # Failed agents aren't checkpointed, so a retry runs them again
+        if idempotency_key and completed:
+            get_checkpoint_store().save(idempotency_key, node_key, response)
+        
+        if state.get("event_sink") is not None:
+            state["event_sink"]({"type": "agent_complete", "agent": agent_name, "completed": completed})
+        
+        return {
+            "agent_responses": {agent_name: response},
+            "trace": {node_key: {
+                "latency_seconds": round(time.time() - start_time, 4),
+                "speculative": speculative_run is not None,
+                "completed": completed
+            }}
+        }
+    
+    agent_node.__name__ = f"{agent_name}_node"
+    return agent_node
+
+
+def join_agent_responses(state: CopilotState) -> Dict[str, Any]:
+    """Barrier node: runs once every agent branch has finished."""
+    return {"trace": {"join": {"agents_completed": sorted(state.get("agent_responses", {}))}}}
+
 
 # Function to synthesize responses from multiple agents
 def synthesize_responses(state):
+    idempotency_key = state.get("idempotency_key")
+    if idempotency_key:
+        saved_response = get_checkpoint_store().get(idempotency_key, "synthesize")
+        if saved_response is not None:
+            state["response"] = saved_response
+            state.setdefault("trace", {})["synthesis"] = {"resumed": True}
+            return state
+    
     # Use the dedicated synthesis agent
-    return synthesis_agent(state)
+    state = synthesis_agent(state)
+    
+    # A synthesis over a failed agent's error isn't kept: the retry reruns both
+    trace = state.get("trace", {})
+    agents_completed = all(
+        trace.get(f"agent:{agent_name}", {}).get("completed", True)
+        for agent_name in state.get("selected_agents", [])
+    )
+    if idempotency_key and agents_completed:
+        get_checkpoint_store().save(idempotency_key, "synthesize", state["response"])
+    return state
+
 
-# Create the workflow graph
-def create_router_workflow():
+# Create the workflow graph for a set of selected agents
+@lru_cache(maxsize=64)
+def _compile_workflow(selected_agents: Tuple[str, ...]):
     # Initialize the graph
-    workflow = StateGraph(name="TechBio-CoPilot")
+    workflow = StateGraph(CopilotState)
     
-    # Add the nodes
-    workflow.add_node("route", route_query)
-    workflow.add_node("delegate", delegate_to_agents)
+    # One node per selected agent
+    dependencies = {
+        agent_name: [d for d in AGENT_DEPENDENCIES.get(agent_name, []) if d in selected_agents]
+        for agent_name in selected_agents
+    }
+    for agent_name in selected_agents:
+        workflow.add_node(agent_name, _make_agent_node(agent_name, dependencies[agent_name]))
+    
+    for agent_name in selected_agents:
+        if dependencies[agent_name]:
+            # Wait for every dependency before running
+            workflow.add_edge(dependencies[agent_name], agent_name)
+        else:
+            workflow.add_edge(START, agent_name)
+    
+    workflow.add_node("join", join_agent_responses)
     workflow.add_node("synthesize", synthesize_responses)
     
     # Define the edges
-    workflow.add_edge("route", "delegate")
-    workflow.add_edge("delegate", "synthesize")
+    if selected_agents:
+        workflow.add_edge(list(selected_agents), "join")
+    else:
+        workflow.add_edge(START, "join")
+    workflow.add_edge("join", "synthesize")
     workflow.add_edge("synthesize", END)
     
-    # Set the entry point
-    workflow.set_entry_point("route")
-    
     # Compile the workflow
     return workflow.compile()
 
+
+def create_router_workflow(selected_agents: List[str]):
+    """
+    Build the agent workflow for one request.
+    
+    Each selected agent gets its own node, so independent agents run
+    concurrently and only agents that consume another agent's output wait
+    for it. Compiled graphs are reused for repeated agent selections.
+    
+    Args:
+        selected_agents (List[str]): Agents chosen by the router
+        
+    Returns:
+        The compiled LangGraph workflow
+    """
+    # Deduplicate while keeping the router's order, and never build (or
+    # cache) a graph with nodes named by unvalidated input
+    return _compile_workflow(tuple(registered_agents(selected_agents)))
+
+
 # Create a runnable application that processes user queries
 def create_copilot_app():
-    router_workflow = create_router_workflow()
+    speculative_executor = SpeculativeExecutor(run_agent)
     
-    def process_query(query):
+    def process_query(query, event_sink: Optional[Callable[[Dict[str, Any]], None]] = None):
+        # Accept either a bare query string or {"query": ..., "user_context": ...}
+        if isinstance(query, dict):
+            user_context = query.get("user_context") or {}
+            idempotency_key = query.get("idempotency_key")
+            query = query.get("query", "")
+        else:
+            user_context = {}
+            idempotency_key = None
+        
+        # Checkpoints are stored per user under the key, and a key reused
+        # for a different query is refused rather than resumed
+        if idempotency_key:
+            idempotency_key = get_checkpoint_store().claim(idempotency_key, query, user_context.get("user_id"))
+        
+        # Start usage accounting for this request
+        request_id = usage_tracker.start_request(user_id=user_context.get("user_id"))
+        
         # Initialize the state with the user query
-        initial_state = {"query": query}
+        state = {
+            "query": query,
+            "user_context": user_context,
+            "request_id": request_id,
+            "idempotency_key": idempotency_key,
+            "agent_responses": {},
+            "trace": {},
+            "event_sink": event_sink
+        }
+        
+        try:
+            # Route first, then build the graph for the agents the router picked.
+            # A retried request reuses its checkpointed routing decision.
+            saved_agents = get_checkpoint_store().get(idempotency_key, "route") if idempotency_key else None
+            if saved_agents is not None:
+                state["selected_agents"] = saved_agents
+                state["trace"]["routing"] = {"resumed": True}
+            else:
+                # Start likely local agents so they overlap the router's LLM call
+                speculation = speculative_executor.start(query)
+                try:
+                    state = route_query(state)
+                finally:
+                    # If routing failed nothing was selected, so every run is cancelled
+                    state["speculative_responses"] = speculation.resolve(
+                        state.get("selected_agents", []), AGENT_DEPENDENCIES
+                    )
+                if idempotency_key:
+                    get_checkpoint_store().save(idempotency_key, "route", state["selected_agents"])
+            
+            if event_sink is not None:
+                event_sink({"type": "routing", "selected_agents": state["selected_agents"]})
+            
+            router_workflow = create_router_workflow(state["selected_agents"])
+            
+            # Execute the workflow
+            result = router_workflow.invoke(state)
+        finally:
+            usage = usage_tracker.end_request()
         
-        # Execute the workflow
-        result = router_workflow.invoke(initial_state)
+        # Attach token, cost and latency accounting to the result
+        result["usage"] = usage
         
         # Return the response
         return result
     
     return process_query
 
+
+def stream_copilot_query(copilot: Callable, query_input: Any,
+                         on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run a query and yield progress events as they happen.
+    
+    Events are {"type": "routing"}, {"type": "agent_token"} (molecular
+    reasoning as TxGemma generates it), {"type": "agent_reset"} (discard
+    the agent's tokens so far; it is being retried), {"type":
+    "agent_complete"} and a closing {"type": "final"} carrying the
+    synthesized response.
+    
+    Args:
+        copilot: Function returned by create_copilot_app()
+        query_input: Query string or {"query": ..., "user_context": ...} dict
+        on_result: Called with the full workflow result before the final event,
+            e.g. to record the conversation
+        
+    Yields:
+        Dict[str, Any]: Progress events
+    """
+    events = queue.Queue()
+    done = object()
+    
+    def run():
+        try:
+            result = copilot(query_input, event_sink=events.put)
+            if on_result is not None:
+                on_result(result)
+            events.put({
+                "type": "final",
+                "response": result.get("response", ""),
+                "contributing_agents": result.get("selected_agents", []),
+                "usage": result.get("usage")
+            })
+        except Exception as e:
+            events.put({"type": "error", "error": str(e)})
+        finally:
+            events.put(done)
+    
+    threading.Thread(target=run, name="copilot-stream", daemon=True).start()
+    
+    while True:
+        event = events.get()
+        if event is done:
+            return
+        yield event
+
 # Example usage
 if __name__ == "__main__":
     copilot = create_copilot_app()
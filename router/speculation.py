@@ -0,0 +1,126 @@
+# router/speculation.py
+
+from typing import Dict, List, Any, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, Future
+import contextvars
+import os
+import re
+
+from utils.metrics import metrics
+
+# Deterministic, cache-backed agents that are cheap enough to run on a guess
+SPECULATIVE_AGENTS = ("ip_agent", "market_agent", "investor_agent", "tech_stack_agent")
+
+# Keywords mirroring the specialist descriptions in the routing prompt
+AGENT_KEYWORDS = {
+    "investor_agent": [
+        "invest", "investor", "investment", "funding", "venture", "vc", "valuation", "series a",
+        "series b", "ipo", "financial", "revenue", "roi", "stock", "portfolio"
+    ],
+    "market_agent": [
+        "market", "competitor", "competitive", "landscape", "industry", "trend", "market size",
+        "market share", "cagr", "pricing", "commercial", "adoption"
+    ],
+    "ip_agent": [
+        "patent", "ip", "intellectual property", "licensing", "license", "freedom to operate",
+        "fto", "infringement", "trademark", "exclusivity"
+    ],
+    "tech_stack_agent": [
+        "tech stack", "infrastructure", "software", "platform", "cloud", "data management",
+        "lims", "eln", "pipeline", "database", "aws", "gcp", "azure", "informatics"
+    ],
+}
+
+_KEYWORD_PATTERNS = {
+    agent: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")s?\b", re.IGNORECASE)
+    for agent, keywords in AGENT_KEYWORDS.items()
+}
+
+
+def predict_agents(query: str) -> List[str]:
+    """
+    Guess which speculative agents the router will select.
+
+    Args:
+        query (str): The user query
+
+    Returns:
+        List[str]: Agents whose keywords appear in the query
+    """
+    return [agent for agent in SPECULATIVE_AGENTS if _KEYWORD_PATTERNS[agent].search(query)]
+
+
+class Speculation:
+    """Agent runs started for one request before routing finished."""
+
+    def __init__(self, futures: Dict[str, Future]):
+        self.futures = futures
+
+    def resolve(self, selected_agents: Iterable[str], dependencies: Dict[str, List[str]]) -> Dict[str, Future]:
+        """
+        Keep the runs the router confirmed and drop the rest.
+
+        A speculative run is only usable if the agent was selected and none
+        of its dependencies were, since it ran without their context.
+
+        Args:
+            selected_agents (Iterable[str]): Agents chosen by the router
+            dependencies (Dict[str, List[str]]): Agent name to the agents it depends on
+
+        Returns:
+            Dict[str, Future]: Usable runs, resolving to (response, completed)
+        """
+        selected = set(selected_agents)
+        usable = {}
+
+        for agent_name, future in self.futures.items():
+            if agent_name in selected and not any(d in selected for d in dependencies.get(agent_name, [])):
+                usable[agent_name] = future
+                metrics.increment("speculative_agent_runs", labels={"result": "used"})
+            elif future.cancel():
+                metrics.increment("speculative_agent_runs", labels={"result": "cancelled"})
+            else:
+                # Already running; let it finish in the background and ignore the result
+                metrics.increment("speculative_agent_runs", labels={"result": "discarded"})
+
+        return usable
+
+
+class SpeculativeExecutor:
+    """
+    Starts likely agents while the router's LLM call is in flight.
+
+    When the prediction is right, agent latency overlaps routing latency;
+    when it is wrong, the cost is one cheap, cache-backed agent run.
+    """
+
+    def __init__(self, runner: Callable[[str, str, Dict[str, Any]], Any], max_workers: int = 4):
+        """
+        Initialize the speculative executor.
+
+        Args:
+            runner: Function (agent_name, query, previous_responses) that runs an agent
+            max_workers (int): Maximum concurrent speculative runs
+        """
+        self.runner = runner
+        self.enabled = os.getenv("SPECULATIVE_EXECUTION", "true").lower() in ("1", "true", "yes")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-agent")
+
+    def start(self, query: str) -> Speculation:
+        """
+        Start the agents predicted for a query.
+
+        Args:
+            query (str): The user query
+
+        Returns:
+            Speculation: Handle used to claim or discard the runs after routing
+        """
+        futures = {}
+        if self.enabled:
+            for agent_name in predict_agents(query):
+                # Copy the context so usage accounting still attributes to this request
+                context = contextvars.copy_context()
+                futures[agent_name] = self._pool.submit(context.run, self.runner, agent_name, query, {})
+                metrics.increment("speculative_agent_runs", labels={"result": "started"})
+        return Speculation(futures)
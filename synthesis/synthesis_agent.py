@@ -1,7 +1,9 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import os
+import re
 import json
 import time
+import hashlib
 from datetime import datetime
 
 from langchain.chat_models import ChatOpenAI
@@ -10,24 +12,122 @@ from langchain.schema import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
 from dotenv import load_dotenv
 
+from utils.usage_tracker import usage_tracker, estimate_tokens
+from utils.prompt_budget import PromptBudget, count_tokens, fit_query
+from utils.metrics import metrics
+from utils.lru_cache import LRUCache
+from utils.semantic_cache import get_semantic_cache
+
 # Load environment variables
 load_dotenv()
 
+# Agents whose output is already executive-ready markdown from the
+# deterministic format_*_analysis formatters
+DETERMINISTIC_AGENTS = {"ip_agent", "market_agent", "investor_agent", "tech_stack_agent"}
+
+SINGLE_AGENT_POLICIES = ("refine", "small_model", "passthrough")
+
+# Words that don't change what a query is asking for
+_INTENT_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "for", "to", "in", "on", "at",
+    "and", "or", "what", "whats", "how", "which", "who", "does", "do", "can", "could", "would",
+    "should", "tell", "me", "about", "please", "give", "i", "we", "our", "my", "it", "its", "this", "that"
+}
+
+
+def _query_intent(query: str) -> str:
+    """Reduce a query to its content terms, in order ("A inhibits B" is not "B inhibits A")."""
+    terms = re.findall(r"[a-z0-9][a-z0-9\-]*", query.lower())
+    return " ".join(t for t in terms if t not in _INTENT_STOPWORDS)
+
+
 class SynthesisAgent:
     """
     The Synthesis Agent combines responses from multiple domain agents
     into a cohesive, unified response for the user.
     """
     
-    def __init__(self, model_name: str = "gpt-4", temperature: float = 0.2):
-        """Initialize the synthesis agent with an LLM."""
+    def __init__(self, model_name: str = "gpt-4", temperature: float = 0.2,
+                 condense_model_name: str = "gpt-3.5-turbo", condense_max_tokens: int = 400,
+                 mode: Optional[str] = None, map_reduce_threshold: int = 3000,
+                 max_prompt_tokens: Optional[int] = None, max_query_tokens: int = 1000,
+                 single_agent_policy: Optional[str] = None,
+                 cache_max_entries: int = 512, cache_ttl: Optional[float] = None):
+        """
+        Initialize the synthesis agent with an LLM.
+        
+        Args:
+            model_name: Model used for the final synthesis (reduce) step
+            temperature: Sampling temperature for the synthesis model
+            condense_model_name: Cheaper model used to condense each agent response (map step)
+            condense_max_tokens: Token budget for each condensed agent response
+            mode: 'single_pass', 'map_reduce' or 'auto' (defaults to SYNTHESIS_MODE env, then 'auto')
+            map_reduce_threshold: In 'auto' mode, total estimated agent-response tokens
+                above which map-reduce synthesis is used
+            max_prompt_tokens: Upper bound on the synthesis prompt size (defaults to
+                SYNTHESIS_MAX_PROMPT_TOKENS env, then 6000)
+            max_query_tokens: Upper bound on the user query inside the prompt
+            single_agent_policy: How to handle a lone deterministic agent response:
+                'refine' (full model), 'small_model' or 'passthrough' (defaults to
+                SYNTHESIS_SINGLE_AGENT_POLICY env, then 'passthrough'); a response
+                from an agent that failed is always refined
+            cache_max_entries: Maximum number of cached synthesis results
+            cache_ttl: Seconds a cached synthesis stays valid (defaults to
+                SYNTHESIS_CACHE_TTL env, then 3600)
+        """
+        self.mode = (mode or os.getenv("SYNTHESIS_MODE", "auto")).lower()
+        self.map_reduce_threshold = map_reduce_threshold
+        self.condense_max_tokens = condense_max_tokens
+        self.condense_model_name = condense_model_name
+        self.max_prompt_tokens = max_prompt_tokens or int(os.getenv("SYNTHESIS_MAX_PROMPT_TOKENS", "6000"))
+        self.max_query_tokens = max_query_tokens
+        self.single_agent_policy = (single_agent_policy or
+                                    os.getenv("SYNTHESIS_SINGLE_AGENT_POLICY", "passthrough")).lower()
+        if self.single_agent_policy not in SINGLE_AGENT_POLICIES:
+            print(f"Warning: Unknown single-agent policy '{self.single_agent_policy}'. Using 'refine'.")
+            self.single_agent_policy = "refine"
+        
+        # Synthesis results keyed on (query intent, agent responses by agent name)
+        self.result_cache = LRUCache(
+            max_entries=cache_max_entries,
+            ttl=cache_ttl if cache_ttl is not None else float(os.getenv("SYNTHESIS_CACHE_TTL", "3600"))
+        )
+        
         try:
             # Try to use OpenAI directly
             self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+            self.model_name = model_name
         except Exception as e:
             # Fallback to a smaller model if needed
             print(f"Warning: Could not load {model_name}: {str(e)}. Falling back to gpt-3.5-turbo.")
             self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=temperature)
+            self.model_name = "gpt-3.5-turbo"
+        
+        # Cheaper model for refining lone deterministic agent responses
+        self.small_llm = ChatOpenAI(model=condense_model_name, temperature=temperature)
+        
+        # Cheaper, length-bounded model for condensing individual agent responses
+        self.condense_llm = ChatOpenAI(model=condense_model_name, temperature=0,
+                                       max_tokens=condense_max_tokens)
+        
+        # Prompt for the map step of map-reduce synthesis
+        self.condense_prompt = ChatPromptTemplate.from_template("""
+            You are condensing one domain specialist's analysis for the TechBio C-Suite CoPilot.
+            
+            The original query was:
+            ---
+            {query}
+            ---
+            
+            The {agent_name} provided this response:
+            ---
+            {response}
+            ---
+            
+            Condense this response to at most {max_words} words, keeping only what is relevant to the query.
+            Preserve all specific numbers, percentages, names, dates and molecular details exactly.
+            Drop boilerplate, repeated headings and generic advice. Use concise bullet points.
+        """)
         
         # Create a prompt template for synthesis
         self.prompt = ChatPromptTemplate.from_template("""
@@ -84,64 +184,238 @@ class SynthesisAgent:
             Refine the response while preserving all factual information and technical accuracy.
         """)
     
-    def synthesize(self, query: str, agent_responses: Dict[str, str]) -> str:
+    def synthesize(self, query: str, agent_responses: Dict[str, str],
+                   trace: Optional[Dict[str, Any]] = None,
+                   failed_agents: Optional[List[str]] = None) -> str:
         """
         Synthesize responses from multiple agents into a unified response.
         
         Args:
             query: The original user query
             agent_responses: Dictionary mapping agent names to their responses
+            trace: Optional dict that receives the prompt budget decisions
+            failed_agents: Agents whose response is an error or fallback message
             
         Returns:
             A cohesive synthesized response
         """
+        # Identical inputs to synthesis never pay for a second LLM call
+        cache_key = self._cache_key(query, agent_responses)
+        cached_response = self.result_cache.get(cache_key)
+        if trace is not None:
+            trace["cache"] = "hit" if cached_response is not None else "miss"
+        if cached_response is not None:
+            metrics.increment("synthesis_cache_requests", labels={"result": "hit"})
+            return cached_response
+        metrics.increment("synthesis_cache_requests", labels={"result": "miss"})
+        
+        # Fall back to a paraphrase match over the same agent responses
+        semantic_cache = get_semantic_cache("synthesis")
+        responses_key = self._responses_fingerprint(agent_responses)
+        if semantic_cache is not None:
+            cached_response = semantic_cache.lookup(query, scope=responses_key)
+            if trace is not None:
+                trace["semantic_cache"] = "hit" if cached_response is not None else "miss"
+            if cached_response is not None:
+                self.result_cache.set(cache_key, cached_response)
+                return cached_response
+        
+        synthesized_response, cacheable = self._synthesize_uncached(query, agent_responses, trace, failed_agents)
+        if cacheable:
+            self.result_cache.set(cache_key, synthesized_response)
+            if semantic_cache is not None:
+                semantic_cache.store(query, synthesized_response, scope=responses_key)
+        
+        return synthesized_response
+    
+    def _synthesize_uncached(self, query: str, agent_responses: Dict[str, str],
+                             trace: Optional[Dict[str, Any]] = None,
+                             failed_agents: Optional[List[str]] = None) -> Tuple[str, bool]:
+        """
+        Run synthesis without consulting the cache.
+        
+        Returns:
+            Tuple of the response and whether it is worth caching
+            (fallbacks and passthroughs are not)
+        """
         # Check if we only have one agent response
         if len(agent_responses) == 1:
-            return self._synthesize_single_agent(query, agent_responses)
+            return self._synthesize_single_agent(query, agent_responses, trace, failed_agents)
+        
+        # Condense large responses in parallel before the final synthesis
+        if self._use_map_reduce(agent_responses):
+            sections = self._condense_agent_responses(query, agent_responses)
+        else:
+            sections = {name: self._response_text(r) for name, r in agent_responses.items()}
         
-        # Format agent responses for the prompt
-        agent_responses_text = self._format_agent_responses(agent_responses)
+        # Keep the prompt within the token budget
+        prompt_query, sections = self._apply_prompt_budget(self.prompt, query, sections, trace)
+        agent_responses_text = self._format_agent_responses(sections)
         
         # Create and run the synthesis chain
         chain = self.prompt | self.llm | StrOutputParser()
         
         try:
-            synthesized_response = chain.invoke({
-                "query": query,
-                "agent_responses": agent_responses_text
-            })
+            with usage_tracker.track_openai_call("synthesis", self.model_name):
+                synthesized_response = chain.invoke({
+                    "query": prompt_query,
+                    "agent_responses": agent_responses_text
+                })
             
-            return synthesized_response
+            return synthesized_response, True
         
         except Exception as e:
             error_msg = f"Error during synthesis: {str(e)}"
             print(error_msg)
             # Return a fallback response
-            return self._create_fallback_response(query, agent_responses, error_msg)
+            return self._create_fallback_response(query, agent_responses, error_msg), False
     
-    def _synthesize_single_agent(self, query: str, agent_responses: Dict[str, str]) -> str:
+    def _synthesize_single_agent(self, query: str, agent_responses: Dict[str, str],
+                                 trace: Optional[Dict[str, Any]] = None,
+                                 failed_agents: Optional[List[str]] = None) -> Tuple[str, bool]:
         """Handle the case where we only have one agent response."""
         agent_name = next(iter(agent_responses))
         response = agent_responses[agent_name]
         
+        # Deterministic formatter output can skip the refinement round trip;
+        # an error or fallback message from a failed agent never does
+        deterministic = agent_name in DETERMINISTIC_AGENTS and agent_name not in (failed_agents or [])
+        policy = self.single_agent_policy if deterministic else "refine"
+        metrics.increment("synthesis_single_agent_requests", labels={"path": policy})
+        if policy == "passthrough":
+            return self._response_text(response), False
+        
+        if policy == "small_model":
+            llm, model_name = self.small_llm, self.condense_model_name
+        else:
+            llm, model_name = self.llm, self.model_name
+        
+        # Keep the prompt within the token budget
+        prompt_query, sections = self._apply_prompt_budget(
+            self.single_agent_prompt, query, {agent_name: self._response_text(response)}, trace
+        )
+        
         # Format the single agent response
-        agent_responses_text = f"--- {agent_name} Response ---\n{response}\n"
+        agent_responses_text = f"--- {agent_name} Response ---\n{sections[agent_name]}\n"
         
         # Create and run the single agent synthesis chain
-        chain = self.single_agent_prompt | self.llm | StrOutputParser()
+        chain = self.single_agent_prompt | llm | StrOutputParser()
         
         try:
-            refined_response = chain.invoke({
-                "query": query,
-                "agent_responses": agent_responses_text
-            })
+            with usage_tracker.track_openai_call("synthesis", model_name):
+                refined_response = chain.invoke({
+                    "query": prompt_query,
+                    "agent_responses": agent_responses_text
+                })
             
-            return refined_response
+            return refined_response, True
         
         except Exception as e:
             # If refinement fails, return the original response
             print(f"Error refining single agent response: {str(e)}")
+            return response, False
+    
+    def _cache_key(self, query: str, agent_responses: Dict[str, str]) -> str:
+        """Fingerprint the synthesis inputs: query intent plus agent responses."""
+        digest = hashlib.sha256()
+        digest.update(_query_intent(query).encode())
+        digest.update(self._responses_fingerprint(agent_responses).encode())
+        return digest.hexdigest()
+    
+    def _responses_fingerprint(self, agent_responses: Dict[str, str]) -> str:
+        """
+        Fingerprint the synthesis configuration and the agent responses.
+        
+        Responses are taken sorted by agent name: concurrent agents finish
+        in any order, and that order doesn't change the synthesis.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_name}\x00{self.mode}\x00{self.single_agent_policy}\x00".encode())
+        for agent_name in sorted(agent_responses):
+            digest.update(f"\x00{agent_name}\x00".encode())
+            digest.update(self._response_text(agent_responses[agent_name]).encode())
+        return digest.hexdigest()
+    
+    def _apply_prompt_budget(self, prompt: ChatPromptTemplate, query: str, sections: Dict[str, str],
+                             trace: Optional[Dict[str, Any]] = None):
+        """
+        Fit the query and agent sections into max_prompt_tokens.
+        
+        Returns:
+            Tuple of the fitted query and fitted agent sections
+        """
+        prompt_query, query_decision = fit_query(query, self.max_query_tokens, self.model_name)
+        
+        # Whatever the template, query and section headers don't use is shared by the agents
+        overhead = count_tokens(prompt.format(query=prompt_query, agent_responses=""), self.model_name)
+        overhead += sum(count_tokens(f"\n--- {name} Response ---\n\n", self.model_name) for name in sections)
+        budget = PromptBudget(max(self.max_prompt_tokens - overhead, 0), model=self.model_name)
+        fitted, decisions = budget.fit(sections)
+        
+        if trace is not None:
+            trace["prompt_budget"] = {
+                "max_prompt_tokens": self.max_prompt_tokens,
+                "overhead_tokens": overhead,
+                "agent_budget_tokens": budget.max_tokens,
+                "decisions": [query_decision] + decisions
+            }
+        
+        return prompt_query, fitted
+    
+    def _use_map_reduce(self, agent_responses: Dict[str, str]) -> bool:
+        """Decide whether to condense agent responses before synthesis."""
+        if self.mode == "map_reduce":
+            return True
+        if self.mode == "single_pass":
+            return False
+        
+        total_tokens = sum(estimate_tokens(self._response_text(r)) for r in agent_responses.values())
+        return total_tokens > self.map_reduce_threshold
+    
+    def _condense_agent_responses(self, query: str, agent_responses: Dict[str, str]) -> Dict[str, str]:
+        """
+        Map step: condense each oversized agent response with the cheaper model.
+        
+        All condense calls run concurrently, so latency is roughly that of the
+        slowest single call regardless of how many agents contributed.
+        """
+        condensed = {name: self._response_text(response) for name, response in agent_responses.items()}
+        
+        # Responses already within budget are passed through untouched
+        to_condense = [name for name, text in condensed.items()
+                       if estimate_tokens(text) > self.condense_max_tokens]
+        if not to_condense:
+            return condensed
+        
+        chain = self.condense_prompt | self.condense_llm | StrOutputParser()
+        inputs = [{
+            "query": query,
+            "agent_name": name,
+            "response": condensed[name],
+            # ~0.75 words per token keeps the output inside max_tokens
+            "max_words": int(self.condense_max_tokens * 0.75)
+        } for name in to_condense]
+        
+        with usage_tracker.track_openai_call("synthesis_condense", self.condense_model_name):
+            results = chain.batch(inputs, config={"max_concurrency": len(inputs)}, return_exceptions=True)
+        
+        for name, result in zip(to_condense, results):
+            if isinstance(result, Exception):
+                # Fall back to a hard cut at the token budget (~4 characters per token)
+                print(f"Error condensing {name} response: {str(result)}")
+                condensed[name] = condensed[name][:self.condense_max_tokens * 4]
+            else:
+                condensed[name] = result
+        
+        return condensed
+    
+    def _response_text(self, response: Any) -> str:
+        """Coerce an agent response into plain text."""
+        if isinstance(response, str):
             return response
+        if isinstance(response, dict) and "text" in response:
+            return response["text"]
+        return str(response)
     
     def _format_agent_responses(self, agent_responses: Dict[str, str]) -> str:
         """Format agent responses for inclusion in the prompt."""
@@ -155,14 +429,8 @@ class SynthesisAgent:
         
         # Format each agent's response
         for agent_name in ordered_agents:
-            response = agent_responses[agent_name]
-            
             # Ensure response is a string
-            if not isinstance(response, str):
-                if isinstance(response, dict) and "text" in response:
-                    response = response["text"]
-                else:
-                    response = str(response)
+            response = self._response_text(agent_responses[agent_name])
             
             # Add to formatted text
             formatted_text += f"\n--- {agent_name} Response ---\n{response}\n"
@@ -195,7 +463,17 @@ class SynthesisAgent:
         query = state["query"]
         agent_responses = state["agent_responses"]
         
-        synthesized_response = self.synthesize(query, agent_responses)
+        trace = state.setdefault("trace", {})
+        synthesis_trace = trace.setdefault("synthesis", {})
+        
+        # Agent nodes record whether each agent completed
+        failed_agents = [
+            agent_name for agent_name in agent_responses
+            if not trace.get(f"agent:{agent_name}", {}).get("completed", True)
+        ]
+        
+        synthesized_response = self.synthesize(query, agent_responses, trace=synthesis_trace,
+                                               failed_agents=failed_agents)
         
         # Store the synthesized response in the state
         state["response"] = synthesized_response
@@ -0,0 +1,12 @@
+import pytest
+
+from utils.usage_tracker import usage_tracker
+
+
+@pytest.fixture(autouse=True)
+def usage_rollups_in_tmp_path(tmp_path, monkeypatch):
+    # Agents record into the global tracker; keep its rollups out of ./memory
+    monkeypatch.setattr(usage_tracker, "storage_dir", str(tmp_path / "usage"))
+    monkeypatch.setattr(usage_tracker, "rollup_path", str(tmp_path / "usage" / "usage_rollups.json"))
+    yield
+    usage_tracker.flush()
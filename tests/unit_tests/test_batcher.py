@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from agents.molecular_agent import batcher as batcher_module
+from agents.molecular_agent.batcher import MicroBatcher, _apportion, get_micro_batcher
+
+
+class FakeClient:
+    """Completions client that rejects prompts containing "bad" with a 400."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.requests = []
+
+    async def complete(self, body):
+        self.requests.append(body)
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        if any("bad" in prompt for prompt in prompts):
+            request = httpx.Request("POST", "http://txgemma/v1/completions")
+            response = httpx.Response(400, request=request)
+            raise httpx.HTTPStatusError("400 Bad Request", request=request, response=response)
+        return {
+            "id": "cmpl-1",
+            "model": "txgemma",
+            "choices": [{"text": f"answer to {p}", "index": i} for i, p in enumerate(prompts)],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 20, "total_tokens": 50}
+        }
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    yield client
+    client.close()
+
+
+def _submit_together(batcher, prompts):
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        futures = [pool.submit(batcher.complete_sync, {"prompt": p, "max_tokens": 8}) for p in prompts]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result(timeout=10))
+            except Exception as e:
+                outcomes.append(e)
+    return outcomes
+
+
+def test_concurrent_prompts_share_one_request(client):
+    batcher = MicroBatcher(client, max_batch_size=3, max_wait_ms=1000)
+
+    outcomes = _submit_together(batcher, ["aspirin", "ibuprofen", "paclitaxel"])
+
+    assert len(client.requests) == 1
+    assert [o["choices"][0]["text"] for o in outcomes] == [
+        "answer to aspirin", "answer to ibuprofen", "answer to paclitaxel"
+    ]
+
+
+def test_rejected_batch_fails_only_the_bad_prompt(client):
+    batcher = MicroBatcher(client, max_batch_size=3, max_wait_ms=1000)
+
+    good, bad, other = _submit_together(batcher, ["aspirin", "bad prompt", "paclitaxel"])
+
+    assert good["choices"][0]["text"] == "answer to aspirin"
+    assert other["choices"][0]["text"] == "answer to paclitaxel"
+    assert isinstance(bad, httpx.HTTPStatusError)
+
+
+def test_batch_usage_is_split_across_prompts(client):
+    batcher = MicroBatcher(client, max_batch_size=2, max_wait_ms=1000)
+
+    outcomes = _submit_together(batcher, ["a" * 40, "b" * 80])
+
+    usages = [o["usage"] for o in outcomes]
+    assert sum(u["prompt_tokens"] for u in usages) == 30
+    assert sum(u["completion_tokens"] for u in usages) == 20
+    assert usages[0]["prompt_tokens"] < usages[1]["prompt_tokens"]
+
+
+def test_apportion_sums_exactly():
+    assert _apportion(10, [1, 1, 1]) == [4, 3, 3]
+    assert _apportion(7, [0, 0]) == [4, 3]
+    assert sum(_apportion(101, [5, 17, 3, 9])) == 101
+
+
+def test_get_micro_batcher_creates_one_batcher_per_endpoint(monkeypatch):
+    monkeypatch.setenv("TXGEMMA_BATCHING", "true")
+    monkeypatch.setattr(batcher_module, "_batchers", {})
+    monkeypatch.setattr(batcher_module, "get_txgemma_client", lambda base_url, api_key=None: object())
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        results.append(get_micro_batcher("http://txgemma/v1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(batcher) for batcher in results}) == 1
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from utils import checkpoint_store
+from utils.checkpoint_store import CheckpointStore, IdempotencyConflictError
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(db_path=str(tmp_path / "checkpoints.db"), ttl=60)
+
+
+def test_claim_resumes_same_request(store):
+    key = store.claim("k1", "What binds tubulin?", "alice")
+    store.save(key, "route", ["molecular_agent"])
+
+    assert store.claim("k1", "What binds tubulin?", "alice") == key
+    assert store.get(key, "route") == ["molecular_agent"]
+
+
+def test_claim_rejects_key_reused_with_different_query(store):
+    store.claim("k1", "What binds tubulin?", "alice")
+
+    with pytest.raises(IdempotencyConflictError):
+        store.claim("k1", "What is the CAR-T market size?", "alice")
+
+
+def test_claim_scopes_keys_to_users(store):
+    alice_key = store.claim("k1", "What binds tubulin?", "alice")
+    store.save(alice_key, "synthesize", "alice's answer")
+
+    bob_key = store.claim("k1", "What binds tubulin?", "bob")
+    anonymous_key = store.claim("k1", "Something else", None)
+
+    assert len({alice_key, bob_key, anonymous_key}) == 3
+    assert store.get(bob_key, "synthesize") is None
+
+
+def test_expired_claim_frees_key_and_its_checkpoints(store):
+    key = store.claim("k1", "What binds tubulin?", "alice")
+    store.save(key, "synthesize", "old answer")
+    store.ttl = 0.005
+    time.sleep(0.01)
+
+    assert store.claim("k1", "A new question", "alice") == key
+    store.ttl = 60
+    assert set(store.get_all(key)) == {CheckpointStore.REQUEST_NODE}
+
+
+def test_shared_store_is_created_on_first_use(tmp_path, monkeypatch):
+    db_path = tmp_path / "shared.db"
+    monkeypatch.setenv("CHECKPOINT_DB", str(db_path))
+    monkeypatch.setattr(checkpoint_store, "_store", None)
+    assert not db_path.exists()
+
+    store = checkpoint_store.get_checkpoint_store()
+
+    assert store.db_path == str(db_path)
+    assert checkpoint_store.checkpoint_store is store
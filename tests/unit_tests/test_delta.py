@@ -0,0 +1,87 @@
+import os
+
+from utils.storage import json_backend
+from utils.storage.delta import apply_delta, build_hashes, canonical_hash
+from utils.storage.json_backend import JSONBackend
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+def test_canonical_hash_ignores_key_order():
+    assert canonical_hash({"a": 1, "b": [1, 2]}) == canonical_hash({"b": [1, 2], "a": 1})
+    assert canonical_hash({"a": 1}) != canonical_hash({"a": 2})
+
+
+def test_apply_delta_returns_only_new_items():
+    memory = {"paclitaxel": [{"target": "tubulin"}]}
+    hashes = build_hashes(memory)
+
+    added = apply_delta(memory, {"paclitaxel": [{"target": "tubulin"}, {"target": "bcl-2"}],
+                                 "imatinib": "bcr-abl"}, hashes)
+
+    assert added == {"paclitaxel": [{"target": "bcl-2"}], "imatinib": ["bcr-abl"]}
+    assert memory["paclitaxel"] == [{"target": "tubulin"}, {"target": "bcl-2"}]
+    assert apply_delta(memory, {"imatinib": ["bcr-abl"]}, hashes) == {}
+
+
+def test_appended_deltas_are_replayed_on_load(tmp_path):
+    backend = JSONBackend(str(tmp_path))
+    memory = {}
+    for delta in ({"paclitaxel": ["binds tubulin"]}, {"paclitaxel": ["mdr1 substrate"], "imatinib": ["bcr-abl"]}):
+        backend.append_agent_memory("molecular_agent", "molecular_knowledge", apply_delta(memory, delta), memory)
+    # A crash mid-append leaves a torn last line
+    delta_path = os.path.join(backend.agent_memory_dir, "molecular_agent", "molecular_knowledge.delta.jsonl")
+    with open(delta_path, "a") as f:
+        f.write('{"imatinib": ["kit')
+
+    loaded = JSONBackend(str(tmp_path)).load_agent_memories()
+
+    assert loaded["molecular_agent"]["molecular_knowledge"] == {
+        "paclitaxel": ["binds tubulin", "mdr1 substrate"], "imatinib": ["bcr-abl"]
+    }
+
+
+def test_deltas_are_folded_into_the_full_object(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_backend, "DELTA_COMPACT_EVERY", 2)
+    backend = JSONBackend(str(tmp_path))
+    delta_path = os.path.join(backend.agent_memory_dir, "molecular_agent", "molecular_knowledge.delta.jsonl")
+    memory = {}
+    for i in range(3):
+        added = apply_delta(memory, {"paclitaxel": [f"fact {i}"]})
+        backend.append_agent_memory("molecular_agent", "molecular_knowledge", added, memory)
+
+    assert not os.path.exists(delta_path)
+    loaded = JSONBackend(str(tmp_path)).load_agent_memories()
+    assert loaded["molecular_agent"]["molecular_knowledge"] == {"paclitaxel": ["fact 0", "fact 1", "fact 2"]}
+
+
+def test_sqlite_full_save_keeps_deltas_appended_by_other_workers(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    worker_a, worker_b = SQLiteBackend(db_path), SQLiteBackend(db_path)
+    memory_a = {}
+    added = apply_delta(memory_a, {"paclitaxel": ["binds tubulin"]})
+    worker_a.append_agent_memory("molecular_agent", "molecular_knowledge", added, memory_a)
+
+    # Worker B never saw A's append
+    worker_b.save_agent_memory("molecular_agent", "molecular_knowledge", {"imatinib": ["bcr-abl"]})
+
+    loaded = SQLiteBackend(db_path).load_agent_memories()
+    assert loaded["molecular_agent"]["molecular_knowledge"] == {
+        "imatinib": ["bcr-abl"], "paclitaxel": ["binds tubulin"]
+    }
+
+
+def test_delta_file_is_kept_when_the_full_save_fails(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path), group_commit=True)
+    memory = {}
+    added = apply_delta(memory, {"paclitaxel": ["binds tubulin"]})
+    backend.append_agent_memory("molecular_agent", "molecular_knowledge", added, memory)
+
+    def failing_commit(batch):
+        return {path: OSError("disk full") for path in batch}
+
+    monkeypatch.setattr(backend._writer, "_commit", failing_commit)
+    backend.save_agent_memory("molecular_agent", "molecular_knowledge", memory)
+    backend.close()
+
+    loaded = JSONBackend(str(tmp_path)).load_agent_memories()
+    assert loaded["molecular_agent"]["molecular_knowledge"] == {"paclitaxel": ["binds tubulin"]}
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from utils import durable_write
+from utils.durable_write import GroupCommitWriter, atomic_write, atomic_write_json
+
+
+def test_atomic_write_replaces_contents_and_leaves_no_temp_file(tmp_path):
+    path = str(tmp_path / "memory.json")
+    atomic_write(path, "old")
+    atomic_write(path, b"new")
+
+    assert open(path).read() == "new"
+    assert os.listdir(tmp_path) == ["memory.json"]
+
+
+def test_failed_write_keeps_previous_contents(tmp_path, monkeypatch):
+    path = str(tmp_path / "memory.json")
+    atomic_write_json(path, {"version": 1})
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(durable_write.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        atomic_write_json(path, {"version": 2})
+
+    assert json.load(open(path)) == {"version": 1}
+
+
+def test_group_commit_collapses_writes_to_the_same_path(tmp_path, monkeypatch):
+    writer = GroupCommitWriter(interval=0.05)
+    committed = []
+    commit = writer._commit
+    monkeypatch.setattr(writer, "_commit", lambda batch: committed.append(dict(batch)) or commit(batch))
+    path = str(tmp_path / "plan.json")
+
+    writer.write(path, "1")
+    writer.write(path, "2")
+    writer.write(str(tmp_path / "execution.json"), "3", wait=True)
+
+    assert open(path).read() == "2"
+    assert sum(len(batch) for batch in committed) == 2
+    writer.close()
+
+
+def test_close_commits_pending_writes_and_later_writes_go_direct(tmp_path):
+    writer = GroupCommitWriter(interval=10)
+    path = str(tmp_path / "plan.json")
+    writer.write(path, "queued")
+
+    writer.close()
+    assert open(path).read() == "queued"
+
+    writer.write(path, "direct")
+    assert open(path).read() == "direct"
+
+
+def test_failed_group_commit_raises_for_waiting_writer(tmp_path):
+    writer = GroupCommitWriter(interval=0.01)
+    (tmp_path / "not-a-directory").write_text("")
+    path = str(tmp_path / "not-a-directory" / "plan.json")
+
+    writer.write(path, "queued")
+    with pytest.raises(OSError):
+        writer.write(path, "superseding", wait=True)
+    writer.write(str(tmp_path / "plan.json"), "fine", wait=True)
+    writer.close()
@@ -0,0 +1,54 @@
+from utils.storage.inverted_index import InvertedIndex, conversation_text, tokenize
+
+
+def _index():
+    index = InvertedIndex()
+    index.add("tubulin", "paclitaxel binds tubulin and stabilizes microtubules")
+    index.add("market", "paclitaxel market size and growth")
+    index.add("crispr", "crispr off-target effects in the genome")
+    return index
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("CAR-T cells, 3.2B!") == ["car", "t", "cells", "3", "2b"]
+
+
+def test_search_ranks_by_bm25():
+    index = _index()
+
+    results = index.search("paclitaxel tubulin")
+
+    assert [doc_id for doc_id, _ in results] == ["tubulin", "market"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_pages_with_offset():
+    index = _index()
+
+    assert index.search("paclitaxel tubulin", limit=1, offset=1) == index.search("paclitaxel tubulin")[1:]
+
+
+def test_search_restricted_to_doc_ids():
+    index = _index()
+
+    assert [doc_id for doc_id, _ in index.search("paclitaxel", doc_ids=["market", "crispr"])] == ["market"]
+
+
+def test_add_replaces_and_remove_deletes():
+    index = _index()
+    index.add("market", "crispr therapeutics market")
+    index.remove("crispr")
+
+    assert [doc_id for doc_id, _ in index.search("crispr")] == ["market"]
+    assert index.search("growth") == []
+    assert len(index) == 2
+
+
+def test_conversation_text_includes_agent_responses():
+    text = conversation_text({
+        "user_query": "paclitaxel?",
+        "synthesis_response": "it binds tubulin",
+        "agent_responses": {"molecular_agent": {"response": "stabilizes microtubules"}, "market_agent": "growing"}
+    })
+
+    assert text == "paclitaxel?\nit binds tubulin\nstabilizes microtubules\ngrowing"
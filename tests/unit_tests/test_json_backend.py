@@ -0,0 +1,181 @@
+import json
+import os
+
+import pytest
+
+from utils.storage import json_backend
+from utils.storage.json_backend import JSONBackend
+from utils.storage.log_backend import LogBackend
+
+
+def _conversation(conversation_id, timestamp, user_id=None, query="paclitaxel tubulin binding"):
+    return {
+        "id": conversation_id,
+        "timestamp": timestamp,
+        "user_id": user_id,
+        "user_query": query,
+        "synthesis_response": f"answer about {query}",
+        "agent_responses": {}
+    }
+
+
+def _no_directory_listing(monkeypatch, backend):
+    real_listdir = os.listdir
+
+    def listdir(path):
+        assert os.path.abspath(path) != os.path.abspath(backend.conversation_dir), "conversations listed"
+        return real_listdir(path)
+
+    monkeypatch.setattr(os, "listdir", listdir)
+
+
+def test_reopened_backend_counts_and_lists_from_manifest(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", "alice"))
+    backend.save_conversation(_conversation("b", "2026-01-02T00:00:00", "bob"))
+    backend.save_conversation(_conversation("c", "2026-01-03T00:00:00", "alice"))
+    backend.delete_conversation("b")
+    backend.close()
+
+    reopened = JSONBackend(str(tmp_path))
+    _no_directory_listing(monkeypatch, reopened)
+
+    assert reopened.count_conversations() == 2
+    assert [c["id"] for c in reopened.recent_conversations(5)] == ["c", "a"]
+    assert [c["id"] for c in reopened.list_conversations()] == ["c", "a"]
+    assert [c["id"] for c in reopened.list_conversations("alice")] == ["c", "a"]
+    assert [entry[1] for entry in reopened.conversation_entries()] == ["a", "c"]
+
+
+def test_manifest_journal_is_folded_into_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_backend, "MANIFEST_COMPACT_EVERY", 3)
+    backend = JSONBackend(str(tmp_path))
+    for i in range(4):
+        backend.save_conversation(_conversation(f"c{i}", f"2026-01-0{i + 1}T00:00:00"))
+
+    with open(backend.manifest_path) as f:
+        assert len(json.load(f)) == 3
+    with open(backend.manifest_journal_path) as f:
+        assert len(f.readlines()) == 1
+    assert JSONBackend(str(tmp_path)).count_conversations() == 4
+
+
+def test_manifest_skips_torn_journal_line(tmp_path):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00"))
+    with open(backend.manifest_journal_path, "a") as f:
+        f.write('{"id": "b", "timest')
+
+    assert JSONBackend(str(tmp_path)).count_conversations() == 1
+
+
+def test_manifest_is_built_from_existing_conversation_files(tmp_path):
+    conversation_dir = tmp_path / "conversations"
+    conversation_dir.mkdir()
+    for conversation in (_conversation("old", "2025-06-01T00:00:00"), _conversation("older", "2025-05-01T00:00:00")):
+        (conversation_dir / f"{conversation['id']}.json").write_text(json.dumps(conversation))
+
+    backend = JSONBackend(str(tmp_path))
+    # A save before anything reads the manifest must not hide the older files
+    backend.save_conversation(_conversation("new", "2026-01-01T00:00:00"))
+
+    assert [c["id"] for c in backend.recent_conversations(5)] == ["new", "old", "older"]
+
+
+def test_search_index_snapshot_only_reads_missing_conversations(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", query="paclitaxel tubulin"))
+    backend.search_conversations("paclitaxel")
+    backend.close()
+
+    reopened = JSONBackend(str(tmp_path))
+    reopened.save_conversation(_conversation("b", "2026-01-02T00:00:00", query="paclitaxel market"))
+    reads = []
+    get_conversation = reopened.get_conversation
+
+    def counting_get_conversation(conversation_id):
+        reads.append(conversation_id)
+        return get_conversation(conversation_id)
+
+    monkeypatch.setattr(reopened, "get_conversation", counting_get_conversation)
+    _no_directory_listing(monkeypatch, reopened)
+
+    results = reopened.search_conversations("paclitaxel", limit=5)
+
+    assert {c["id"] for c in results} == {"a", "b"}
+    # Only "b" was indexed from its file; the rest are the two results
+    assert sorted(reads) == ["a", "b", "b"]
+
+
+def test_search_index_snapshot_drops_deleted_conversations(tmp_path):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", query="paclitaxel tubulin"))
+    backend.search_conversations("paclitaxel")
+    backend.close()
+
+    reopened = JSONBackend(str(tmp_path))
+    reopened.delete_conversation("a")
+    reopened = JSONBackend(str(tmp_path))
+
+    assert reopened.search_conversations("paclitaxel") == []
+
+
+def test_conversation_files_are_written_atomically(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    written = []
+    monkeypatch.setattr(json_backend, "atomic_write", lambda path, data: written.append(path))
+
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00"))
+
+    assert written == [os.path.join(backend.conversation_dir, "a.json")]
+
+
+def _bytes_on_disk(backend):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for directory in (backend.agent_memory_dir, backend.shared_memory_dir, backend.conversation_dir)
+        for root, _, files in os.walk(directory) for name in files
+    )
+
+
+def test_disk_usage_is_kept_current_without_rescanning(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_agent_memory("molecular_agent", "plan", {"steps": ["a"]})
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", "alice"))
+    assert backend.disk_usage() == _bytes_on_disk(backend)
+
+    real_walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args, **kwargs: pytest.fail("memory directories rescanned"))
+    backend.save_conversation(_conversation("b", "2026-01-02T00:00:00", "bob"))
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", "alice", query="resaved"))
+    backend.delete_conversation("b")
+    backend.save_agent_memory("molecular_agent", "plan", {"steps": ["a", "b"]})
+    backend.append_agent_memory("molecular_agent", "molecular_knowledge", {"paclitaxel": ["x"]}, {})
+    backend.save_shared_memory("glossary", {"pk": "pharmacokinetics"})
+    backend.delete_agent_memory("molecular_agent", "plan")
+    usage = backend.disk_usage()
+    backend.delete_agent_memory("molecular_agent")
+    usage_after_delete = backend.disk_usage()
+    monkeypatch.setattr(os, "walk", real_walk)
+
+    assert usage_after_delete < usage
+    assert usage_after_delete == _bytes_on_disk(backend)
+
+
+def test_log_backend_manifest_is_rebuilt_without_reading_records(tmp_path, monkeypatch):
+    backend = LogBackend(str(tmp_path), segment_bytes=512, compaction_interval=None)
+    backend.save_conversation(_conversation("a", "2026-01-01T00:00:00", "alice"))
+    backend.save_conversation(_conversation("b", "2026-01-02T00:00:00", "bob"))
+    backend.save_conversation(_conversation("c", "2026-01-03T00:00:00", "alice"))
+    backend.delete_conversation("b")
+    backend.close()
+
+    reopened = LogBackend(str(tmp_path), segment_bytes=512, compaction_interval=None)
+    monkeypatch.setattr(reopened.log, "iter_records", lambda: pytest.fail("log scanned"))
+    monkeypatch.setattr(reopened.log, "_read", lambda *args: pytest.fail("record read"))
+
+    assert reopened.count_conversations() == 2
+    assert reopened.user_conversation_ids("alice") == ["a", "c"]
+    assert [entry[1] for entry in reopened.conversation_entries()] == ["a", "c"]
+    monkeypatch.undo()
+    reopened.close()
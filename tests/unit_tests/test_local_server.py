@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from agents.molecular_agent.local_server import StandInConfig, start_local_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_server_module_imports_without_credentials():
+    env = {k: v for k, v in os.environ.items() if k != "TXGEMMA_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import agents.molecular_agent.local_server; import agents.molecular_agent"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_acquire_slots_takes_a_batch_at_once():
+    config = StandInConfig(max_concurrent_sequences=3)
+    assert config.acquire_slots(2) == 2
+
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (config.acquire_slots(2), acquired.set()))
+    waiter.start()
+
+    # One slot is free, but a batch of two must not hold it while waiting
+    assert not acquired.wait(0.1)
+    assert config.free_slots == 1
+
+    config.release_slots(2)
+    assert acquired.wait(2)
+    waiter.join()
+    assert config.free_slots == 1
+
+
+def test_acquire_slots_caps_batches_larger_than_server():
+    config = StandInConfig(max_concurrent_sequences=2)
+
+    assert config.acquire_slots(5) == 2
+    assert config.free_slots == 0
+
+
+def test_concurrent_batches_complete():
+    server, base_url = start_local_server(profile="fast", output_tokens=4, max_concurrent_sequences=3)
+    try:
+        def complete(i):
+            response = httpx.post(f"{base_url}/completions", json={
+                "prompt": [f"prompt {i}a", f"prompt {i}b"], "max_tokens": 4
+            }, timeout=10)
+            return response.json()
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(complete, range(6)))
+    finally:
+        server.shutdown()
+
+    assert all(len(result["choices"]) == 2 for result in results)
+
+
+def test_stream_reports_tokens_then_done():
+    server, base_url = start_local_server(profile="instant", output_tokens=3)
+    try:
+        with httpx.stream("POST", f"{base_url}/completions",
+                          json={"prompt": "aspirin", "stream": True}, timeout=10) as response:
+            lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+    finally:
+        server.shutdown()
+
+    assert lines[-1] == "data: [DONE]"
+    assert len([json.loads(line[6:]) for line in lines[:-1]]) == 3
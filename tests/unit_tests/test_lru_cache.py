@@ -0,0 +1,59 @@
+import time
+
+from utils.lru_cache import LRUCache
+
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_bound_evicts_until_under_budget():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.set("a", "x", size=40)
+    cache.set("b", "y", size=40)
+    cache.set("c", "z", size=40)
+
+    assert [key for key, _ in cache.items()] == ["b", "c"]
+    assert cache.resident_bytes == 80
+
+
+def test_replacing_an_entry_updates_resident_bytes():
+    cache = LRUCache(max_bytes=100, sizeof=len)
+    cache.set("a", "x" * 30)
+    cache.set("a", "x" * 10)
+    cache.invalidate("missing")
+
+    assert cache.resident_bytes == 10
+    cache.invalidate("a")
+    assert cache.resident_bytes == 0
+
+
+def test_expired_entries_are_misses():
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+
+    time.sleep(0.05)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_items_does_not_touch_recency():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.items()
+    cache.set("c", 3)
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["hit_rate"] == 0.0
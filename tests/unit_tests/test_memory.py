@@ -0,0 +1,94 @@
+import pytest
+
+from utils.memory_manager import MemoryManager
+from utils.storage import RetentionPolicy, create_backend
+
+
+@pytest.fixture(params=["json", "sqlite", "log"])
+def manager(request, tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_COMPACTION_INTERVAL", "0")
+    manager = MemoryManager(str(tmp_path), backend=create_backend(request.param, str(tmp_path)))
+    yield manager
+    manager.compactor.close()
+    manager.backend.close()
+
+
+def _record(manager, query, user_id=None):
+    return manager.record_conversation(
+        user_query=query,
+        agent_responses={"molecular_agent": f"analysis of {query}"},
+        synthesis_response=f"answer about {query}",
+        selected_agents=["molecular_agent"],
+        user_context={"user_id": user_id} if user_id else None
+    )
+
+
+@pytest.mark.parametrize("mode", ["keyword", "semantic", "hybrid"])
+def test_search_is_scoped_to_the_user(manager, mode):
+    _record(manager, "paclitaxel tubulin binding", "alice")
+    _record(manager, "paclitaxel market size", "bob")
+
+    results = manager.search_conversations("paclitaxel", mode=mode, user_context={"user_id": "alice"})
+
+    assert [c["user_query"] for c in results] == ["paclitaxel tubulin binding"]
+
+
+def test_history_is_scoped_to_the_user(manager):
+    _record(manager, "first question", "alice")
+    _record(manager, "second question", "alice")
+    _record(manager, "bob's question", "bob")
+
+    history = manager.get_conversation_history({"user_id": "alice"})
+
+    assert [c["user_query"] for c in history] == ["second question", "first question"]
+
+
+def test_conversation_survives_cache_eviction(manager):
+    conversation_id = _record(manager, "crispr off-target effects", "alice")
+    manager.memory_cache["conversations"].clear()
+
+    assert manager.get_conversation(conversation_id)["user_query"] == "crispr off-target effects"
+
+
+def test_delete_conversation_removes_it_from_search(manager):
+    conversation_id = _record(manager, "antibody drug conjugates", "alice")
+
+    assert manager.delete_conversation(conversation_id)
+    assert not manager.get_conversation(conversation_id)
+    assert manager.search_conversations("antibody", user_context={"user_id": "alice"}) == []
+
+
+def test_conversation_stats_survive_restart(manager, request, tmp_path):
+    _record(manager, "first question", "alice")
+    _record(manager, "second question", "bob")
+    assert manager.get_memory_stats()["conversations"]["total"] == 2
+    manager.backend.close()
+
+    backend = create_backend(request.node.callspec.params["manager"], str(tmp_path))
+    restarted = MemoryManager(str(tmp_path), backend=backend)
+    try:
+        assert restarted.get_memory_stats()["conversations"]["total"] == 2
+    finally:
+        restarted.compactor.close()
+        backend.close()
+
+
+def test_knowledge_limits_are_applied_and_persisted(manager, request, tmp_path):
+    for i in range(4):
+        manager.update_agent_memory("molecular_agent", "molecular_knowledge", {f"compound {i}": ["fact a", "fact b"]})
+    manager.update_agent_memory("molecular_agent", "molecular_knowledge", {"compound 3": ["fact c"]})
+    manager.compactor.policy = RetentionPolicy(knowledge_max_keys=2, knowledge_max_items=2)
+
+    assert manager._trim_molecular_knowledge(manager.compactor.policy) == 5
+    expected = {"compound 2": ["fact a", "fact b"], "compound 3": ["fact b", "fact c"]}
+    assert manager.get_agent_memory("molecular_agent", "molecular_knowledge") == expected
+    # Dropped items can be learned again
+    manager.update_agent_memory("molecular_agent", "molecular_knowledge", {"compound 3": ["fact a"]})
+    manager.backend.close()
+
+    backend = create_backend(request.node.callspec.params["manager"], str(tmp_path))
+    try:
+        stored = backend.load_agent_memories()["molecular_agent"]["molecular_knowledge"]
+        assert stored == {"compound 2": ["fact a", "fact b"], "compound 3": ["fact b", "fact c", "fact a"]}
+    finally:
+        backend.close()
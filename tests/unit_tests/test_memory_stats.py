@@ -0,0 +1,49 @@
+import json
+
+from utils.memory_stats import MemoryStats, measure
+
+
+def test_measure_counts_list_items():
+    data = {"paclitaxel": ["binds tubulin", "mdr1 substrate"], "version": 2}
+
+    assert measure(data) == (len(json.dumps(data)), 3)
+    assert measure([1, 2]) == (6, 2)
+    assert measure("text") == (6, 1)
+
+
+def test_agent_memory_counters_follow_writes():
+    stats = MemoryStats()
+    stats.set_agent_memory("molecular_agent", "molecular_knowledge", {"paclitaxel": ["binds tubulin"]})
+    stats.add_agent_memory("molecular_agent", "molecular_knowledge", size=20, entries=2)
+    stats.set_agent_memory("molecular_agent", "plan", {"steps": ["a"]})
+
+    agent = stats.snapshot()["agent_memory"]["molecular_agent"]
+    assert agent["entries"] == 4
+    assert agent["memory_types"] == ["molecular_knowledge", "plan"]
+
+    stats.clear_agent_memory("molecular_agent", "plan")
+    assert stats.snapshot()["agent_memory"]["molecular_agent"]["entries"] == 3
+    stats.clear_agent_memory()
+    assert stats.snapshot()["agent_memory"] == {}
+
+
+def test_conversation_counters_track_range():
+    stats = MemoryStats()
+    stats.set_conversation_count(5)
+    stats.add_conversation({"timestamp": "2026-01-02"})
+    stats.add_conversation({"timestamp": "2026-01-01"})
+    stats.remove_conversation()
+
+    conversations = stats.snapshot()["conversations"]
+    assert conversations == {"total": 6, "oldest": "2026-01-01", "newest": "2026-01-02"}
+
+
+def test_write_rate_counts_recent_writes():
+    stats = MemoryStats(window=10)
+    for _ in range(5):
+        stats.record_write()
+
+    writes = stats.snapshot()["writes"]
+    assert writes["total"] == 5
+    assert writes["last_window"] == 5
+    assert writes["per_second"] == 0.5
@@ -0,0 +1,66 @@
+from utils.prompt_budget import PromptBudget, count_tokens, fit_query
+
+TABLES = """## Competitors
+
+| Company | Share |
+|---|---|
+| Acme | 40% |
+
+| Region | CAGR |
+|---|---|
+|   |   |
+"""
+
+
+def test_compress_keeps_repeated_table_rows():
+    compressed = PromptBudget(100)._compress(TABLES)
+
+    assert compressed.count("|---|---|") == 2
+    assert "|   |   |" in compressed
+
+
+def test_compress_keeps_code_blocks_verbatim():
+    text = "Example:\n```python\nx  =  1\n\n\nx  =  1\n```"
+
+    assert PromptBudget(100)._compress(text) == text
+
+
+def test_compress_drops_only_consecutive_duplicates():
+    text = "Key point\nKey point\nOther\n\n\n\nKey point\n  - nested   item"
+
+    assert PromptBudget(100)._compress(text) == "Key point\nOther\n\nKey point\n  - nested item"
+
+
+def test_fit_text_within_budget_is_untouched():
+    text, action = PromptBudget(1000).fit_text(TABLES, 1000)
+
+    assert (text, action) == (TABLES, "none")
+
+
+def test_fit_text_drops_low_value_blocks_first():
+    text = "Summary: revenue $4.3B in 2022.\n\n" + "\n\n".join(f"Background note {w}" for w in "abcdefgh")
+    budget = PromptBudget(1000)
+
+    fitted, action = budget.fit_text(text, count_tokens("Summary: revenue $4.3B in 2022.") + 2)
+
+    assert action == "dropped_blocks"
+    assert fitted.startswith("Summary: revenue $4.3B")
+
+
+def test_allocate_gives_surplus_to_longer_sections():
+    sections = {"market_agent": "short", "molecular_agent": "word " * 400}
+
+    budgets = PromptBudget(200).allocate(sections)
+
+    assert budgets["market_agent"] == count_tokens("short")
+    assert budgets["molecular_agent"] == 200 - budgets["market_agent"]
+
+
+def test_fit_query_keeps_head_and_tail():
+    query = "START " + "filler " * 500 + "END?"
+
+    fitted, decision = fit_query(query, 50)
+
+    assert fitted.startswith("START") and fitted.endswith("END?")
+    assert decision["action"] == "truncated"
+    assert decision["final_tokens"] <= 50
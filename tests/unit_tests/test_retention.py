@@ -0,0 +1,111 @@
+import datetime
+import os
+
+import pytest
+
+from utils.storage.archive import ConversationArchive
+from utils.storage.json_backend import JSONBackend
+from utils.storage.retention import MemoryCompactor, RetentionPolicy
+
+ENTRIES = [
+    ("2026-01-01T00:00:00", "a1", "alice", 100),
+    ("2026-01-02T00:00:00", "b1", "bob", 100),
+    ("2026-01-03T00:00:00", "a2", "alice", 100),
+    ("2026-01-04T00:00:00", "x1", None, 100),
+    ("2026-01-05T00:00:00", "a3", "alice", 100),
+]
+
+
+def test_age_limit_retires_older_conversations():
+    policy = RetentionPolicy(max_age=2.5 * 86400)
+
+    assert policy.select_expired(ENTRIES, now=datetime.datetime(2026, 1, 5, 13)) == ["a1", "b1", "a2"]
+
+
+def test_user_limits_keep_each_users_newest():
+    policy = RetentionPolicy(user_max_conversations=2)
+
+    assert policy.select_expired(ENTRIES) == ["a1"]
+    assert RetentionPolicy(user_max_bytes=150).select_expired(ENTRIES) == ["a1", "a2"]
+
+
+def test_store_limits_apply_after_user_limits():
+    policy = RetentionPolicy(user_max_conversations=2, max_conversations=3)
+
+    assert policy.select_expired(ENTRIES) == ["a1", "b1"]
+    assert RetentionPolicy(max_bytes=250).select_expired(ENTRIES) == ["a1", "b1", "a2"]
+
+
+def test_policy_without_limits_is_disabled(monkeypatch):
+    monkeypatch.setenv("MEMORY_RETENTION_MAX_AGE_DAYS", "")
+    assert not RetentionPolicy.from_env().enabled
+
+    monkeypatch.setenv("MEMORY_RETENTION_MAX_AGE_DAYS", "30")
+    policy = RetentionPolicy.from_env()
+    assert policy.enabled
+    assert policy.max_age == 30 * 86400
+
+
+def test_compactor_archives_before_deleting(tmp_path):
+    backend = JSONBackend(str(tmp_path / "memory"))
+    for timestamp, conversation_id, user_id, _ in ENTRIES:
+        backend.save_conversation({"id": conversation_id, "timestamp": timestamp, "user_id": user_id,
+                                   "user_query": f"question {conversation_id}"})
+    archive = ConversationArchive(str(tmp_path / "archive"))
+    oldest = []
+    compactor = MemoryCompactor(backend, RetentionPolicy(max_conversations=2), backend.delete_conversation,
+                                archive=archive, interval=None, on_oldest=oldest.append)
+
+    assert compactor.run_once() == {"archived": 3, "deleted": 3}
+    assert [c["id"] for c in archive.iter_conversations()] == ["a1", "b1", "a2"]
+    assert [c["id"] for c in backend.list_conversations()] == ["a3", "x1"]
+    assert oldest == ["2026-01-04T00:00:00"]
+    assert compactor.run_once() == {"archived": 0, "deleted": 0}
+
+
+def test_archive_drops_oldest_segments_over_its_byte_limit(tmp_path):
+    archive = ConversationArchive(str(tmp_path), segment_records=1)
+    archive.write([{"id": f"c{i}", "user_query": "x" * 200} for i in range(3)])
+    segment_bytes = archive.get_stats()["bytes"] // 3
+    archive.max_bytes = segment_bytes * 2
+
+    assert archive.enforce_retention() == 1
+    assert [c["id"] for c in archive.iter_conversations()] == ["c1", "c2"]
+
+
+def test_archive_stats_are_kept_without_listing_segments(tmp_path, monkeypatch):
+    archive = ConversationArchive(str(tmp_path), segment_records=1, max_bytes=10 ** 9)
+    archive.write([{"id": f"c{i}", "user_query": "x" * 200} for i in range(3)])
+    segment_bytes = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+
+    monkeypatch.setattr(archive, "_segments", lambda: pytest.fail("segments listed"))
+    assert archive.get_stats() == {"segments": 3, "bytes": segment_bytes}
+    archive.max_bytes = segment_bytes - 1
+    assert archive.enforce_retention() == 1
+    assert archive.get_stats()["segments"] == 2
+    monkeypatch.undo()
+
+    assert ConversationArchive(str(tmp_path)).get_stats() == archive.get_stats()
+
+
+def test_knowledge_limits_drop_oldest_keys_then_oldest_items():
+    knowledge = {"a": [1], "b": [1, 2, 3], "c": [1, 2, 3, 4]}
+    policy = RetentionPolicy(knowledge_max_keys=2, knowledge_max_items=2)
+
+    assert policy.enabled and not policy.limits_conversations
+    assert policy.trim_knowledge(knowledge) == 4
+    assert knowledge == {"b": [2, 3], "c": [3, 4]}
+    assert policy.trim_knowledge(knowledge) == 0
+
+
+def test_compactor_trims_knowledge_without_touching_conversations(tmp_path):
+    backend = JSONBackend(str(tmp_path))
+    backend.save_conversation({"id": "a1", "timestamp": "2026-01-01T00:00:00", "user_query": "question"})
+    policies = []
+    compactor = MemoryCompactor(backend, RetentionPolicy(knowledge_max_items=1), backend.delete_conversation,
+                                interval=None, trim_knowledge=lambda policy: policies.append(policy) or 3)
+
+    assert compactor.run_once() == {"archived": 0, "deleted": 0}
+    assert compactor.get_stats()["trimmed"] == 3
+    assert policies == [compactor.policy]
+    assert backend.count_conversations() == 1
@@ -0,0 +1,177 @@
+import os
+
+import pytest
+
+os.environ.setdefault("TXGEMMA_API_KEY", "test-key")
+
+from router import router_agent
+from router.router_agent import create_router_workflow, registered_agents, run_agent
+
+
+class FakeAgent:
+    """Agent executor that replays canned results, one per call."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _use_agents(monkeypatch, **agents):
+    monkeypatch.setattr(router_agent, "get_agent_map", lambda: agents)
+    monkeypatch.setattr(router_agent.time, "sleep", lambda seconds: None)
+
+
+def test_run_agent_retries_error_results(monkeypatch):
+    agent = FakeAgent(
+        {"response": "Error processing molecular query", "error": "timeout"},
+        {"response": "binds tubulin"}
+    )
+    _use_agents(monkeypatch, molecular_agent=agent)
+
+    assert run_agent("molecular_agent", "paclitaxel", {}) == ("binds tubulin", True)
+    assert agent.calls == 2
+
+
+def test_run_agent_reports_failure_after_error_results(monkeypatch):
+    monkeypatch.setattr(router_agent, "AGENT_MAX_ATTEMPTS", 2)
+    agent = FakeAgent({"response": "Error", "error": "timeout"}, RuntimeError("down"))
+    _use_agents(monkeypatch, molecular_agent=agent)
+
+    response, completed = run_agent("molecular_agent", "paclitaxel", {})
+
+    assert not completed
+    assert response == "Error from molecular_agent: down"
+
+
+def test_registered_agents_drops_unknown_names():
+    names = ["market_agent", "join", "synthesize", "ip_agent:x", "a|b", "market_agent", "ip_agent"]
+
+    assert registered_agents(names) == ["market_agent", "ip_agent"]
+
+
+def test_workflow_ignores_invalid_node_names():
+    workflow = create_router_workflow(["molecular_agent", "ip:agent", "join", "synthesize"])
+
+    assert workflow is create_router_workflow(["molecular_agent"])
+
+
+class FakeCheckpoints:
+    def __init__(self):
+        self.saved = {}
+
+    def get(self, key, node):
+        return self.saved.get((key, node))
+
+    def save(self, key, node, output):
+        self.saved[(key, node)] = output
+
+
+def _synthesize(monkeypatch, trace):
+    checkpoints = FakeCheckpoints()
+    monkeypatch.setattr(router_agent, "get_checkpoint_store", lambda: checkpoints)
+    monkeypatch.setattr(router_agent, "synthesis_agent", lambda state: {**state, "response": "synthesis"})
+    state = {
+        "idempotency_key": "key",
+        "selected_agents": ["molecular_agent", "market_agent"],
+        "trace": trace
+    }
+    router_agent.synthesize_responses(state)
+    return checkpoints.saved
+
+
+def test_synthesis_checkpointed_when_agents_completed(monkeypatch):
+    saved = _synthesize(monkeypatch, {
+        "agent:molecular_agent": {"completed": True},
+        "agent:market_agent": {"resumed": True, "completed": True}
+    })
+
+    assert saved == {("key", "synthesize"): "synthesis"}
+
+
+def test_synthesis_not_checkpointed_over_failed_agent(monkeypatch):
+    saved = _synthesize(monkeypatch, {
+        "agent:molecular_agent": {"completed": False},
+        "agent:market_agent": {"completed": True}
+    })
+
+    assert saved == {}
+
+
+def test_run_agent_fallback_for_unavailable_agent_is_not_completed(monkeypatch):
+    _use_agents(monkeypatch)
+
+    response, completed = run_agent("tech_stack_agent", "Which LIMS?", {})
+
+    assert not completed
+    assert "still learning" in response
+
+
+class FakeStreamingAgent:
+    """Streaming executor whose first attempt fails after sending a token."""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def stream(self, inputs):
+        self.attempts += 1
+        yield {"type": "token", "text": f"attempt {self.attempts} "}
+        if self.attempts == 1:
+            raise ConnectionError("stream dropped")
+        yield {"type": "final", "response": "binds tubulin"}
+
+
+def test_retried_stream_resets_tokens_already_sent(monkeypatch):
+    _use_agents(monkeypatch, molecular_agent=FakeStreamingAgent())
+    events = []
+
+    assert run_agent("molecular_agent", "paclitaxel", {}, event_sink=events.append) == ("binds tubulin", True)
+    assert [event["type"] for event in events] == ["agent_token", "agent_reset", "agent_token"]
+    assert events[-1]["text"] == "attempt 2 "
+
+
+def test_stream_copilot_query_hands_result_to_callback():
+    results = []
+
+    def copilot(query_input, event_sink):
+        event_sink({"type": "routing", "selected_agents": ["market_agent"]})
+        return {"response": "answer", "selected_agents": ["market_agent"], "agent_responses": {}}
+
+    events = list(router_agent.stream_copilot_query(copilot, "CAR-T market?", on_result=results.append))
+
+    assert [event["type"] for event in events] == ["routing", "final"]
+    assert results == [{"response": "answer", "selected_agents": ["market_agent"], "agent_responses": {}}]
+
+
+def test_failed_routing_cancels_speculative_runs(monkeypatch):
+    resolved = []
+
+    class FakeSpeculation:
+        def resolve(self, selected_agents, dependencies):
+            resolved.append(list(selected_agents))
+            return {}
+
+    class FakeExecutor:
+        def __init__(self, runner):
+            pass
+
+        def start(self, query):
+            return FakeSpeculation()
+
+    def failing_route(state):
+        raise RuntimeError("router unavailable")
+
+    monkeypatch.setattr(router_agent, "SpeculativeExecutor", FakeExecutor)
+    monkeypatch.setattr(router_agent, "route_query", failing_route)
+    copilot = router_agent.create_copilot_app()
+
+    with pytest.raises(RuntimeError):
+        copilot("What is the CAR-T market size?")
+
+    assert resolved == [[]]
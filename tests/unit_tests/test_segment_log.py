@@ -0,0 +1,192 @@
+import json
+import os
+
+import pytest
+
+from utils.storage.segment_log import SegmentedLog
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "log")
+
+
+def _open(directory, **kwargs):
+    options = {"compaction_interval": None}
+    options.update(kwargs)
+    return SegmentedLog(directory, **options)
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+
+
+def test_put_get_delete_and_recent(directory):
+    log = _open(directory)
+    log.put("a", {"q": "first"}, "2026-01-01")
+    log.put("b", {"q": "second"}, "2026-01-02")
+    log.put("a", {"q": "first, edited"}, "2026-01-03")
+
+    assert log.get("a") == {"q": "first, edited"}
+    assert log.recent(1) == [{"q": "first, edited"}]
+    assert log.delete("b")
+    assert not log.delete("b")
+    assert log.get("b") is None
+    assert list(log.iter_records()) == [{"q": "first, edited"}]
+    log.close()
+
+
+def test_records_survive_reopen(directory):
+    log = _open(directory)
+    log.put("a", {"q": "first"}, "2026-01-01")
+    log.put("b", {"q": "second"}, "2026-01-02")
+    log.delete("a")
+    log.close()
+
+    reopened = _open(directory)
+
+    assert len(reopened) == 1
+    assert reopened.get("b") == {"q": "second"}
+    reopened.close()
+
+
+def test_torn_tail_is_truncated_on_recovery(directory):
+    log = _open(directory)
+    log.put("a", {"q": "first"}, "2026-01-01")
+    log.put("b", {"q": "second"}, "2026-01-02")
+    size = log.get_stats()["disk_bytes"]
+    log.close()
+
+    # A crash halfway through appending a third record
+    segment_path = os.path.join(directory, _segments(directory)[-1])
+    with open(segment_path, "ab") as f:
+        f.write(b"\x00\x00\x00\x40\x12\x34")
+
+    reopened = _open(directory)
+    assert os.path.getsize(segment_path) == size
+    assert [reopened.get("a"), reopened.get("b")] == [{"q": "first"}, {"q": "second"}]
+
+    reopened.put("c", {"q": "third"}, "2026-01-03")
+    reopened.close()
+    recovered = _open(directory)
+    assert recovered.get("c") == {"q": "third"}
+    recovered.close()
+
+
+def test_corrupt_record_stops_replay(directory):
+    log = _open(directory)
+    log.put("a", {"q": "first"}, "2026-01-01")
+    first_size = log.get_stats()["disk_bytes"]
+    log.put("b", {"q": "second"}, "2026-01-02")
+    log.close()
+
+    segment_path = os.path.join(directory, _segments(directory)[-1])
+    with open(segment_path, "r+b") as f:
+        f.seek(first_size + 10)
+        f.write(b"X")
+
+    reopened = _open(directory)
+
+    assert reopened.get("a") == {"q": "first"}
+    assert reopened.get("b") is None
+    reopened.close()
+
+
+def test_full_segments_are_sealed_with_an_index(directory):
+    log = _open(directory, segment_bytes=200)
+    for i in range(10):
+        log.put(f"k{i}", {"q": "x" * 40}, f"2026-01-{i + 1:02d}")
+    segments = log.get_stats()["segments"]
+    log.close()
+
+    assert segments > 1
+    assert len([name for name in os.listdir(directory) if name.endswith(".idx")]) == segments - 1
+
+    reopened = _open(directory, segment_bytes=200)
+    assert len(reopened) == 10
+    assert reopened.recent(1) == [{"q": "x" * 40}]
+    reopened.close()
+
+
+def test_compaction_drops_dead_segments_and_keeps_live_records(directory):
+    log = _open(directory, segment_bytes=200)
+    for i in range(10):
+        log.put(f"k{i}", {"q": "x" * 40}, f"2026-01-{i + 1:02d}")
+    for i in range(8):
+        log.delete(f"k{i}")
+    before = log.get_stats()
+
+    removed = log.compact()
+
+    after = log.get_stats()
+    assert removed > 0
+    assert after["disk_bytes"] < before["disk_bytes"]
+    assert sorted(r["q"] for r in log.iter_records()) == ["x" * 40] * 2
+    assert log.get("k9") == {"q": "x" * 40}
+    log.close()
+
+    # Tombstones that still shadow older segments must survive compaction
+    reopened = _open(directory, segment_bytes=200)
+    assert len(reopened) == 2
+    assert reopened.get("k0") is None
+    reopened.close()
+
+
+def test_compaction_syncs_copies_before_removing_segments(directory, monkeypatch):
+    from utils.storage import segment_log
+
+    log = _open(directory, segment_bytes=200)
+    for i in range(10):
+        log.put(f"k{i}", {"q": "x" * 40}, f"2026-01-{i + 1:02d}")
+    for i in range(8):
+        log.delete(f"k{i}")
+    events = []
+    fsync, remove = os.fsync, os.remove
+    monkeypatch.setattr(segment_log.os, "fsync", lambda fd: events.append("fsync") or fsync(fd))
+    monkeypatch.setattr(segment_log.os, "remove", lambda path: events.append("remove") or remove(path))
+    monkeypatch.setattr(segment_log, "fsync_directory", lambda path: events.append("fsync_directory"))
+
+    assert log.compact() > 0
+
+    first_remove = events.index("remove")
+    assert "fsync" in events[:first_remove]
+    assert "fsync_directory" in events[:first_remove]
+    log.close()
+
+
+def test_entries_come_from_the_index_after_reopen(directory, monkeypatch):
+    log = _open(directory, segment_bytes=200, meta_field="user_id")
+    for i in range(6):
+        log.put(f"k{i}", {"user_id": f"u{i % 2}", "q": "x" * 40}, f"2026-01-{i + 1:02d}")
+    log.delete("k0")
+    log.close()
+
+    reopened = _open(directory, segment_bytes=200, meta_field="user_id")
+    monkeypatch.setattr(reopened, "_read", lambda *args: pytest.fail("record read"))
+
+    entries = reopened.entries()
+    assert [(key, timestamp, meta) for key, timestamp, meta, _ in entries] == [
+        (f"k{i}", f"2026-01-{i + 1:02d}", f"u{i % 2}") for i in range(1, 6)
+    ]
+    assert all(size == reopened.record_size(key) for key, _, _, size in entries)
+    reopened.close()
+
+
+def test_index_files_without_meta_are_rebuilt(directory):
+    log = _open(directory, segment_bytes=200, meta_field="user_id")
+    for i in range(6):
+        log.put(f"k{i}", {"user_id": "alice", "q": "x" * 40}, f"2026-01-{i + 1:02d}")
+    log.close()
+    # Index files written before meta was recorded
+    for name in os.listdir(directory):
+        if name.endswith(".idx"):
+            path = os.path.join(directory, name)
+            with open(path) as f:
+                lines = [json.loads(line)[:5] for line in f]
+            with open(path, "w") as f:
+                f.write("".join(json.dumps(line) + "\n" for line in lines))
+
+    reopened = _open(directory, segment_bytes=200, meta_field="user_id")
+
+    assert {meta for _, _, meta, _ in reopened.entries()} == {"alice"}
+    reopened.close()
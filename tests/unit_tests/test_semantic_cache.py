@@ -0,0 +1,94 @@
+import threading
+
+from utils import semantic_cache
+from utils.semantic_cache import SemanticCache, get_semantic_cache
+
+
+def test_exact_cache_hits_repeated_prompt():
+    cache = SemanticCache("test", semantic=False)
+    cache.store("What is  the CAR-T market size?", "answer", scope="gpt-4")
+
+    assert cache.lookup("What is the CAR-T market size?", scope="gpt-4") == "answer"
+    assert cache.lookup("What is the CAR-T market size?", scope="other") is None
+
+
+def test_exact_cache_misses_near_duplicates():
+    cache = SemanticCache("test", semantic=False)
+    cache.store("Compare pembrolizumab with nivolumab", "first")
+    cache.store("Toxicity of CC(=O)OC1=CC=CC=C1C(=O)O", "aspirin")
+
+    assert cache.lookup("Compare nivolumab with pembrolizumab") is None
+    assert cache.lookup("Toxicity of CC(=O)OC1=CC=CC=C1C(=O)N") is None
+    assert cache.lookup("toxicity of cc(=o)oc1=cc=cc=c1c(=o)o") is None
+
+
+def test_store_replaces_entry_for_same_prompt():
+    cache = SemanticCache("test", max_entries=2, semantic=False)
+    cache.store("q", "old")
+    cache.store("q", "new")
+
+    assert cache.lookup("q") == "new"
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_eviction_keeps_exact_index_consistent():
+    cache = SemanticCache("test", max_entries=2, semantic=False)
+    cache.store("a", 1)
+    cache.store("b", 2)
+    assert cache.lookup("b") == 2
+    cache.store("c", 3)
+
+    assert cache.lookup("a") is None
+    assert cache.lookup("b") == 2
+    assert cache.lookup("c") == 3
+
+
+def test_ttl_expires_entries():
+    cache = SemanticCache("test", ttl=0, semantic=False)
+    cache.store("q", "value")
+
+    assert cache.lookup("q") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_semantic_matching_off_with_hashing_embedder(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_MATCHING", raising=False)
+    monkeypatch.setattr(semantic_cache, "get_embedder", lambda: semantic_cache.HashingEmbedder())
+
+    assert not semantic_cache.semantic_matching_available()
+
+    monkeypatch.setenv("SEMANTIC_CACHE_MATCHING", "semantic")
+    assert semantic_cache.semantic_matching_available()
+
+
+def test_get_semantic_cache_is_exact_for_callers_that_opt_out(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_MATCHING", "semantic")
+    monkeypatch.setattr(semantic_cache, "_caches", {})
+
+    assert get_semantic_cache("exact-only", semantic=False).semantic is False
+    assert get_semantic_cache("paraphrases").semantic is True
+
+
+def test_get_semantic_cache_creates_one_instance_per_name(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_MATCHING", "exact")
+    monkeypatch.setattr(semantic_cache, "_caches", {})
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        results.append(get_semantic_cache("shared"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(cache) for cache in results}) == 1
+
+
+def test_disabled_returns_none(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "false")
+
+    assert get_semantic_cache("anything") is None
@@ -0,0 +1,44 @@
+from concurrent.futures import Future
+
+from router.speculation import Speculation, SpeculativeExecutor, predict_agents
+
+DEPENDENCIES = {"ip_agent": ["molecular_agent"], "market_agent": ["molecular_agent"]}
+
+
+def test_predict_agents_matches_keywords():
+    assert predict_agents("What is the CAR-T market size and patent landscape?") == ["ip_agent", "market_agent"]
+    assert predict_agents("How does paclitaxel bind tubulin?") == []
+
+
+def test_resolve_keeps_selected_runs_without_dependencies():
+    market, investor = Future(), Future()
+    speculation = Speculation({"market_agent": market, "investor_agent": investor})
+
+    usable = speculation.resolve(["market_agent"], DEPENDENCIES)
+
+    assert usable == {"market_agent": market}
+    assert investor.cancelled()
+
+
+def test_resolve_drops_runs_whose_dependencies_were_selected():
+    market = Future()
+    speculation = Speculation({"market_agent": market})
+
+    assert speculation.resolve(["molecular_agent", "market_agent"], DEPENDENCIES) == {}
+    assert market.cancelled()
+
+
+def test_resolve_with_no_selection_cancels_everything():
+    futures = {"ip_agent": Future(), "market_agent": Future()}
+
+    assert Speculation(futures).resolve([], DEPENDENCIES) == {}
+    assert all(future.cancelled() for future in futures.values())
+
+
+def test_executor_runs_predicted_agents(monkeypatch):
+    monkeypatch.setenv("SPECULATIVE_EXECUTION", "true")
+    executor = SpeculativeExecutor(lambda agent_name, query, previous: (f"{agent_name} done", True))
+
+    speculation = executor.start("Which patents cover this?")
+
+    assert speculation.futures["ip_agent"].result(timeout=5) == ("ip_agent done", True)
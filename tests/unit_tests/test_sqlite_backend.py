@@ -0,0 +1,40 @@
+import sqlite3
+
+from utils.storage.sqlite_backend import SQLiteBackend
+
+
+def _conversation(conversation_id, timestamp="2026-01-01T00:00:00"):
+    return {"id": conversation_id, "timestamp": timestamp, "user_query": f"question {conversation_id}"}
+
+
+def test_conversation_count_is_kept_with_inserts_and_deletes(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    worker_a, worker_b = SQLiteBackend(db_path), SQLiteBackend(db_path)
+    worker_a.save_conversation(_conversation("a"))
+    worker_b.save_conversation(_conversation("b"))
+    # Resaving updates the row without counting it again
+    worker_a.save_conversation(_conversation("a", "2026-01-02T00:00:00"))
+    worker_b.delete_conversation("a")
+    worker_b.delete_conversation("missing")
+
+    statements = []
+    conn = worker_a._connection()
+    conn.set_trace_callback(statements.append)
+    assert worker_a.count_conversations() == 1
+    conn.set_trace_callback(None)
+
+    assert not any("COUNT(" in statement.upper() for statement in statements)
+
+
+def test_conversation_count_is_initialized_for_existing_databases(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    backend = SQLiteBackend(db_path)
+    for conversation_id in ("a", "b", "c"):
+        backend.save_conversation(_conversation(conversation_id))
+    backend.close()
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE metadata")
+    conn.commit()
+    conn.close()
+
+    assert SQLiteBackend(db_path).count_conversations() == 3
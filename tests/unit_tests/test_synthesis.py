@@ -0,0 +1,128 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from synthesis.synthesis_agent import SynthesisAgent
+
+MARKET_REPORT = "| Segment | Size |\n|---|---|\n| CAR-T | $3.2B |"
+
+
+@pytest.fixture(autouse=True)
+def no_semantic_cache(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "false")
+
+
+def _agent(**kwargs):
+    agent = SynthesisAgent(**kwargs)
+    agent.calls = []
+
+    def fake_llm(prompt):
+        agent.calls.append(prompt)
+        return "refined"
+
+    agent.llm = RunnableLambda(fake_llm)
+    agent.small_llm = RunnableLambda(fake_llm)
+    return agent
+
+
+def test_passthrough_returns_deterministic_response_unchanged():
+    agent = _agent(single_agent_policy="passthrough")
+
+    assert agent.synthesize("CAR-T market?", {"market_agent": MARKET_REPORT}) == MARKET_REPORT
+    assert agent.calls == []
+
+
+def test_failed_agent_response_is_refined_not_passed_through():
+    agent = _agent(single_agent_policy="passthrough")
+    error = "Error from market_agent: upstream timeout"
+
+    response = agent.synthesize("CAR-T market?", {"market_agent": error}, failed_agents=["market_agent"])
+
+    assert response == "refined"
+    assert len(agent.calls) == 1
+
+
+def test_call_reads_failed_agents_from_trace():
+    agent = _agent(single_agent_policy="passthrough")
+    state = {
+        "query": "CAR-T market?",
+        "agent_responses": {"market_agent": "I'm still learning about market_agent topics."},
+        "trace": {"agent:market_agent": {"completed": False}}
+    }
+
+    assert agent(state)["response"] == "refined"
+
+
+def test_small_model_policy_uses_small_model():
+    agent = _agent(single_agent_policy="small_model")
+    agent.llm = RunnableLambda(lambda prompt: pytest.fail("full model used"))
+
+    assert agent.synthesize("CAR-T market?", {"market_agent": MARKET_REPORT}) == "refined"
+
+
+def test_cache_key_ignores_agent_completion_order():
+    agent = _agent()
+    first = {"molecular_agent": "binds tubulin", "market_agent": MARKET_REPORT}
+    second = {"market_agent": MARKET_REPORT, "molecular_agent": "binds tubulin"}
+
+    assert agent._cache_key("Paclitaxel market?", first) == agent._cache_key("Paclitaxel market?", second)
+
+
+def test_cache_key_keeps_query_word_order():
+    agent = _agent()
+    responses = {"molecular_agent": "binds tubulin"}
+
+    assert (agent._cache_key("Does EGFR inhibit KRAS?", responses) !=
+            agent._cache_key("Does KRAS inhibit EGFR?", responses))
+    assert agent._cache_key("What is the KRAS inhibitor?", responses) == agent._cache_key("kras inhibitor", responses)
+
+
+def test_cache_key_changes_with_responses():
+    agent = _agent()
+
+    assert (agent._cache_key("q", {"market_agent": "one"}) !=
+            agent._cache_key("q", {"market_agent": "two"}))
+
+
+def test_repeated_synthesis_served_from_cache():
+    agent = _agent(single_agent_policy="refine")
+    responses = {"molecular_agent": "binds tubulin"}
+
+    assert agent.synthesize("How does paclitaxel work?", responses) == "refined"
+    assert agent.synthesize("how does paclitaxel work", responses) == "refined"
+    assert len(agent.calls) == 1
+
+
+def test_auto_mode_condenses_only_oversized_responses():
+    agent = _agent(mode="auto", map_reduce_threshold=100, condense_max_tokens=50)
+    condensed = []
+    agent.condense_llm = RunnableLambda(lambda prompt: condensed.append(prompt) or "condensed")
+    responses = {"molecular_agent": "tubulin " * 400, "market_agent": MARKET_REPORT}
+
+    assert agent._use_map_reduce(responses)
+    sections = agent._condense_agent_responses("Paclitaxel?", responses)
+
+    assert sections == {"molecular_agent": "condensed", "market_agent": MARKET_REPORT}
+    assert len(condensed) == 1
+
+
+def test_auto_mode_skips_map_step_below_threshold():
+    agent = _agent(mode="auto", map_reduce_threshold=3000)
+
+    assert not agent._use_map_reduce({"molecular_agent": "binds tubulin", "market_agent": MARKET_REPORT})
+    assert _agent(mode="map_reduce")._use_map_reduce({"molecular_agent": "binds tubulin"})
+
+
+def test_failed_condense_falls_back_to_hard_cut():
+    agent = _agent(mode="map_reduce", condense_max_tokens=10)
+
+    def failing_condense(prompt):
+        raise RuntimeError("rate limited")
+
+    agent.condense_llm = RunnableLambda(failing_condense)
+    sections = agent._condense_agent_responses("Paclitaxel?", {"molecular_agent": "x" * 400})
+
+    assert sections == {"molecular_agent": "x" * 40}
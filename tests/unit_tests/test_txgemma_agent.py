@@ -0,0 +1,120 @@
+import os
+
+os.environ.setdefault("TXGEMMA_API_KEY", "test-key")
+
+import atexit
+
+import pytest
+
+from agents.molecular_agent.txgemma_agent import TxGemmaAgent, find_domain_terms
+from utils.memory_manager import MemoryManager
+
+
+def _make_agent(memory_manager):
+    agent = TxGemmaAgent(memory_manager=memory_manager)
+    # Tests persist explicitly; nothing should be written at interpreter exit
+    atexit.unregister(agent.persist_memory)
+    return agent
+
+
+@pytest.fixture
+def agent():
+    return _make_agent(FakeMemoryManager())
+
+
+@pytest.fixture
+def memory_manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("MEMORY_COMPACTION_INTERVAL", "0")
+    manager = MemoryManager(str(tmp_path))
+    yield manager
+    manager.compactor.close()
+    manager.backend.close()
+
+
+def test_domain_terms_match_whole_words_and_plurals():
+    hits = find_domain_terms("Database of cellular bases, proteins and enzymes")
+
+    assert [(hit["term"], hit["domain"]) for hit in hits] == [
+        ("base", "chemistry"), ("protein", "biology"), ("enzyme", "biology")
+    ]
+
+
+def test_domain_terms_report_positions_and_canonical_case():
+    query = "Adjust the PH of the buffer"
+    hit, = find_domain_terms(query)
+
+    assert hit["term"] == "pH"
+    assert query[hit["start"]:hit["end"]] == "PH"
+
+
+def test_domain_context_prefers_the_domain_with_more_distinct_terms(agent):
+    context = agent._determine_domain_context("Which catalyst speeds the reaction of this compound with the enzyme?")
+
+    assert context["primary_domain"] == "chemistry"
+    assert context["secondary_domain"] == "biology"
+    assert context["relevant_chemistry_concepts"] == ["catalyst", "reaction", "compound"]
+
+
+def test_domain_context_defaults_to_biology(agent):
+    context = agent._determine_domain_context("Tell me about paclitaxel")
+
+    assert context["primary_domain"] == "biology"
+    assert context["secondary_domain"] is None
+    assert context["relevant_biology_concepts"] == []
+
+
+class FakeMemoryManager:
+    def __init__(self, stored=None):
+        self.stored = stored or {}
+
+    def get_agent_memory(self, agent_name, memory_type=None):
+        return self.stored.get(memory_type, {})
+
+    def update_agent_memory(self, agent_name, memory_type, memory_data):
+        self.stored[memory_type] = memory_data
+
+
+def _processed(text, updates=None):
+    return {"text": text, "memory_updates": updates or {}}
+
+
+def test_recent_queries_keep_only_the_last_ten(agent):
+    for i in range(12):
+        agent._update_memory(f"query {i}", _processed("answer"))
+
+    assert [q["query"] for q in agent.memory["recent_queries"]] == [f"query {i}" for i in range(2, 12)]
+
+
+def test_knowledge_is_deduplicated_and_capped_oldest_first(agent):
+    agent.max_knowledge_items = 2
+
+    assert agent._add_knowledge("paclitaxel", {"target": "tubulin"})
+    assert not agent._add_knowledge("paclitaxel", {"target": "tubulin"})
+    agent._add_knowledge("paclitaxel", {"target": "bcl-2"})
+    agent._add_knowledge("paclitaxel", {"target": "mdr1"})
+    # The evicted item can be learned again
+    assert agent._add_knowledge("paclitaxel", {"target": "tubulin"})
+
+    assert list(agent.memory["molecular_knowledge"]["paclitaxel"]) == [
+        {"target": "mdr1"}, {"target": "tubulin"}
+    ]
+
+
+def test_memory_persists_and_restores_through_memory_manager(memory_manager, monkeypatch):
+    monkeypatch.setenv("MOLECULAR_MEMORY_PERSIST_INTERVAL", "3600")
+    agent = _make_agent(memory_manager)
+    agent._update_memory("paclitaxel mechanism", _processed("binds tubulin", {"paclitaxel": "binds tubulin"}))
+    assert memory_manager.get_agent_memory("molecular_agent") == {}
+
+    agent.persist_memory()
+    restored = _make_agent(memory_manager)
+
+    assert list(restored.memory["molecular_knowledge"]["paclitaxel"]) == ["binds tubulin"]
+    assert restored.memory["recent_queries"][0]["query"] == "paclitaxel mechanism"
+    assert not restored._memory_dirty
+
+
+def test_importing_the_agent_module_does_not_create_the_shared_agent():
+    from agents.molecular_agent import txgemma_agent
+
+    assert txgemma_agent._executor is None
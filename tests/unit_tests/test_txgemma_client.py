@@ -0,0 +1,159 @@
+import asyncio
+
+import httpx
+import pytest
+
+from agents.molecular_agent.local_server import start_local_server
+from agents.molecular_agent.txgemma_client import CircuitBreaker, CircuitOpenError, TxGemmaClient
+
+
+@pytest.fixture
+def server():
+    server, base_url = start_local_server(profile="instant", output_tokens=4)
+    yield base_url
+    server.shutdown()
+
+
+def _client(base_url, **kwargs):
+    options = {"max_retries": 1, "backoff_base": 0.0, "http2": False}
+    options.update(kwargs)
+    return TxGemmaClient(base_url, **options)
+
+
+def test_breaker_opens_after_threshold_and_allows_one_trial():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_reopens_when_trial_fails():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at = 0
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_complete_returns_choices_and_usage(server):
+    client = _client(server)
+    try:
+        response = client.complete_sync({"prompt": "aspirin", "max_tokens": 4})
+    finally:
+        client.close()
+
+    assert len(response["choices"]) == 1
+    assert response["usage"]["completion_tokens"] == 4
+
+
+def test_stream_yields_chunks(server):
+    client = _client(server)
+    try:
+        chunks = list(client.stream_sync({"prompt": "aspirin", "max_tokens": 4}))
+    finally:
+        client.close()
+
+    assert len(chunks) == 4
+
+
+def test_async_stream_runs_on_client_loop_from_another_loop(server):
+    client = _client(server)
+    send = client._client.send
+    loops = []
+
+    async def recording_send(request, stream=False):
+        loops.append(asyncio.get_running_loop())
+        return await send(request, stream=stream)
+
+    async def collect():
+        return [text async for text in client.stream_completion({"prompt": "aspirin", "max_tokens": 4})]
+
+    client._client.send = recording_send
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        client.close()
+
+    assert len(chunks) == 4
+    assert loops == [client.loop]
+
+
+def _respond_with(client, status_code):
+    async def send(request, stream=False):
+        return httpx.Response(status_code, request=request)
+
+    client._client.send = send
+
+
+def test_rate_limiting_does_not_trip_breaker(server):
+    client = _client(server)
+    client.breaker.failure_threshold = 1
+    _respond_with(client, 429)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.complete_sync({"prompt": "aspirin"})
+    finally:
+        client.close()
+
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.consecutive_failures == 0
+
+
+def test_server_error_trips_breaker(server):
+    client = _client(server)
+    client.breaker.failure_threshold = 1
+    _respond_with(client, 503)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.complete_sync({"prompt": "aspirin"})
+    finally:
+        client.close()
+
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_circuit_short_circuits(server):
+    client = _client(server)
+    client.breaker.failure_threshold = 1
+    client.breaker.reset_timeout = 60
+    client.breaker.record_failure()
+    try:
+        with pytest.raises(CircuitOpenError):
+            client.complete_sync({"prompt": "aspirin"})
+    finally:
+        client.close()
+
+
+def test_unexpected_error_during_trial_releases_half_open_circuit(server):
+    client = _client(server)
+    client.breaker.failure_threshold = 1
+    client.breaker.reset_timeout = 0
+    client.breaker.record_failure()
+    build_request = client._client.build_request
+
+    def broken_build_request(*args, **kwargs):
+        raise ValueError("unserializable request")
+
+    try:
+        client._client.build_request = broken_build_request
+        with pytest.raises(ValueError):
+            client.complete_sync({"prompt": "aspirin"})
+        assert client.breaker.state == CircuitBreaker.HALF_OPEN
+
+        client._client.build_request = build_request
+        client.complete_sync({"prompt": "aspirin"})
+        assert client.breaker.state == CircuitBreaker.CLOSED
+    finally:
+        client.close()
@@ -0,0 +1,81 @@
+from utils.usage_tracker import UsageTracker, estimate_cost, estimate_tokens
+
+
+def test_estimate_cost_matches_longest_model_prefix():
+    assert estimate_cost("gpt-4-turbo-2024-04-09", 1000, 1000) == 0.04
+    assert estimate_cost("gpt-4-0613", 1000, 0) == 0.03
+    assert estimate_cost("txgemma-9b", 1000, 1000) == 0.0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("a" * 400) == 100
+
+
+def test_request_summary_breaks_calls_down_by_agent(tmp_path):
+    tracker = UsageTracker(str(tmp_path), flush_interval=3600)
+    tracker.start_request("req-1", user_id="alice")
+    tracker.record("router", "gpt-4", 100, 10, 0.5)
+    tracker.record("synthesis", "gpt-4", 200, 50, 1.0)
+    tracker.record("router", "gpt-4", 100, 10, 0.5)
+
+    summary = tracker.end_request()
+
+    assert summary["request_id"] == "req-1"
+    assert summary["calls"] == 3
+    assert summary["total_tokens"] == 470
+    assert summary["agents"]["router"]["calls"] == 2
+    assert summary["agents"]["synthesis"]["prompt_tokens"] == 200
+
+
+def test_rollups_attribute_calls_to_users(tmp_path):
+    tracker = UsageTracker(str(tmp_path), flush_interval=3600)
+    for user_id in ("alice", None):
+        tracker.start_request(user_id=user_id)
+        tracker.record("router", "gpt-4", 10, 5, 0.1)
+        tracker.end_request()
+
+    rollups = tracker.get_rollups()
+
+    assert rollups["users"]["alice"]["calls"] == 1
+    assert rollups["users"]["anonymous"]["calls"] == 1
+    assert rollups["agents"]["router"]["total_tokens"] == 30
+    assert rollups["totals"]["calls"] == 2
+
+
+def test_calls_outside_a_request_count_globally(tmp_path):
+    tracker = UsageTracker(str(tmp_path), flush_interval=3600)
+
+    tracker.record("script", "gpt-3.5-turbo", 10, 10, 0.1)
+
+    rollups = tracker.get_rollups()
+    assert rollups["agents"]["script"]["calls"] == 1
+    assert rollups["users"] == {}
+    assert tracker.end_request() == {}
+
+
+def test_rollups_persist_across_restarts(tmp_path):
+    tracker = UsageTracker(str(tmp_path), flush_interval=3600)
+    tracker.start_request(user_id="alice")
+    tracker.record("router", "gpt-4", 10, 5, 0.1)
+    tracker.end_request()
+    tracker.flush()
+
+    restarted = UsageTracker(str(tmp_path))
+
+    assert restarted.get_rollups()["users"]["alice"]["total_tokens"] == 15
+
+
+def test_rollups_for_one_user_hide_other_users(tmp_path):
+    tracker = UsageTracker(str(tmp_path), flush_interval=3600)
+    for user_id in ("alice", "bob"):
+        tracker.start_request(user_id=user_id)
+        tracker.record("router", "gpt-4", 100, 10, 0.5)
+        tracker.end_request()
+
+    rollups = tracker.get_rollups(user_id="alice")
+
+    assert list(rollups["users"]) == ["alice"]
+    assert rollups["totals"]["calls"] == 2
+    assert tracker.get_rollups(user_id="carol")["users"]["carol"]["calls"] == 0
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from utils.storage.conversation_vectors import ConversationVectorStore
+from utils.storage.json_backend import JSONBackend
+from utils.storage.vector_index import VectorIndex
+
+
+def _unit_vectors(n, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_exact_search_returns_most_similar_first():
+    vectors = _unit_vectors(50)
+    index = VectorIndex(16)
+    index.add_batch([f"d{i}" for i in range(50)], vectors)
+
+    results = index.search(vectors[7], limit=3)
+
+    assert results[0][0] == "d7"
+    assert results[0][1] > results[1][1] >= results[2][1]
+    assert index.search(vectors[7], limit=2, offset=1) == results[1:]
+
+
+def test_remove_moves_last_vector_into_freed_slot():
+    vectors = _unit_vectors(3)
+    index = VectorIndex(16)
+    index.add_batch(["a", "b", "c"], vectors)
+
+    assert index.remove("a")
+    assert not index.remove("a")
+    assert index.search(vectors[2], limit=1)[0][0] == "c"
+    assert len(index) == 2
+
+
+def test_search_restricted_to_doc_ids():
+    vectors = _unit_vectors(10)
+    index = VectorIndex(16)
+    index.add_batch([f"d{i}" for i in range(10)], vectors)
+
+    assert [doc_id for doc_id, _ in index.search(vectors[3], limit=5, doc_ids=["d1", "d2"])] in (
+        ["d1", "d2"], ["d2", "d1"]
+    )
+
+
+def test_trained_index_finds_nearest_neighbours():
+    vectors = _unit_vectors(400)
+    index = VectorIndex(16, nprobe=4, train_threshold=100)
+    index.add_batch([f"d{i}" for i in range(400)], vectors)
+
+    hits = sum(index.search(vectors[i], limit=1)[0][0] == f"d{i}" for i in range(0, 400, 10))
+
+    assert hits >= 36
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = _unit_vectors(5)
+    index = VectorIndex(16)
+    index.add_batch([f"d{i}" for i in range(5)], vectors)
+    path = str(tmp_path / "vectors.npz")
+
+    index.save(path)
+    loaded = VectorIndex.load(path)
+
+    assert len(loaded) == 5
+    assert loaded.search(vectors[4], limit=1)[0][0] == "d4"
+
+
+def test_vector_store_snapshot_only_embeds_new_conversations(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    path = str(tmp_path / "vectors.npz")
+    for i, query in enumerate(["paclitaxel tubulin binding", "crispr off-target effects"]):
+        backend.save_conversation({"id": f"c{i}", "timestamp": f"2026-01-0{i + 1}", "user_query": query})
+    store = ConversationVectorStore(backend, path)
+    store.search("paclitaxel")
+    store.save()
+
+    backend.save_conversation({"id": "c2", "timestamp": "2026-01-03", "user_query": "car-t market size"})
+    reloaded = ConversationVectorStore(backend, path)
+    embedded = []
+    embed_batch = reloaded.embedder.embed_batch
+    monkeypatch.setattr(reloaded.embedder, "embed_batch", lambda texts: embedded.extend(texts) or embed_batch(texts))
+
+    results = reloaded.search("paclitaxel tubulin binding", limit=3)
+
+    assert embedded == ["car-t market size\n"]
+    assert results[0][0] == "c0"
+    assert len(reloaded) == 3
+
+
+def test_vector_store_reconciles_snapshot_with_stored_ids(tmp_path, monkeypatch):
+    backend = JSONBackend(str(tmp_path))
+    path = str(tmp_path / "vectors.npz")
+    for i, query in enumerate(["paclitaxel tubulin binding", "crispr off-target effects"]):
+        backend.save_conversation({"id": f"c{i}", "timestamp": f"2026-01-0{i + 1}", "user_query": query})
+    store = ConversationVectorStore(backend, path)
+    store.search("paclitaxel")
+    store.save()
+
+    # Deleted while no index was loaded, e.g. by retention in another process
+    backend.delete_conversation("c0")
+    monkeypatch.setattr(backend, "iter_conversations", lambda: pytest.fail("payloads were scanned"))
+    reloaded = ConversationVectorStore(backend, path)
+
+    assert [cid for cid, _ in reloaded.search("paclitaxel tubulin binding", limit=3)] == ["c1"]
+    assert len(reloaded) == 1
@@ -0,0 +1,203 @@
+# utils/checkpoint_store.py
+
+from typing import Dict, Any, Optional
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+class IdempotencyConflictError(Exception):
+    """An idempotency key was reused for a different request."""
+
+
+class CheckpointStore:
+    """
+    Durable per-node checkpoints for router workflow runs.
+
+    Each completed workflow node (routing, every agent, synthesis) stores its
+    output under the request's idempotency key. A retried request with the
+    same key skips the nodes that already completed. Client keys are scoped
+    to the user and bound to the query they were first used with (see
+    claim), so one caller's key can never resume another request. Checkpoints
+    live in an SQLite database in WAL mode so several worker processes can
+    share it.
+    """
+
+    # Node holding the fingerprint of the request a key was first used for
+    REQUEST_NODE = "request"
+
+    def __init__(self, db_path: str = "./memory/checkpoints.db", ttl: float = 86400):
+        """
+        Initialize the checkpoint store.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+            ttl (float): Seconds to keep checkpoints before pruning them
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                idempotency_key TEXT NOT NULL,
+                node TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (idempotency_key, node)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_created ON checkpoints (created_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection (sqlite3 connections aren't shareable across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, idempotency_key: str, query: str, user_id: Optional[str] = None) -> str:
+        """
+        Bind a client idempotency key to a request.
+
+        Args:
+            idempotency_key (str): Key supplied by the client
+            query (str): The request's query
+            user_id (Optional[str]): The caller, or None when anonymous
+
+        Returns:
+            str: Key to store this request's checkpoints under
+
+        Raises:
+            IdempotencyConflictError: The key was already used with a different query
+        """
+        key = hashlib.sha256(json.dumps([user_id, idempotency_key]).encode()).hexdigest()
+        fingerprint = hashlib.sha256(query.encode()).hexdigest()
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # An expired claim frees the key, along with whatever it checkpointed
+            conn.execute(
+                "DELETE FROM checkpoints WHERE idempotency_key = ? AND EXISTS ("
+                "SELECT 1 FROM checkpoints WHERE idempotency_key = ? AND node = ? AND created_at <= ?)",
+                (key, key, self.REQUEST_NODE, now - self.ttl)
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO checkpoints (idempotency_key, node, payload, created_at) VALUES (?, ?, ?, ?)",
+                (key, self.REQUEST_NODE, json.dumps(fingerprint), now)
+            )
+        if self.get(key, self.REQUEST_NODE) != fingerprint:
+            raise IdempotencyConflictError(f"Idempotency key {idempotency_key!r} was used for a different request")
+        return key
+
+    def get(self, idempotency_key: str, node: str) -> Optional[Any]:
+        """
+        Get the saved output of a node.
+
+        Args:
+            idempotency_key (str): Key identifying the request
+            node (str): Workflow node name
+
+        Returns:
+            Optional[Any]: The node's saved output, or None if it hasn't completed
+        """
+        row = self._connection().execute(
+            "SELECT payload FROM checkpoints WHERE idempotency_key = ? AND node = ? AND created_at > ?",
+            (idempotency_key, node, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, idempotency_key: str, node: str, output: Any) -> None:
+        """
+        Save the output of a completed node.
+
+        Args:
+            idempotency_key (str): Key identifying the request
+            node (str): Workflow node name
+            output (Any): JSON-serializable node output
+        """
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (idempotency_key, node, payload, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (idempotency_key, node, json.dumps(output, default=str), time.time())
+                )
+        except Exception as e:
+            print(f"Error saving checkpoint {idempotency_key}/{node}: {e}")
+            return
+
+        # Prune expired checkpoints at most once a minute
+        if time.time() - self._last_prune > 60:
+            self.prune()
+
+    def get_all(self, idempotency_key: str) -> Dict[str, Any]:
+        """
+        Get every saved node output for a request.
+
+        Args:
+            idempotency_key (str): Key identifying the request
+
+        Returns:
+            Dict[str, Any]: Node name to saved output
+        """
+        rows = self._connection().execute(
+            "SELECT node, payload FROM checkpoints WHERE idempotency_key = ? AND created_at > ?",
+            (idempotency_key, time.time() - self.ttl)
+        ).fetchall()
+        return {node: json.loads(payload) for node, payload in rows}
+
+    def clear(self, idempotency_key: str) -> None:
+        """Remove all checkpoints for a request."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM checkpoints WHERE idempotency_key = ?", (idempotency_key,))
+
+    def prune(self) -> None:
+        """Remove checkpoints older than the TTL."""
+        self._last_prune = time.time()
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("DELETE FROM checkpoints WHERE created_at <= ?", (time.time() - self.ttl,))
+        except Exception as e:
+            print(f"Error pruning checkpoints: {e}")
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """
+    Get the shared checkpoint store, creating it on first use.
+
+    The database path and TTL come from CHECKPOINT_DB and CHECKPOINT_TTL.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(
+                db_path=os.getenv("CHECKPOINT_DB", "./memory/checkpoints.db"),
+                ttl=float(os.getenv("CHECKPOINT_TTL", "86400"))
+            )
+        return _store
+
+
+def __getattr__(name):
+    # Opening the store creates its database, so it's deferred until first use
+    if name == "checkpoint_store":
+        return get_checkpoint_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,218 @@
+# utils/durable_write.py
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+import os
+import json
+import time
+import atexit
+import tempfile
+import threading
+from concurrent.futures import Future
+
+
+def atomic_write(path: str, data: Union[bytes, str], fsync: bool = True) -> None:
+    """
+    Replace a file's contents atomically.
+
+    The data is written to a temporary file in the same directory, fsynced,
+    and renamed over the target, so a reader (or a restart after a crash)
+    sees either the old file or the new one, never a partial write. With
+    fsync=False the rename is still atomic, but a power loss may lose the
+    new contents; that's fine for caches.
+
+    Args:
+        path (str): File to write
+        data (Union[bytes, str]): New contents (str is encoded as UTF-8)
+        fsync (bool): fsync the file and its directory before returning
+    """
+    temp_path = _write_temp(path, data, fsync)
+    os.replace(temp_path, path)
+    if fsync:
+        fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+def atomic_write_json(path: str, obj: Any, fsync: bool = True, **dump_kwargs) -> None:
+    """Serialize obj as JSON and write it with atomic_write."""
+    atomic_write(path, json.dumps(obj, **dump_kwargs), fsync=fsync)
+
+
+def _write_temp(path: str, data: Union[bytes, str], fsync: bool) -> str:
+    """Write data to a new temporary file beside path and return its path."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return temp_path
+
+
+def fsync_directory(directory: str) -> None:
+    """Make file creations, renames and removals in a directory durable."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Not supported on every platform
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommitWriter:
+    """
+    Batches atomic file writes so frequent updates share fsync latency.
+
+    write() queues a file's new contents and returns immediately; a
+    background thread commits the queue every interval seconds. Repeated
+    writes to the same path within an interval collapse into one, and each
+    directory is fsynced once per batch. Callers that need durability pass
+    wait=True, which blocks until the batch holding their write has been
+    committed and raises if that write failed; flush() waits without
+    reporting errors. Pending writes are flushed at exit.
+    """
+
+    def __init__(self, interval: float = 0.05, fsync: bool = True):
+        """
+        Initialize the writer and start its commit thread.
+
+        Args:
+            interval (float): Seconds to gather writes before committing a batch
+            fsync (bool): fsync files and directories when committing
+        """
+        self.interval = interval
+        self.fsync = fsync
+
+        self._cond = threading.Condition()
+        # path -> (contents, futures of the wait=True writers it supersedes or is)
+        self._pending: Dict[str, Tuple[bytes, List[Future]]] = {}
+        self._submitted = 0
+        self._committed = 0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, path: str, data: Union[bytes, str], wait: bool = False) -> None:
+        """
+        Queue new contents for a file.
+
+        Args:
+            path (str): File to write
+            data (Union[bytes, str]): New contents (str is encoded as UTF-8)
+            wait (bool): Block until the write is committed
+
+        Raises:
+            Exception: With wait, the error that kept the write from being committed
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        future = Future() if wait else None
+        with self._cond:
+            if self._closed:
+                ticket = None
+            else:
+                # A superseded write succeeds or fails with the write that replaced it
+                futures = self._pending[path][1] if path in self._pending else []
+                if future is not None:
+                    futures.append(future)
+                self._pending[path] = (data, futures)
+                self._submitted += 1
+                ticket = self._submitted
+                self._cond.notify_all()
+        if ticket is None:
+            # After close there's no commit thread, so write directly
+            atomic_write(path, data, fsync=self.fsync)
+        elif future is not None:
+            self.flush(ticket)
+            if not future.done():
+                raise RuntimeError(f"Group commit writer stopped before committing {path}")
+            future.result()
+
+    def flush(self, ticket: Optional[int] = None) -> None:
+        """Block until every write queued so far (or up to ticket) is committed."""
+        with self._cond:
+            target = self._submitted if ticket is None else ticket
+            while self._committed < target and self._thread.is_alive():
+                self._cond.wait(timeout=1.0)
+
+    def close(self) -> None:
+        """Commit pending writes and stop the commit thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+            if not self._closed:
+                # Let more writes join the batch
+                time.sleep(self.interval)
+
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                ticket = self._submitted
+            errors = self._commit({path: data for path, (data, _) in batch.items()})
+            for path, (_, futures) in batch.items():
+                for future in futures:
+                    if path in errors:
+                        future.set_exception(errors[path])
+                    else:
+                        future.set_result(None)
+            with self._cond:
+                self._committed = ticket
+                self._cond.notify_all()
+
+    def _commit(self, batch: Dict[str, bytes]) -> Dict[str, Exception]:
+        """Write a batch of files. Returns the error for each file that wasn't written."""
+        # Every file's data is durable before any rename, so a crash
+        # mid-batch can't leave a renamed but empty file
+        errors: Dict[str, Exception] = {}
+        written = []
+        for path, data in batch.items():
+            try:
+                written.append((_write_temp(path, data, self.fsync), path))
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+                errors[path] = e
+
+        directories = set()
+        for temp_path, path in written:
+            try:
+                os.replace(temp_path, path)
+                directories.add(os.path.dirname(os.path.abspath(path)))
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+                errors[path] = e
+
+        if self.fsync:
+            for directory in directories:
+                try:
+                    fsync_directory(directory)
+                except OSError as e:
+                    print(f"Error syncing {directory}: {e}")
+                    for path in batch:
+                        if os.path.dirname(os.path.abspath(path)) == directory:
+                            errors.setdefault(path, e)
+        return errors
@@ -0,0 +1,124 @@
+# utils/embeddings.py
+
+from typing import List, Optional
+import os
+import re
+import zlib
+
+import numpy as np
+
+# A local sentence-transformers model gives better paraphrase matching when
+# installed; otherwise we fall back to a dependency-free hashing embedder
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9\-]*")
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "for", "to", "in", "on", "at",
+    "and", "or", "what", "how", "which", "who", "does", "do", "can", "could", "would", "should",
+    "tell", "me", "about", "please", "i", "we", "our", "my", "it", "its", "this", "that", "with"
+}
+
+
+class HashingEmbedder:
+    """
+    CPU-only text embedder based on the hashing trick.
+
+    Words and character trigrams are hashed into a fixed number of signed
+    buckets, so similar wordings (plurals, hyphenation, reordered terms)
+    land close together without any model download.
+    """
+
+    def __init__(self, dim: int = 256):
+        """
+        Initialize the embedder.
+
+        Args:
+            dim (int): Embedding dimensionality
+        """
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a single text.
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            np.ndarray: L2-normalized float32 vector
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dim] += weight if (h >> 16) & 1 else -weight
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts into an (n, dim) float32 matrix."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
+
+    def _features(self, text: str):
+        for word in _TOKEN_PATTERN.findall(text.lower()):
+            if word in _STOPWORDS:
+                continue
+            yield f"w:{word}", 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield f"c:{padded[i:i + 3]}", 0.5
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a local sentence-transformers model."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        """
+        Initialize the embedder.
+
+        Args:
+            model_name (str): sentence-transformers model to load
+        """
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text into an L2-normalized float32 vector."""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts into an (n, dim) float32 matrix."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.model.encode(texts, normalize_embeddings=True).astype(np.float32)
+
+
+_default_embedder = None
+
+
+def get_embedder(model_name: Optional[str] = None):
+    """
+    Get the process-wide embedder.
+
+    Uses sentence-transformers when installed (model from EMBEDDING_MODEL env),
+    otherwise the hashing embedder.
+    """
+    global _default_embedder
+    if _default_embedder is None:
+        model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        if SentenceTransformer is not None:
+            try:
+                _default_embedder = SentenceTransformerEmbedder(model_name)
+            except Exception as e:
+                print(f"Warning: Could not load embedding model {model_name}: {e}. Using hashing embedder.")
+        if _default_embedder is None:
+            _default_embedder = HashingEmbedder()
+    return _default_embedder
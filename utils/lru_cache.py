@@ -0,0 +1,134 @@
+# utils/lru_cache.py
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache with least-recently-used eviction and
+    an optional time-to-live per entry. Capacity can be bounded by entry
+    count and, optionally, by the total size of the cached values.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum number of entries kept before evicting the LRU entry
+            ttl (Optional[float]): Seconds an entry stays valid; None disables expiry
+            max_bytes (Optional[int]): Maximum total size of cached values; None disables the bound
+            sizeof (Optional[Callable[[Any], int]]): Size of a value in bytes, used when set()
+                isn't given one; defaults to sys.getsizeof
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or sys.getsizeof
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a value, refreshing its recency.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            Optional[Any]: The cached value or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at, size = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self.resident_bytes -= size
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: Optional[int] = None) -> None:
+        """
+        Store a value, evicting least-recently-used entries if over capacity.
+
+        Args:
+            key (str): Cache key
+            value (Any): Value to cache
+            size (Optional[int]): Size of the value in bytes; computed with sizeof if omitted
+        """
+        if size is None:
+            size = self.sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.resident_bytes -= previous[2]
+            self._entries[key] = (value, time.time(), size)
+            self.resident_bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.resident_bytes > self.max_bytes)
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        """Remove a single entry."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.resident_bytes -= entry[2]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of the cached (key, value) pairs, least recently used first, without touching recency."""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Entry count, resident bytes, hits, misses, evictions and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
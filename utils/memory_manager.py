@@ -5,8 +5,18 @@ import os
 import json
 import datetime
 import uuid
-import time
-import shutil
+import threading
+
+from utils.storage import (
+    StorageBackend, ConversationVectorStore, ConversationArchive, RetentionPolicy, MemoryCompactor,
+    create_backend
+)
+from utils.storage.delta import apply_delta, build_hashes
+from utils.lru_cache import LRUCache
+from utils.memory_stats import MemoryStats
+
+# Reciprocal rank fusion constant for hybrid search
+RRF_K = 60
 
 class MemoryManager:
     """
@@ -16,72 +26,94 @@ class MemoryManager:
     1. Agent-specific memories (e.g., TxGemma's molecular memory)
     2. Cross-agent shared knowledge
     3. Conversation history
+    
+    Persistence is delegated to a pluggable StorageBackend (see utils/storage).
+    
+    The caches (agent and shared memory, the conversation LRU, knowledge
+    hashes and the stats counters) are per process and are not invalidated
+    when another worker writes to a shared backend such as SQLite. Each
+    worker sees its own writes immediately and other workers' only after a
+    restart. Molecular knowledge appends merge in the backend, other
+    agent and shared memory updates replace the stored object (the last
+    writer wins), and conversation lookups fall back to the backend on a
+    cache miss.
     """
     
-    def __init__(self, storage_dir: str = "./memory"):
+    def __init__(self, storage_dir: str = "./memory", backend: Optional[StorageBackend] = None):
         """
-        Initialize the memory manager with appropriate storage directories.
+        Initialize the memory manager with a storage backend.
         
         Args:
             storage_dir (str): Base directory for storing memories
+            backend (Optional[StorageBackend]): Storage backend. If None, the
+                backend named by MEMORY_BACKEND ("json", "sqlite" or "log") is created.
         """
         self.storage_dir = storage_dir
-        self.agent_memory_dir = os.path.join(storage_dir, "agent_memory")
-        self.shared_memory_dir = os.path.join(storage_dir, "shared_memory")
-        self.conversation_dir = os.path.join(storage_dir, "conversations")
+        self.backend = backend or create_backend(os.getenv("MEMORY_BACKEND", "json"), storage_dir)
         
-        # Create directories if they don't exist
-        for directory in [self.storage_dir, self.agent_memory_dir, 
-                         self.shared_memory_dir, self.conversation_dir]:
-            os.makedirs(directory, exist_ok=True)
+        # Conversation embeddings for semantic and hybrid search
+        self.conversation_vectors = ConversationVectorStore(
+            self.backend, os.path.join(storage_dir, f"conversation_vectors_{self.backend.name}.npz")
+        )
         
-        # In-memory cache for faster access
+        # In-memory cache for faster access; conversations are held in a
+        # bounded LRU and loaded from the backend on a miss
         self.memory_cache = {
             "agent_memory": {},
             "shared_memory": {},
-            "conversations": {}
+            "conversations": LRUCache(
+                max_entries=int(os.getenv("MEMORY_CACHE_MAX_CONVERSATIONS", "1000")),
+                max_bytes=int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+            )
         }
         
+        # Per-key hash sets of the molecular knowledge items, built on first merge
+        self._knowledge_hashes = None
+        self._knowledge_lock = threading.Lock()
+        
+        # Running size, entry and write counters behind get_memory_stats
+        self.stats = MemoryStats()
+        
         # Load existing memories into cache
         self._load_memories()
+        
+        # Retention, archiving of retired conversations, and deferred deletion
+        archive = None
+        if os.getenv("MEMORY_ARCHIVE", "true").lower() in ("1", "true", "yes"):
+            archive_max_age_days = os.getenv("MEMORY_ARCHIVE_MAX_AGE_DAYS")
+            archive_max_bytes = os.getenv("MEMORY_ARCHIVE_MAX_BYTES")
+            archive = ConversationArchive(
+                os.path.join(storage_dir, "archive"),
+                max_age=float(archive_max_age_days) * 86400 if archive_max_age_days else None,
+                max_bytes=int(archive_max_bytes) if archive_max_bytes else None
+            )
+        self.compactor = MemoryCompactor(
+            self.backend,
+            RetentionPolicy.from_env(),
+            self.delete_conversation,
+            archive=archive,
+            interval=float(os.getenv("MEMORY_COMPACTION_INTERVAL", "3600")) or None,
+            on_oldest=self.stats.set_oldest_conversation,
+            trim_knowledge=self._trim_molecular_knowledge
+        )
     
     def _load_memories(self):
-        """Load existing memories from disk into the cache."""
-        # Load agent memories
-        for agent_name in os.listdir(self.agent_memory_dir):
-            agent_dir = os.path.join(self.agent_memory_dir, agent_name)
-            if os.path.isdir(agent_dir):
-                self.memory_cache["agent_memory"][agent_name] = {}
-                for memory_file in os.listdir(agent_dir):
-                    if memory_file.endswith('.json'):
-                        file_path = os.path.join(agent_dir, memory_file)
-                        memory_type = memory_file.split('.')[0]  # e.g., 'plan', 'execution', 'molecular'
-                        with open(file_path, 'r') as f:
-                            self.memory_cache["agent_memory"][agent_name][memory_type] = json.load(f)
-        
-        # Load shared memories
-        for memory_file in os.listdir(self.shared_memory_dir):
-            if memory_file.endswith('.json'):
-                file_path = os.path.join(self.shared_memory_dir, memory_file)
-                memory_type = memory_file.split('.')[0]
-                with open(file_path, 'r') as f:
-                    self.memory_cache["shared_memory"][memory_type] = json.load(f)
-        
-        # Load recent conversations (limited to 100 most recent)
-        conversation_files = []
-        for conv_file in os.listdir(self.conversation_dir):
-            if conv_file.endswith('.json'):
-                file_path = os.path.join(self.conversation_dir, conv_file)
-                file_time = os.path.getmtime(file_path)
-                conversation_files.append((file_path, file_time))
-        
-        # Sort by modification time (newest first) and take most recent 100
-        conversation_files.sort(key=lambda x: x[1], reverse=True)
-        for file_path, _ in conversation_files[:100]:
-            with open(file_path, 'r') as f:
-                conv_data = json.load(f)
-                conv_id = os.path.basename(file_path).split('.')[0]
-                self.memory_cache["conversations"][conv_id] = conv_data
+        """Load existing memories from the backend into the cache."""
+        self.memory_cache["agent_memory"] = self.backend.load_agent_memories()
+        self.memory_cache["shared_memory"] = self.backend.load_shared_memories()
+        
+        # Measure what was loaded once; writes keep the counters current from here on
+        for agent_name, memory_types in self.memory_cache["agent_memory"].items():
+            for memory_type, memory_data in memory_types.items():
+                self.stats.set_agent_memory(agent_name, memory_type, memory_data)
+        for memory_type, memory_data in self.memory_cache["shared_memory"].items():
+            self.stats.set_shared_memory(memory_type, memory_data)
+        self.stats.set_conversation_count(self.backend.count_conversations())
+        
+        # Warm the cache with the most recent conversations (oldest first, so the newest stay most recent)
+        warm = int(os.getenv("MEMORY_CACHE_WARM_CONVERSATIONS", "100"))
+        for conversation in reversed(self.backend.recent_conversations(warm) if warm > 0 else []):
+            self._cache_conversation(conversation)
     
     def get_agent_memory(self, agent_name: str, memory_type: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -123,67 +155,60 @@ class MemoryManager:
         # Update memory in cache
         self.memory_cache["agent_memory"][agent_name][memory_type] = memory_data
         
-        # Ensure agent directory exists
-        agent_dir = os.path.join(self.agent_memory_dir, agent_name)
-        os.makedirs(agent_dir, exist_ok=True)
-        
-        # Save to disk
-        self._save_agent_memory(agent_name, memory_type, memory_data)
-    
-    def _save_agent_memory(self, agent_name: str, memory_type: str, memory_data: Dict[str, Any]):
-        """Save agent memory to disk with proper error handling."""
-        agent_dir = os.path.join(self.agent_memory_dir, agent_name)
-        file_path = os.path.join(agent_dir, f"{memory_type}.json")
-        
-        # Create backup if file exists
-        if os.path.exists(file_path):
-            backup_path = file_path + ".bak"
-            try:
-                shutil.copy2(file_path, backup_path)
-            except Exception as e:
-                print(f"Warning: Could not create backup of {file_path}: {e}")
-        
-        # Save new data
-        try:
-            with open(file_path, 'w') as f:
-                json.dump(memory_data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving to {file_path}: {e}")
-            # Restore from backup if available
-            if os.path.exists(backup_path):
-                try:
-                    shutil.copy2(backup_path, file_path)
-                    print(f"Restored {file_path} from backup")
-                except Exception as e2:
-                    print(f"Error restoring backup: {e2}")
+        # Save to storage
+        self.backend.save_agent_memory(agent_name, memory_type, memory_data)
+        self.stats.set_agent_memory(agent_name, memory_type, memory_data)
+        self.stats.record_write()
     
     def _merge_molecular_knowledge(self, new_knowledge: Dict[str, Any]):
-        """Specialized method to merge molecular knowledge from TxGemma."""
-        if "molecular_agent" not in self.memory_cache["agent_memory"]:
-            self.memory_cache["agent_memory"]["molecular_agent"] = {}
-            
-        existing = self.memory_cache["agent_memory"].get("molecular_agent", {}).get("molecular_knowledge", {})
+        """
+        Specialized method to merge molecular knowledge from TxGemma.
         
-        # Intelligent merging of molecular knowledge
-        for key, new_items in new_knowledge.items():
-            if key not in existing:
-                existing[key] = []
+        Duplicates are found through per-key sets of canonical item hashes,
+        and only the new items are handed to the backend as a delta, so a
+        merge costs the same however much knowledge has accumulated.
+        """
+        with self._knowledge_lock:
+            agent_memory = self.memory_cache["agent_memory"].setdefault("molecular_agent", {})
+            existing = agent_memory.setdefault("molecular_knowledge", {})
+            if self._knowledge_hashes is None:
+                self._knowledge_hashes = build_hashes(existing)
             
-            # Add new items, avoiding duplicates
-            if isinstance(new_items, list):
-                for item in new_items:
-                    if item not in existing[key]:
-                        existing[key].append(item)
-            else:
-                # Handle case where new_items is not a list
-                if new_items not in existing[key]:
-                    existing[key].append(new_items)
-        
-        # Update the cache
-        self.memory_cache["agent_memory"]["molecular_agent"]["molecular_knowledge"] = existing
+            added = apply_delta(existing, new_knowledge, self._knowledge_hashes)
+            if not added:
+                return
+            
+            # Save only the new items to storage
+            self.backend.append_agent_memory("molecular_agent", "molecular_knowledge", added, existing)
+        
+        self.stats.add_agent_memory(
+            "molecular_agent", "molecular_knowledge",
+            size=len(json.dumps(added, default=str)),
+            entries=sum(len(items) for items in added.values())
+        )
+        self.stats.record_write()
+    
+    def _trim_molecular_knowledge(self, policy: RetentionPolicy) -> int:
+        """
+        Apply a retention policy's knowledge limits to the molecular knowledge,
+        rewriting it in full if anything was dropped. Called by the compactor.
         
-        # Save to disk
-        self._save_agent_memory("molecular_agent", "molecular_knowledge", existing)
+        Returns:
+            int: Number of knowledge items dropped
+        """
+        with self._knowledge_lock:
+            knowledge = self.memory_cache["agent_memory"].get("molecular_agent", {}).get("molecular_knowledge")
+            if not knowledge:
+                return 0
+            dropped = policy.trim_knowledge(knowledge)
+            if not dropped:
+                return 0
+            # Rebuilt on the next merge, so dropped items can be learned again
+            self._knowledge_hashes = None
+            self.backend.save_agent_memory("molecular_agent", "molecular_knowledge", knowledge)
+            self.stats.set_agent_memory("molecular_agent", "molecular_knowledge", knowledge)
+        self.stats.record_write()
+        return dropped
     
     def get_shared_memory(self, memory_type: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -211,16 +236,14 @@ class MemoryManager:
         # Update memory in cache
         self.memory_cache["shared_memory"][memory_type] = memory_data
         
-        # Save to disk
-        file_path = os.path.join(self.shared_memory_dir, f"{memory_type}.json")
-        try:
-            with open(file_path, 'w') as f:
-                json.dump(memory_data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving shared memory to {file_path}: {e}")
+        # Save to storage
+        self.backend.save_shared_memory(memory_type, memory_data)
+        self.stats.set_shared_memory(memory_type, memory_data)
+        self.stats.record_write()
     
     def record_conversation(self, user_query: str, agent_responses: Dict[str, str], 
-                           synthesis_response: str, selected_agents: List[str]) -> str:
+                           synthesis_response: str, selected_agents: List[str],
+                           user_context: Optional[Dict[str, Any]] = None) -> str:
         """
         Record a conversation for future reference.
         
@@ -229,6 +252,7 @@ class MemoryManager:
             agent_responses (Dict[str, str]): Responses from each agent
             synthesis_response (str): The final synthesized response
             selected_agents (List[str]): List of agents that contributed
+            user_context (Optional[Dict[str, Any]]): Authenticated user; its user_id owns the conversation
         
         Returns:
             str: Unique ID of the recorded conversation
@@ -239,6 +263,7 @@ class MemoryManager:
         # Create conversation record
         conversation = {
             "id": conversation_id,
+            "user_id": _user_id(user_context),
             "timestamp": datetime.datetime.now().isoformat(),
             "user_query": user_query,
             "agent_responses": agent_responses,
@@ -247,15 +272,13 @@ class MemoryManager:
         }
         
         # Store in cache
-        self.memory_cache["conversations"][conversation_id] = conversation
+        self._cache_conversation(conversation)
         
-        # Save to disk
-        file_path = os.path.join(self.conversation_dir, f"{conversation_id}.json")
-        try:
-            with open(file_path, 'w') as f:
-                json.dump(conversation, f, indent=2)
-        except Exception as e:
-            print(f"Error saving conversation to {file_path}: {e}")
+        # Save to storage
+        self.backend.save_conversation(conversation)
+        self.conversation_vectors.add(conversation)
+        self.stats.add_conversation(conversation)
+        self.stats.record_write()
         
         return conversation_id
     
@@ -269,40 +292,108 @@ class MemoryManager:
         Returns:
             Dict[str, Any]: The conversation data
         """
-        return self.memory_cache["conversations"].get(conversation_id, {})
+        conversation = self.memory_cache["conversations"].get(conversation_id)
+        if conversation is None:
+            # Cache miss: load lazily from storage
+            conversation = self.backend.get_conversation(conversation_id)
+            if conversation is None:
+                return {}
+            self._cache_conversation(conversation)
+        return conversation
+    
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """
+        Delete a conversation from storage, the cache and the search indexes.
+        
+        Args:
+            conversation_id (str): Unique ID of the conversation
+            
+        Returns:
+            bool: False if the conversation didn't exist
+        """
+        if not self.backend.delete_conversation(conversation_id):
+            return False
+        self.memory_cache["conversations"].invalidate(conversation_id)
+        self.conversation_vectors.remove(conversation_id)
+        self.stats.remove_conversation()
+        self.stats.record_write()
+        return True
+    
+    def _cache_conversation(self, conversation: Dict[str, Any]) -> None:
+        # Bytes are measured as the serialized size, which tracks resident size closely enough
+        size = len(json.dumps(conversation, default=str))
+        self.memory_cache["conversations"].set(conversation["id"], conversation, size=size)
+        self.stats.observe_conversation(conversation)
     
-    def search_conversations(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def search_conversations(self, query: str, limit: int = 5, offset: int = 0,
+                             mode: str = "keyword",
+                             user_context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Search through conversation history for relevant conversations.
         
+        Every stored conversation is searchable, not just the cached ones.
+        
         Args:
             query (str): The search query
             limit (int): Maximum number of results to return
+            offset (int): Number of top results to skip, for pagination
+            mode (str): "keyword" (BM25 full-text), "semantic" (embedding
+                similarity) or "hybrid" (both, fused by reciprocal rank)
+            user_context (Optional[Dict[str, Any]]): When it carries a user_id, only
+                that user's conversations are searched
             
         Returns:
-            List[Dict[str, Any]]: List of relevant conversations
+            List[Dict[str, Any]]: List of relevant conversations, best match first
         """
-        # Simple search implementation - can be enhanced with vector embedding search
-        results = []
-        query_lower = query.lower()
-        
-        for conv_id, conversation in self.memory_cache["conversations"].items():
-            # Check if query appears in user question or response
-            if (query_lower in conversation["user_query"].lower() or 
-                query_lower in conversation["synthesis_response"].lower()):
-                results.append(conversation)
-                
-            # Check agent responses
-            for agent_name, response in conversation["agent_responses"].items():
-                if isinstance(response, str) and query_lower in response.lower():
-                    if conversation not in results:
-                        results.append(conversation)
-                    break
+        user_id = _user_id(user_context)
+        
+        if mode == "keyword":
+            return self.backend.search_conversations(query, limit=limit, offset=offset, user_id=user_id)
+        
+        if mode == "semantic":
+            matches = self.conversation_vectors.search(query, limit=limit, offset=offset, user_id=user_id)
+            return self._load_conversations([conversation_id for conversation_id, _ in matches])
+        
+        if mode == "hybrid":
+            # Rank fusion needs more than one page from each side to order the page well
+            depth = 2 * (offset + limit)
+            keyword_ids = [c["id"] for c in self.backend.search_conversations(query, limit=depth, user_id=user_id)]
+            semantic_ids = [cid for cid, _ in self.conversation_vectors.search(query, limit=depth, user_id=user_id)]
+            
+            scores: Dict[str, float] = {}
+            for ranking in (keyword_ids, semantic_ids):
+                for rank, conversation_id in enumerate(ranking):
+                    scores[conversation_id] = scores.get(conversation_id, 0.0) + 1.0 / (RRF_K + rank + 1)
             
-            if len(results) >= limit:
-                break
+            ranked = sorted(scores, key=scores.get, reverse=True)
+            return self._load_conversations(ranked[offset:offset + limit])
+        
+        raise ValueError(f"Unknown search mode '{mode}'. Choose 'keyword', 'semantic' or 'hybrid'.")
+    
+    def get_conversation_history(self, user_context: Optional[Dict[str, Any]] = None,
+                                 limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        List past conversations, newest first.
         
-        return results[:limit]
+        Args:
+            user_context (Optional[Dict[str, Any]]): When it carries a user_id, only
+                that user's conversations are listed
+            limit (int): Maximum number of conversations to return
+            offset (int): Number of conversations to skip, for pagination
+            
+        Returns:
+            List[Dict[str, Any]]: Conversations, newest first
+        """
+        return self.backend.list_conversations(_user_id(user_context), limit=limit, offset=offset)
+    
+    def _load_conversations(self, conversation_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch conversations by ID, from the cache when possible, preserving order."""
+        conversations = []
+        for conversation_id in conversation_ids:
+            conversation = self.get_conversation(conversation_id)
+            if conversation:
+                conversations.append(conversation)
+        return conversations
     
     def clear_memory(self, agent_name: Optional[str] = None, memory_type: Optional[str] = None):
         """
@@ -317,73 +408,58 @@ class MemoryManager:
                 # Clear specific memory type for specific agent
                 if agent_name in self.memory_cache["agent_memory"] and memory_type in self.memory_cache["agent_memory"][agent_name]:
                     self.memory_cache["agent_memory"][agent_name][memory_type] = {}
-                    file_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}.json")
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
             else:
                 # Clear all memory types for specific agent
                 if agent_name in self.memory_cache["agent_memory"]:
                     self.memory_cache["agent_memory"][agent_name] = {}
-                    agent_dir = os.path.join(self.agent_memory_dir, agent_name)
-                    if os.path.exists(agent_dir):
-                        for file_name in os.listdir(agent_dir):
-                            os.remove(os.path.join(agent_dir, file_name))
         else:
             if memory_type:
                 # Clear specific memory type for all agents
-                for agent_name in self.memory_cache["agent_memory"]:
-                    if memory_type in self.memory_cache["agent_memory"][agent_name]:
-                        self.memory_cache["agent_memory"][agent_name][memory_type] = {}
-                        file_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}.json")
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
+                for name in self.memory_cache["agent_memory"]:
+                    if memory_type in self.memory_cache["agent_memory"][name]:
+                        self.memory_cache["agent_memory"][name][memory_type] = {}
             else:
                 # Clear all memories for all agents
                 self.memory_cache["agent_memory"] = {}
-                if os.path.exists(self.agent_memory_dir):
-                    shutil.rmtree(self.agent_memory_dir)
-                    os.makedirs(self.agent_memory_dir)
+        
+        # The backend only moves the data aside; the compactor deletes it off the request path
+        self.backend.delete_agent_memory(agent_name, memory_type)
+        self.compactor.wake()
+        with self._knowledge_lock:
+            # Rebuilt from whatever molecular knowledge is left on the next merge
+            self._knowledge_hashes = None
+        self.stats.clear_agent_memory(agent_name, memory_type)
+        self.stats.record_write()
     
     def get_memory_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the memory system.
         
+        Served from counters maintained on every write, so the cost doesn't
+        grow with the amount of memory stored.
+        
         Returns:
             Dict[str, Any]: Statistics about the memory system
         """
-        stats = {
-            "agent_memory": {},
-            "shared_memory": {},
-            "conversations": {
-                "total": len(self.memory_cache["conversations"]),
-                "oldest": None,
-                "newest": None
-            }
-        }
+        stats = self.stats.snapshot()
         
-        # Agent memory stats
-        for agent_name, memory_types in self.memory_cache["agent_memory"].items():
-            stats["agent_memory"][agent_name] = {
-                "memory_types": list(memory_types.keys()),
-                "size": sum(len(str(memory_data)) for memory_data in memory_types.values())
-            }
-        
-        # Shared memory stats
-        stats["shared_memory"] = {
-            "memory_types": list(self.memory_cache["shared_memory"].keys()),
-            "size": sum(len(str(memory_data)) for memory_data in self.memory_cache["shared_memory"].values())
-        }
+        # Resident entries and bytes, hit rate and evictions of the LRU
+        stats["conversations"]["cache"] = self.memory_cache["conversations"].get_stats()
         
-        # Conversation stats
-        if self.memory_cache["conversations"]:
-            timestamps = [conv.get("timestamp") for conv in self.memory_cache["conversations"].values() 
-                         if "timestamp" in conv]
-            if timestamps:
-                stats["conversations"]["oldest"] = min(timestamps)
-                stats["conversations"]["newest"] = max(timestamps)
+        stats["storage"] = {
+            "backend": self.backend.name,
+            "disk_bytes": self.backend.disk_usage(),
+            "writes": stats.pop("writes"),
+            # Retention passes, archived and deleted conversations, archive size
+            "compaction": self.compactor.get_stats()
+        }
         
         return stats
 
+def _user_id(user_context: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The user ID from an optional user context."""
+    return (user_context or {}).get("user_id")
+
 # Create a global instance of the memory manager
 memory_manager = MemoryManager()
 
@@ -0,0 +1,175 @@
+# utils/memory_stats.py
+
+from typing import Dict, Any, Optional, Tuple
+import json
+import time
+import threading
+
+
+def measure(memory_data: Any) -> Tuple[int, int]:
+    """
+    Size a memory object when it is written.
+
+    Returns:
+        Tuple[int, int]: Serialized size in bytes, and the number of entries
+            (list items, summed over a dict's list values)
+    """
+    size = len(json.dumps(memory_data, default=str))
+    if isinstance(memory_data, dict):
+        entries = sum(len(value) if isinstance(value, list) else 1 for value in memory_data.values())
+    elif isinstance(memory_data, list):
+        entries = len(memory_data)
+    else:
+        entries = 1
+    return size, entries
+
+
+class MemoryStats:
+    """
+    Running counters behind MemoryManager.get_memory_stats.
+
+    Every memory write updates the size and entry count of the object it
+    touched, so a stats snapshot is a walk over the (few) agent and memory
+    type names rather than a serialization of all memory. Writes are also
+    counted into one-second buckets over a sliding window for a write rate.
+    """
+
+    def __init__(self, window: int = 60):
+        """
+        Initialize empty counters.
+
+        Args:
+            window (int): Seconds the write rate is averaged over
+        """
+        self.window = window
+
+        self._lock = threading.Lock()
+        # agent -> memory type -> (bytes, entries)
+        self._agent_memory: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        # memory type -> (bytes, entries)
+        self._shared_memory: Dict[str, Tuple[int, int]] = {}
+
+        self._conversations = 0
+        self._oldest: Optional[str] = None
+        self._newest: Optional[str] = None
+
+        self._writes = 0
+        self._bucket_counts = [0] * window
+        self._bucket_seconds = [0] * window
+
+    def set_agent_memory(self, agent_name: str, memory_type: str, memory_data: Any) -> None:
+        """Record that an agent memory object was replaced."""
+        measured = measure(memory_data)
+        with self._lock:
+            self._agent_memory.setdefault(agent_name, {})[memory_type] = measured
+
+    def add_agent_memory(self, agent_name: str, memory_type: str, size: int, entries: int) -> None:
+        """Record that entries were appended to an agent memory object."""
+        with self._lock:
+            types = self._agent_memory.setdefault(agent_name, {})
+            current_size, current_entries = types.get(memory_type, (0, 0))
+            types[memory_type] = (current_size + size, current_entries + entries)
+
+    def clear_agent_memory(self, agent_name: Optional[str] = None, memory_type: Optional[str] = None) -> None:
+        """Forget agent memory, with the same selection rules as MemoryManager.clear_memory."""
+        with self._lock:
+            if agent_name is None and memory_type is None:
+                self._agent_memory = {}
+                return
+            for name, types in self._agent_memory.items():
+                if agent_name is not None and name != agent_name:
+                    continue
+                if memory_type is None:
+                    types.clear()
+                elif memory_type in types:
+                    types[memory_type] = measure({})
+
+    def set_shared_memory(self, memory_type: str, memory_data: Any) -> None:
+        """Record that a shared memory object was replaced."""
+        measured = measure(memory_data)
+        with self._lock:
+            self._shared_memory[memory_type] = measured
+
+    def set_conversation_count(self, count: int) -> None:
+        with self._lock:
+            self._conversations = count
+
+    def add_conversation(self, conversation: Dict[str, Any]) -> None:
+        """Count a newly recorded conversation."""
+        with self._lock:
+            self._conversations += 1
+        self.observe_conversation(conversation)
+
+    def remove_conversation(self) -> None:
+        """Count a deleted conversation."""
+        with self._lock:
+            self._conversations = max(0, self._conversations - 1)
+
+    def set_oldest_conversation(self, timestamp: Optional[str]) -> None:
+        """Reset the oldest timestamp after old conversations were retired."""
+        with self._lock:
+            self._oldest = timestamp
+
+    def observe_conversation(self, conversation: Dict[str, Any]) -> None:
+        """Widen the oldest/newest range with a conversation's timestamp."""
+        timestamp = conversation.get("timestamp")
+        if not timestamp:
+            return
+        with self._lock:
+            if self._oldest is None or timestamp < self._oldest:
+                self._oldest = timestamp
+            if self._newest is None or timestamp > self._newest:
+                self._newest = timestamp
+
+    def record_write(self) -> None:
+        """Count one write to storage."""
+        second = int(time.time())
+        slot = second % self.window
+        with self._lock:
+            self._writes += 1
+            if self._bucket_seconds[slot] != second:
+                self._bucket_seconds[slot] = second
+                self._bucket_counts[slot] = 0
+            self._bucket_counts[slot] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current statistics.
+
+        Returns:
+            Dict[str, Any]: Agent memory, shared memory, conversation and write statistics
+        """
+        now = int(time.time())
+        with self._lock:
+            agent_memory = {
+                agent_name: {
+                    "memory_types": list(types.keys()),
+                    "size": sum(size for size, _ in types.values()),
+                    "entries": sum(entries for _, entries in types.values())
+                }
+                for agent_name, types in self._agent_memory.items()
+            }
+            shared_memory = {
+                "memory_types": list(self._shared_memory.keys()),
+                "size": sum(size for size, _ in self._shared_memory.values()),
+                "entries": sum(entries for _, entries in self._shared_memory.values())
+            }
+            recent_writes = sum(
+                count for count, second in zip(self._bucket_counts, self._bucket_seconds)
+                if now - second < self.window
+            )
+            return {
+                "agent_memory": agent_memory,
+                "shared_memory": shared_memory,
+                "conversations": {
+                    "total": self._conversations,
+                    "oldest": self._oldest,
+                    "newest": self._newest
+                },
+                "writes": {
+                    "total": self._writes,
+                    "last_window": recent_writes,
+                    "per_second": round(recent_writes / self.window, 3),
+                    "window_seconds": self.window
+                }
+            }
@@ -0,0 +1,74 @@
+# utils/metrics.py
+
+from typing import Dict, Any, Optional
+import threading
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry for counters and gauges.
+
+    Metric names may carry labels, which are folded into the key as
+    'name{label=value,...}' so the snapshot stays a flat dictionary.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name (str): Metric name
+            value (float): Amount to add
+            labels (Optional[Dict[str, str]]): Metric labels
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Set a gauge to the given value.
+
+        Args:
+            name (str): Metric name
+            value (float): Current value
+            labels (Optional[Dict[str, str]]): Metric labels
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        """Get the current value of a counter or gauge (0 if unset)."""
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of all metrics.
+
+        Returns:
+            Dict[str, Any]: Counters and gauges keyed by metric name
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges)
+            }
+
+    def _key(self, name: str, labels: Optional[Dict[str, str]]) -> str:
+        if not labels:
+            return name
+        label_text = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+        return f"{name}{{{label_text}}}"
+
+
+# Create a global metrics registry
+metrics = MetricsRegistry()
@@ -0,0 +1,286 @@
+# utils/prompt_budget.py
+
+from typing import Dict, Any, List, Optional, Tuple
+import re
+
+from utils.usage_tracker import estimate_tokens
+
+# tiktoken gives exact counts for OpenAI models; fall back to the
+# character heuristic when it isn't installed
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoders = {}
+
+# Lines carrying figures are the content synthesis is told to preserve
+_NUMERIC_PATTERN = re.compile(r"\d|%|\$")
+_HEADING_PATTERN = re.compile(r"^\s*(#+\s|\*\*[^*]+\*\*\s*$)")
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """
+    Count tokens locally.
+
+    Args:
+        text (str): Text to count
+        model (str): Model whose tokenizer should be used
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoders[model] = tiktoken.get_encoding("cl100k_base")
+    return len(_encoders[model].encode(text, disallowed_special=()))
+
+
+class PromptBudget:
+    """
+    Assigns token budgets to prompt sections and trims sections to fit.
+
+    Each section gets a share of the available tokens proportional to its
+    priority weight. Sections that need less than their share give the
+    surplus back to the others, so a short market response lets a long
+    molecular response keep more of its content.
+    """
+
+    DEFAULT_PRIORITIES = {
+        "molecular_agent": 2.0,
+    }
+
+    def __init__(self, max_tokens: int, model: str = "gpt-4",
+                 priorities: Optional[Dict[str, float]] = None):
+        """
+        Initialize the prompt budget.
+
+        Args:
+            max_tokens (int): Total tokens available to the budgeted sections
+            model (str): Model whose tokenizer is used for counting
+            priorities (Optional[Dict[str, float]]): Weight per section name (default 1.0)
+        """
+        self.max_tokens = max_tokens
+        self.model = model
+        self.priorities = dict(self.DEFAULT_PRIORITIES)
+        if priorities:
+            self.priorities.update(priorities)
+
+    def allocate(self, sections: Dict[str, str]) -> Dict[str, int]:
+        """
+        Split the token budget across sections.
+
+        Args:
+            sections (Dict[str, str]): Section name to section text
+
+        Returns:
+            Dict[str, int]: Token budget per section
+        """
+        demand = {name: count_tokens(text, self.model) for name, text in sections.items()}
+        budgets = {}
+        remaining = self.max_tokens
+        pending = dict(demand)
+
+        # Water-filling: satisfy sections that fit within their weighted share,
+        # then redistribute what they didn't use among the rest
+        while pending:
+            total_weight = sum(self.priorities.get(name, 1.0) for name in pending)
+            shares = {name: remaining * self.priorities.get(name, 1.0) / total_weight for name in pending}
+            satisfied = [name for name in pending if pending[name] <= shares[name]]
+
+            if not satisfied:
+                for name in pending:
+                    budgets[name] = int(shares[name])
+                break
+
+            for name in satisfied:
+                budgets[name] = pending.pop(name)
+                remaining -= budgets[name]
+
+        return budgets
+
+    def fit(self, sections: Dict[str, str]) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        """
+        Trim every section to its allocated budget.
+
+        Args:
+            sections (Dict[str, str]): Section name to section text
+
+        Returns:
+            Tuple of the fitted sections and one budget decision record per section
+        """
+        budgets = self.allocate(sections)
+        fitted = {}
+        decisions = []
+
+        for name, text in sections.items():
+            fitted_text, action = self.fit_text(text, budgets[name])
+            fitted[name] = fitted_text
+            decisions.append({
+                "section": name,
+                "priority": self.priorities.get(name, 1.0),
+                "original_tokens": count_tokens(text, self.model),
+                "budget_tokens": budgets[name],
+                "final_tokens": count_tokens(fitted_text, self.model),
+                "action": action
+            })
+
+        return fitted, decisions
+
+    def fit_text(self, text: str, budget: int) -> Tuple[str, str]:
+        """
+        Reduce a single text to the token budget, dropping the lowest-value content first.
+
+        Args:
+            text (str): Text to fit
+            budget (int): Token budget
+
+        Returns:
+            Tuple of the fitted text and the action taken
+            ('none', 'compressed', 'dropped_blocks' or 'truncated')
+        """
+        if count_tokens(text, self.model) <= budget:
+            return text, "none"
+
+        # 1. Lossless-ish compression: collapse whitespace and repeated lines
+        compressed = self._compress(text)
+        if count_tokens(compressed, self.model) <= budget:
+            return compressed, "compressed"
+
+        # 2. Drop the lowest-value blocks until the text fits
+        blocks = [b for b in re.split(r"\n\s*\n", compressed) if b.strip()]
+        scored = sorted(range(len(blocks)), key=lambda i: self._block_value(blocks[i], i, len(blocks)))
+        kept = set(range(len(blocks)))
+        block_tokens = [count_tokens(b, self.model) for b in blocks]
+        total = sum(block_tokens)
+
+        for index in scored:
+            if total <= budget or len(kept) == 1:
+                break
+            kept.discard(index)
+            total -= block_tokens[index]
+
+        reduced = "\n\n".join(blocks[i] for i in sorted(kept))
+        if count_tokens(reduced, self.model) <= budget:
+            return reduced, "dropped_blocks"
+
+        # 3. Last resort: hard truncation of what remains
+        return self._truncate(reduced, budget), "truncated"
+
+    def _compress(self, text: str) -> str:
+        """
+        Collapse runs of whitespace and blank lines, and drop consecutive duplicate lines.
+
+        Markdown table rows and code blocks are kept verbatim: separator rows
+        repeat by design, and whitespace inside code is significant.
+        """
+        lines = []
+        in_code = False
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.startswith(("```", "~~~")):
+                in_code = not in_code
+                lines.append(line.rstrip())
+                continue
+            if in_code or stripped.startswith("|"):
+                lines.append(line)
+                continue
+
+            # Keep indentation, which nests lists
+            indent = line[:len(line) - len(line.lstrip())]
+            compact = indent + re.sub(r"[ \t]+", " ", stripped) if stripped else ""
+            if lines and compact == lines[-1]:
+                continue
+            lines.append(compact)
+        return "\n".join(lines).strip("\n")
+
+    def _block_value(self, block: str, position: int, total_blocks: int) -> float:
+        """Score a block; lower scores are dropped first."""
+        lines = block.splitlines()
+        numeric_lines = sum(1 for line in lines if _NUMERIC_PATTERN.search(line))
+
+        score = numeric_lines / max(len(lines), 1)
+        # Formatters lead with summaries, so earlier blocks are worth more
+        score += 1.0 - position / max(total_blocks, 1)
+        # A lone heading carries no content once its body is gone
+        if len(lines) == 1 and _HEADING_PATTERN.match(lines[0]):
+            score -= 0.5
+        return score
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """Cut text to the budget at a line boundary where possible."""
+        if budget <= 0:
+            return ""
+
+        if count_tokens(text, self.model) <= budget:
+            return text
+        # Leave room for the truncation marker
+        cut = _longest_prefix(text, max(budget - 3, 0), self.model)
+        newline = cut.rfind("\n")
+        if newline > len(cut) // 2:
+            cut = cut[:newline]
+        return cut.rstrip() + "\n[...]"
+
+
+def _longest_prefix(text: str, max_tokens: int, model: str) -> str:
+    """Binary search for the longest prefix of text within max_tokens."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid], model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def _longest_suffix(text: str, max_tokens: int, model: str) -> str:
+    """Binary search for the longest suffix of text within max_tokens."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[len(text) - mid:], model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[len(text) - low:]
+
+
+def fit_query(query: str, max_tokens: int, model: str = "gpt-4") -> Tuple[str, Dict[str, Any]]:
+    """
+    Bound a user query to max_tokens, keeping its beginning and end.
+
+    Args:
+        query (str): The user query
+        max_tokens (int): Token budget for the query
+        model (str): Model whose tokenizer is used for counting
+
+    Returns:
+        Tuple of the fitted query and the budget decision record
+    """
+    original_tokens = count_tokens(query, model)
+    decision = {
+        "section": "query",
+        "original_tokens": original_tokens,
+        "budget_tokens": max_tokens,
+        "final_tokens": original_tokens,
+        "action": "none"
+    }
+    if original_tokens <= max_tokens:
+        return query, decision
+
+    # The question is usually stated at the start or the end of a long query
+    head = _longest_prefix(query, max_tokens // 2, model)
+    tail = _longest_suffix(query, max_tokens - max_tokens // 2 - 5, model)
+    fitted = f"{head.rstrip()}\n[...]\n{tail.lstrip()}"
+
+    decision["final_tokens"] = count_tokens(fitted, model)
+    decision["action"] = "truncated"
+    return fitted, decision
@@ -0,0 +1,274 @@
+# utils/semantic_cache.py
+
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
+import threading
+
+import numpy as np
+
+from utils.embeddings import get_embedder, HashingEmbedder
+from utils.metrics import metrics
+
+
+class SemanticCache:
+    """
+    Response cache that matches repeated, and optionally near-duplicate, prompts.
+
+    Every entry is indexed by its exact (whitespace-normalized) prompt. With
+    semantic matching on, prompts are also embedded and stored in a
+    preallocated float32 matrix; lookups that miss exactly use
+    random-hyperplane LSH (probing the query's bucket and all buckets one bit
+    away) to find candidates, then score them by exact cosine similarity.
+    Entries only match within the same scope, so callers can pin exact-match
+    parameters (model, agent responses, context) while letting the free-text
+    part vary. When full, the entry with the fewest hits is evicted, oldest
+    first among ties.
+    """
+
+    def __init__(self, name: str, threshold: float = 0.92, max_entries: int = 2048,
+                 ttl: Optional[float] = None, num_planes: int = 12, exact_search_limit: int = 512,
+                 semantic: bool = True):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            name (str): Cache name used in metrics
+            threshold (float): Minimum cosine similarity for a hit
+            max_entries (int): Maximum number of cached entries
+            ttl (Optional[float]): Seconds an entry stays valid; None disables expiry
+            num_planes (int): Number of LSH hyperplanes (bits per bucket signature)
+            exact_search_limit (int): Below this many entries, scan all vectors instead of using LSH
+            semantic (bool): Match near-duplicate prompts by embedding; False matches exact prompts only
+        """
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.exact_search_limit = exact_search_limit
+        self.semantic = semantic
+
+        self._lock = threading.Lock()
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[int, set] = {}
+        self._size = 0
+
+        if semantic:
+            self.embedder = get_embedder()
+            dim = self.embedder.dim
+            rng = np.random.default_rng(0)
+            self._planes = rng.standard_normal((num_planes, dim)).astype(np.float32)
+            self._bit_weights = (1 << np.arange(num_planes)).astype(np.int64)
+            self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+
+    def lookup(self, text: str, scope: str = "") -> Optional[Any]:
+        """
+        Find a cached value for a semantically similar prompt.
+
+        Args:
+            text (str): Prompt text to match
+            scope (str): Exact-match namespace the entry must share
+
+        Returns:
+            Optional[Any]: The cached value or None on a miss
+        """
+        key = (scope, _normalize(text))
+        vector = self.embedder.embed(text) if self.semantic else None
+
+        with self._lock:
+            slot, similarity = self._exact(key), 1.0
+            if slot is None and vector is not None:
+                slot, similarity = self._nearest(vector, scope)
+            if slot is None or similarity < self.threshold:
+                metrics.increment("semantic_cache_requests", labels={"cache": self.name, "result": "miss"})
+                return None
+
+            entry = self._entries[slot]
+            entry["hits"] += 1
+            metrics.increment("semantic_cache_requests", labels={"cache": self.name, "result": "hit"})
+            return entry["value"]
+
+    def store(self, text: str, value: Any, scope: str = "") -> None:
+        """
+        Cache a value for a prompt.
+
+        Args:
+            text (str): Prompt text
+            value (Any): Value to return for similar prompts
+            scope (str): Exact-match namespace for the entry
+        """
+        key = (scope, _normalize(text))
+        vector = self.embedder.embed(text) if self.semantic else None
+        signature = self._signature(vector) if vector is not None else None
+
+        with self._lock:
+            if key in self._keys:
+                self._remove(self._keys[key])
+            if not self._free_slots:
+                self._evict()
+
+            slot = self._free_slots.pop()
+            self._entries[slot] = {
+                "key": key,
+                "scope": scope,
+                "value": value,
+                "signature": signature,
+                "stored_at": time.time(),
+                "hits": 0
+            }
+            self._keys[key] = slot
+            if vector is not None:
+                self._vectors[slot] = vector
+                self._buckets.setdefault(signature, set()).add(slot)
+            self._size += 1
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries = [None] * self.max_entries
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+            self._keys.clear()
+            self._buckets.clear()
+            self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Entry count, bucket count and total hits
+        """
+        with self._lock:
+            live = [e for e in self._entries if e is not None]
+            return {
+                "entries": len(live),
+                "max_entries": self.max_entries,
+                "buckets": len(self._buckets),
+                "total_hits": sum(e["hits"] for e in live),
+                "threshold": self.threshold,
+                "semantic": self.semantic
+            }
+
+    def _exact(self, key: Tuple[str, str]) -> Optional[int]:
+        """Return the live slot stored under exactly this prompt and scope."""
+        slot = self._keys.get(key)
+        if slot is None:
+            return None
+        if self.ttl is not None and time.time() - self._entries[slot]["stored_at"] > self.ttl:
+            self._remove(slot)
+            return None
+        return slot
+
+    def _nearest(self, vector: np.ndarray, scope: str):
+        """Return the best-matching live slot in scope and its similarity."""
+        if self._size == 0:
+            return None, 0.0
+
+        if self._size <= self.exact_search_limit:
+            candidates = [i for i, e in enumerate(self._entries) if e is not None]
+        else:
+            candidates = self._probe(self._signature(vector))
+
+        now = time.time()
+        live = []
+        for slot in candidates:
+            entry = self._entries[slot]
+            if entry is None or entry["scope"] != scope:
+                continue
+            if self.ttl is not None and now - entry["stored_at"] > self.ttl:
+                self._remove(slot)
+                continue
+            live.append(slot)
+
+        if not live:
+            return None, 0.0
+
+        similarities = self._vectors[live] @ vector
+        best = int(np.argmax(similarities))
+        return live[best], float(similarities[best])
+
+    def _signature(self, vector: np.ndarray) -> int:
+        bits = (self._planes @ vector) > 0
+        return int(bits.astype(np.int64) @ self._bit_weights)
+
+    def _probe(self, signature: int) -> List[int]:
+        """Collect slots from the signature's bucket and every bucket one bit away."""
+        candidates = list(self._buckets.get(signature, ()))
+        for bit in range(len(self._planes)):
+            candidates.extend(self._buckets.get(signature ^ (1 << bit), ()))
+        return candidates
+
+    def _evict(self) -> None:
+        """Evict the least-hit entry, oldest first among ties."""
+        victim = min(
+            (i for i, e in enumerate(self._entries) if e is not None),
+            key=lambda i: (self._entries[i]["hits"], self._entries[i]["stored_at"])
+        )
+        self._remove(victim)
+        metrics.increment("semantic_cache_evictions", labels={"cache": self.name})
+
+    def _remove(self, slot: int) -> None:
+        entry = self._entries[slot]
+        self._keys.pop(entry["key"], None)
+        bucket = self._buckets.get(entry["signature"])
+        if bucket is not None:
+            bucket.discard(slot)
+            if not bucket:
+                del self._buckets[entry["signature"]]
+        self._entries[slot] = None
+        self._free_slots.append(slot)
+        self._size -= 1
+
+
+def _normalize(text: str) -> str:
+    # Case is kept: it is significant in SMILES and gene names
+    return " ".join(text.split())
+
+
+def semantic_matching_available() -> bool:
+    """
+    Whether near-duplicate matching should be on by default.
+
+    The hashing embedder is a bag of words and character trigrams: it scores
+    swapped drug names or one-atom SMILES edits as near-identical while
+    missing real paraphrases, so only a loaded embedding model qualifies.
+    SEMANTIC_CACHE_MATCHING=semantic or =exact overrides the check.
+    """
+    matching = os.getenv("SEMANTIC_CACHE_MATCHING", "auto").lower()
+    if matching in ("semantic", "exact"):
+        return matching == "semantic"
+    return not isinstance(get_embedder(), HashingEmbedder)
+
+
+_caches: Dict[str, SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(name: str, semantic: bool = True) -> Optional[SemanticCache]:
+    """
+    Get the named semantic cache, or None when semantic caching is disabled.
+
+    Args:
+        name (str): Cache name
+        semantic (bool): Allow near-duplicate matching; callers whose answers
+            depend on exact identifiers (compounds, sequences) pass False
+
+    Configured through SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MATCHING,
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES and SEMANTIC_CACHE_TTL.
+    """
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    with _caches_lock:
+        if name not in _caches:
+            ttl = os.getenv("SEMANTIC_CACHE_TTL", "3600")
+            _caches[name] = SemanticCache(
+                name,
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048")),
+                ttl=float(ttl) if ttl else None,
+                semantic=semantic and semantic_matching_available()
+            )
+        return _caches[name]
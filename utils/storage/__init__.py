@@ -0,0 +1,48 @@
+# utils/storage/__init__.py
+
+import os
+
+from utils.storage.base import StorageBackend
+from utils.storage.json_backend import JSONBackend
+from utils.storage.sqlite_backend import SQLiteBackend
+from utils.storage.log_backend import LogBackend
+from utils.storage.segment_log import SegmentedLog
+from utils.storage.vector_index import VectorIndex
+from utils.storage.conversation_vectors import ConversationVectorStore
+from utils.storage.archive import ConversationArchive
+from utils.storage.retention import RetentionPolicy, MemoryCompactor
+
+
+def create_backend(name: str, storage_dir: str = "./memory") -> StorageBackend:
+    """
+    Create a storage backend by name.
+
+    Args:
+        name (str): "json" (one file per record), "sqlite" (WAL database) or
+            "log" (conversations in an append-only segmented log)
+        storage_dir (str): Base directory for stored memories
+
+    Returns:
+        StorageBackend: The configured backend
+    """
+    # Batch agent/shared memory file writes instead of fsyncing each one
+    group_commit = os.getenv("MEMORY_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+    if name == "json":
+        return JSONBackend(storage_dir, group_commit=group_commit)
+    if name == "sqlite":
+        return SQLiteBackend(os.getenv("MEMORY_DB_PATH", os.path.join(storage_dir, "memory.db")))
+    if name == "log":
+        return LogBackend(
+            storage_dir,
+            group_commit=group_commit,
+            segment_bytes=int(os.getenv("MEMORY_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+            compaction_interval=float(os.getenv("MEMORY_LOG_COMPACTION_INTERVAL", "300"))
+        )
+    raise ValueError(f"Unknown memory backend '{name}'. Choose 'json', 'sqlite' or 'log'.")
+
+
+__all__ = [
+    "StorageBackend", "JSONBackend", "SQLiteBackend", "LogBackend", "SegmentedLog", "VectorIndex",
+    "ConversationVectorStore", "ConversationArchive", "RetentionPolicy", "MemoryCompactor",
+    "create_backend"
+]
@@ -0,0 +1,143 @@
+# utils/storage/archive.py
+
+from typing import Dict, Any, List, Optional, Iterator
+import os
+import gzip
+import json
+import time
+import threading
+
+from utils.durable_write import atomic_write
+
+
+class ConversationArchive:
+    """
+    Compressed, write-once archive of conversations retired from the live store.
+
+    Each archive pass writes one or more gzip-compressed JSON-lines segments
+    (at most segment_records conversations each), atomically, before the
+    conversations are deleted from the live store; a crash in between leaves
+    a conversation in both places rather than in neither. The archive has
+    its own retention: whole segments are dropped, oldest first, once they
+    are older than max_age or the archive exceeds max_bytes. Segment sizes
+    are measured once at startup and kept current as segments are written
+    and dropped.
+
+        <archive_dir>/conversations-<unix time>-<n>.jsonl.gz
+    """
+
+    def __init__(self, archive_dir: str, segment_records: int = 10000,
+                 max_age: Optional[float] = None, max_bytes: Optional[int] = None):
+        """
+        Initialize the archive.
+
+        Args:
+            archive_dir (str): Directory holding the archive segments
+            segment_records (int): Maximum conversations per segment
+            max_age (Optional[float]): Seconds a segment is kept; None keeps segments forever
+            max_bytes (Optional[int]): Total segment bytes kept; None disables the bound
+        """
+        self.archive_dir = archive_dir
+        self.segment_records = segment_records
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(archive_dir, exist_ok=True)
+
+        # Segment path -> bytes, oldest first
+        self._segment_sizes: Dict[str, int] = {}
+        for path in self._segments():
+            try:
+                self._segment_sizes[path] = os.path.getsize(path)
+            except OSError:
+                pass
+        self._bytes = sum(self._segment_sizes.values())
+
+    def write(self, conversations: List[Dict[str, Any]]) -> List[str]:
+        """
+        Archive conversations into new segments.
+
+        Returns:
+            List[str]: Paths of the segments written
+        """
+        paths = []
+        with self._lock:
+            stamp = int(time.time())
+            for start in range(0, len(conversations), self.segment_records):
+                chunk = conversations[start:start + self.segment_records]
+                lines = "".join(json.dumps(c, default=str) + "\n" for c in chunk)
+                path = self._next_path(stamp)
+                data = gzip.compress(lines.encode("utf-8"))
+                atomic_write(path, data)
+                self._segment_sizes[path] = len(data)
+                self._bytes += len(data)
+                paths.append(path)
+        return paths
+
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over every archived conversation, oldest segment first."""
+        for path in self._segments():
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        yield json.loads(line)
+            except (OSError, EOFError, json.JSONDecodeError) as e:
+                print(f"Warning: Skipping unreadable archive segment {path}: {e}")
+
+    def enforce_retention(self) -> int:
+        """
+        Drop segments beyond the archive's age and size limits.
+
+        Returns:
+            int: Number of segments deleted
+        """
+        if self.max_age is None and self.max_bytes is None:
+            return 0
+        with self._lock:
+            cutoff = time.time() - self.max_age if self.max_age is not None else None
+
+            deleted = 0
+            for path, size in list(self._segment_sizes.items()):
+                # Names sort by creation, so the first segment kept ends the pass
+                too_old = cutoff is not None and self._created(path) < cutoff
+                too_big = self.max_bytes is not None and self._bytes > self.max_bytes
+                if not (too_old or too_big):
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error deleting archive segment {path}: {e}")
+                    continue
+                del self._segment_sizes[path]
+                self._bytes -= size
+                deleted += 1
+            return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self._segment_sizes),
+                "bytes": self._bytes
+            }
+
+    def _segments(self) -> List[str]:
+        """Segment paths, oldest first (the names sort by creation)."""
+        return [
+            os.path.join(self.archive_dir, name) for name in sorted(os.listdir(self.archive_dir))
+            if name.startswith("conversations-") and name.endswith(".jsonl.gz")
+        ]
+
+    @staticmethod
+    def _created(path: str) -> int:
+        """Unix time a segment was written, from its name."""
+        return int(os.path.basename(path).split("-")[1])
+
+    def _next_path(self, stamp: int) -> str:
+        n = 0
+        while True:
+            path = os.path.join(self.archive_dir, f"conversations-{stamp:012d}-{n:04d}.jsonl.gz")
+            if not os.path.exists(path):
+                return path
+            n += 1
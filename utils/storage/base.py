@@ -0,0 +1,148 @@
+# utils/storage/base.py
+
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import json
+from abc import ABC, abstractmethod
+
+
+class StorageBackend(ABC):
+    """
+    Persistence layer behind MemoryManager.
+
+    A backend stores three kinds of records: agent memory (keyed by agent
+    and memory type), shared memory (keyed by memory type) and conversations
+    (keyed by conversation ID). MemoryManager keeps its in-memory caches on
+    top of whichever backend is configured.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def load_agent_memories(self) -> Dict[str, Dict[str, Any]]:
+        """Return all agent memory as {agent_name: {memory_type: memory_data}}."""
+
+    @abstractmethod
+    def save_agent_memory(self, agent_name: str, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        """Store one agent memory type, replacing any previous value."""
+
+    def append_agent_memory(self, agent_name: str, memory_type: str, delta: Dict[str, List[Any]],
+                            memory_data: Dict[str, Any]) -> None:
+        """
+        Persist items appended to a keyed-list agent memory object.
+
+        Args:
+            agent_name (str): Agent the memory belongs to
+            memory_type (str): Memory type
+            delta (Dict[str, List[Any]]): Only the new items, by key
+            memory_data (Dict[str, Any]): The full object after the append
+
+        Backends that can store the delta on its own override this (and fold
+        deltas back in on load); the default rewrites the full object.
+        """
+        self.save_agent_memory(agent_name, memory_type, memory_data)
+
+    @abstractmethod
+    def delete_agent_memory(self, agent_name: Optional[str] = None, memory_type: Optional[str] = None) -> None:
+        """
+        Delete agent memory.
+
+        Args:
+            agent_name (Optional[str]): Agent to delete for; None means every agent
+            memory_type (Optional[str]): Memory type to delete; None means every type
+        """
+
+    @abstractmethod
+    def load_shared_memories(self) -> Dict[str, Any]:
+        """Return all shared memory as {memory_type: memory_data}."""
+
+    @abstractmethod
+    def save_shared_memory(self, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        """Store one shared memory type, replacing any previous value."""
+
+    @abstractmethod
+    def save_conversation(self, conversation: Dict[str, Any]) -> None:
+        """Store a conversation record (must carry "id" and "timestamp"; "user_id" may be None)."""
+
+    @abstractmethod
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """Delete a conversation and its search index entries. Returns False if it didn't exist."""
+
+    @abstractmethod
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return a conversation by ID, or None if it doesn't exist."""
+
+    @abstractmethod
+    def recent_conversations(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to limit conversations, newest first."""
+
+    @abstractmethod
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over every stored conversation, in no particular order."""
+
+    @abstractmethod
+    def search_conversations(self, query: str, limit: int = 5, offset: int = 0,
+                             user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Full-text search over every stored conversation.
+
+        Args:
+            query (str): Free-text query
+            limit (int): Maximum number of results
+            offset (int): Number of top results to skip, for pagination
+            user_id (Optional[str]): Only search this user's conversations
+
+        Returns:
+            List[Dict[str, Any]]: Matching conversations, best BM25 score first
+        """
+
+    @abstractmethod
+    def list_conversations(self, user_id: Optional[str] = None, limit: int = 20,
+                           offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        List conversations newest first, optionally only one user's.
+
+        Args:
+            user_id (Optional[str]): Owner to list for; None lists everyone's
+            limit (int): Maximum number of conversations
+            offset (int): Number of conversations to skip, for pagination
+
+        Returns:
+            List[Dict[str, Any]]: Conversations, newest first
+        """
+
+    @abstractmethod
+    def user_conversation_ids(self, user_id: str) -> List[str]:
+        """Return the IDs of every conversation owned by a user."""
+
+    @abstractmethod
+    def count_conversations(self) -> int:
+        """Return the number of stored conversations."""
+
+    def conversation_ids(self) -> List[str]:
+        """Return the ID of every stored conversation, without reading its content."""
+        return [conversation_id for _, conversation_id, _, _ in self.conversation_entries()]
+
+    def conversation_entries(self) -> List[Tuple[str, str, Optional[str], int]]:
+        """
+        Describe every stored conversation without returning its content.
+
+        Returns:
+            List[Tuple[str, str, Optional[str], int]]: (timestamp, id, user_id,
+                approximate bytes) for each conversation, oldest first
+        """
+        entries = [
+            (c["timestamp"], c["id"], c.get("user_id"), len(json.dumps(c, default=str)))
+            for c in self.iter_conversations()
+        ]
+        entries.sort()
+        return entries
+
+    def collect_garbage(self) -> None:
+        """Reclaim space from deleted data. Called by the background compactor."""
+
+    def disk_usage(self) -> int:
+        """Return the bytes the backend occupies on disk (0 if unknown)."""
+        return 0
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
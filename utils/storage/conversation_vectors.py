@@ -0,0 +1,144 @@
+# utils/storage/conversation_vectors.py
+
+from typing import Dict, Any, List, Optional, Tuple
+import os
+import atexit
+import threading
+
+import numpy as np
+
+from utils.embeddings import get_embedder
+from utils.storage.base import StorageBackend
+from utils.storage.vector_index import VectorIndex
+
+
+def embedding_text(conversation: Dict[str, Any]) -> str:
+    """The text a conversation is embedded from: the question and the final answer."""
+    return f"{conversation.get('user_query', '')}\n{conversation.get('synthesis_response', '')}"
+
+
+class ConversationVectorStore:
+    """
+    Embeddings of every stored conversation, for semantic search.
+
+    Conversations are embedded when they are written. The index itself is
+    loaded on first search: from its .npz snapshot when one exists, then
+    reconciled with the backend's conversation IDs (dropping deleted
+    conversations, embedding only the ones the snapshot lacks, and adding
+    any embedded since startup), so only new history is ever re-embedded.
+    The snapshot is rewritten every save_every additions and at exit.
+    """
+
+    def __init__(self, backend: StorageBackend, path: str, save_every: int = 1000):
+        """
+        Initialize the conversation vector store.
+
+        Args:
+            backend (StorageBackend): Backend holding the conversations
+            path (str): Path of the .npz index snapshot
+            save_every (int): Additions between snapshot writes
+        """
+        self.backend = backend
+        self.path = path
+        self.save_every = save_every
+        self.embedder = get_embedder()
+
+        self._lock = threading.Lock()
+        self._index: Optional[VectorIndex] = None
+        self._pending: Dict[str, np.ndarray] = {}
+        self._unsaved = 0
+        atexit.register(self.save)
+
+    def add(self, conversation: Dict[str, Any]) -> None:
+        """Embed a conversation and add it to the index."""
+        vector = self.embedder.embed(embedding_text(conversation))
+        with self._lock:
+            if self._index is None:
+                # Folded in when the index is first loaded
+                self._pending[conversation["id"]] = vector
+                return
+            self._index.add(conversation["id"], vector)
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def remove(self, conversation_id: str) -> None:
+        """Remove a conversation from the index."""
+        with self._lock:
+            self._pending.pop(conversation_id, None)
+            if self._index is not None and self._index.remove(conversation_id):
+                self._unsaved += 1
+
+    def search(self, query: str, limit: int = 5, offset: int = 0,
+               user_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Find the conversations most similar to a query.
+
+        Args:
+            query (str): Free-text query
+            limit (int): Maximum number of results
+            offset (int): Number of top results to skip, for pagination
+            user_id (Optional[str]): Only search this user's conversations
+
+        Returns:
+            List[Tuple[str, float]]: (conversation ID, cosine similarity) pairs, best first
+        """
+        index = self._get_index()
+        doc_ids = None if user_id is None else self.backend.user_conversation_ids(user_id)
+        return index.search(self.embedder.embed(query), limit, offset, doc_ids=doc_ids)
+
+    def save(self) -> None:
+        """Write the index snapshot if it changed."""
+        with self._lock:
+            if self._index is None or self._unsaved == 0:
+                return
+            self._unsaved = 0
+            index = self._index
+        try:
+            index.save(self.path)
+        except Exception as e:
+            print(f"Error saving conversation vectors to {self.path}: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index) if self._index is not None else len(self._pending)
+
+    def _get_index(self) -> VectorIndex:
+        with self._lock:
+            if self._index is not None:
+                return self._index
+
+            index = None
+            if os.path.exists(self.path):
+                try:
+                    index = VectorIndex.load(self.path)
+                except Exception as e:
+                    print(f"Warning: Could not load conversation vectors from {self.path}: {e}")
+            if index is None or index.dim != self.embedder.dim:
+                index = VectorIndex(self.embedder.dim)
+
+            # Reconcile the snapshot with the stored IDs: conversations deleted
+            # while the index was unloaded are dropped, and only those it lacks
+            # are read and embedded
+            conversation_ids = set(self.backend.conversation_ids())
+            stale = [doc_id for doc_id in index.doc_ids() if doc_id not in conversation_ids]
+            for doc_id in stale:
+                index.remove(doc_id)
+            missing_ids, missing_texts = [], []
+            for conversation_id in conversation_ids:
+                if conversation_id in index or conversation_id in self._pending:
+                    continue
+                conversation = self.backend.get_conversation(conversation_id)
+                if conversation is not None:
+                    missing_ids.append(conversation_id)
+                    missing_texts.append(embedding_text(conversation))
+            if missing_ids:
+                index.add_batch(missing_ids, self.embedder.embed_batch(missing_texts))
+            if self._pending:
+                index.add_batch(list(self._pending), np.stack(list(self._pending.values())))
+
+            self._unsaved = len(stale) + len(missing_ids) + len(self._pending)
+            self._pending = {}
+            self._index = index
+            return index
@@ -0,0 +1,55 @@
+# utils/storage/delta.py
+
+from typing import Dict, Any, List, Optional, Set
+import os
+import json
+import hashlib
+
+# Appended deltas a backend accumulates for one memory object before it
+# rewrites the full document and drops them
+DELTA_COMPACT_EVERY = int(os.getenv("MEMORY_DELTA_COMPACT_EVERY", "1000"))
+
+
+def canonical_hash(item: Any) -> str:
+    """Hash an item's canonical JSON form, so equal dicts hash equally regardless of key order."""
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def build_hashes(memory: Dict[str, Any]) -> Dict[str, Set[str]]:
+    """Per-key hash sets of a keyed-list memory object such as molecular knowledge."""
+    return {
+        key: {canonical_hash(item) for item in items}
+        for key, items in memory.items() if isinstance(items, list)
+    }
+
+
+def apply_delta(memory: Dict[str, Any], delta: Dict[str, Any],
+                hashes: Optional[Dict[str, Set[str]]] = None) -> Dict[str, List[Any]]:
+    """
+    Merge items into a keyed-list memory object, skipping duplicates.
+
+    Args:
+        memory (Dict[str, Any]): {key: [items]} object, updated in place
+        delta (Dict[str, Any]): {key: items or single item} to merge in
+        hashes (Optional[Dict[str, Set[str]]]): Hash sets of memory (from
+            build_hashes), updated in place; built here if omitted
+
+    Returns:
+        Dict[str, List[Any]]: The items that were actually new, by key
+    """
+    if hashes is None:
+        hashes = build_hashes(memory)
+    added: Dict[str, List[Any]] = {}
+    for key, items in delta.items():
+        if not isinstance(items, list):
+            items = [items]
+        bucket = memory.setdefault(key, [])
+        seen = hashes.setdefault(key, set())
+        for item in items:
+            item_hash = canonical_hash(item)
+            if item_hash in seen:
+                continue
+            seen.add(item_hash)
+            bucket.append(item)
+            added.setdefault(key, []).append(item)
+    return added
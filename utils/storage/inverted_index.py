@@ -0,0 +1,152 @@
+# utils/storage/inverted_index.py
+
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import re
+import math
+import json
+import heapq
+import threading
+
+from utils.durable_write import atomic_write_json
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def conversation_text(conversation: Dict[str, Any]) -> str:
+    """The searchable text of a conversation: query, synthesis and agent responses."""
+    parts = [conversation.get("user_query", ""), conversation.get("synthesis_response", "")]
+    for response in conversation.get("agent_responses", {}).values():
+        if isinstance(response, str):
+            parts.append(response)
+        elif isinstance(response, dict) and isinstance(response.get("response"), str):
+            parts.append(response["response"])
+    return "\n".join(p for p in parts if p)
+
+
+class InvertedIndex:
+    """
+    In-process full-text index with BM25 ranking.
+
+    Postings map each term to {doc_id: term frequency}, so a query only
+    touches the documents containing its terms. Documents can be added,
+    replaced and removed incrementally.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize the index.
+
+        Args:
+            k1 (float): BM25 term-frequency saturation
+            b (float): BM25 document-length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version with the same ID."""
+        terms: Dict[str, int] = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+
+        with self._lock:
+            self.remove(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._total_length += self._doc_lengths[doc_id]
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document from the index if present."""
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def search(self, query: str, limit: int = 5, offset: int = 0,
+               doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Rank documents against a query.
+
+        Args:
+            query (str): Free-text query; documents matching any term are candidates
+            limit (int): Maximum number of results
+            offset (int): Number of top results to skip, for pagination
+            doc_ids (Optional[Iterable[str]]): Only rank these documents; when given,
+                scoring walks this set instead of the full postings lists
+
+        Returns:
+            List[Tuple[str, float]]: (doc_id, BM25 score) pairs, best first
+        """
+        with self._lock:
+            n = len(self._doc_terms)
+            if n == 0:
+                return []
+            avg_length = self._total_length / n
+
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                if doc_ids is None:
+                    matches = postings.items()
+                else:
+                    matches = ((doc_id, postings[doc_id]) for doc_id in doc_ids if doc_id in postings)
+                for doc_id, tf in matches:
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: item[1])
+        return top[offset:]
+
+    def doc_ids(self) -> List[str]:
+        """Return the IDs of every indexed document."""
+        with self._lock:
+            return list(self._doc_terms)
+
+    def save(self, path: str) -> None:
+        """Write the per-document term counts to a JSON file atomically."""
+        with self._lock:
+            documents = {doc_id: dict(terms) for doc_id, terms in self._doc_terms.items()}
+        # A snapshot lost to a crash is rebuilt from the conversations, so skip the fsync
+        atomic_write_json(path, {"k1": self.k1, "b": self.b, "documents": documents}, fsync=False)
+
+    @classmethod
+    def load(cls, path: str) -> "InvertedIndex":
+        """Load an index written by save(); postings are rebuilt from the term counts."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, terms in data["documents"].items():
+            for term, tf in terms.items():
+                index._postings.setdefault(term, {})[doc_id] = tf
+            index._doc_terms[doc_id] = terms
+            index._doc_lengths[doc_id] = sum(terms.values())
+            index._total_length += index._doc_lengths[doc_id]
+        return index
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
@@ -0,0 +1,590 @@
+# utils/storage/json_backend.py
+
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import os
+import bisect
+import heapq
+import json
+import time
+import uuid
+import atexit
+import shutil
+import threading
+
+from utils.durable_write import atomic_write, atomic_write_json, GroupCommitWriter
+from utils.storage.base import StorageBackend
+from utils.storage.delta import DELTA_COMPACT_EVERY, apply_delta, build_hashes
+from utils.storage.inverted_index import InvertedIndex, conversation_text
+
+# Manifest journal lines, and search index changes, between snapshot writes
+MANIFEST_COMPACT_EVERY = 1000
+INDEX_SAVE_EVERY = 1000
+
+
+class JSONBackend(StorageBackend):
+    """
+    The original directory layout: one JSON file per agent memory type,
+    per shared memory type and per conversation.
+
+        <storage_dir>/agent_memory/<agent_name>/<memory_type>.json
+        <storage_dir>/agent_memory/<agent_name>/<memory_type>.delta.jsonl
+        <storage_dir>/shared_memory/<memory_type>.json
+        <storage_dir>/conversations/<conversation_id>.json
+        <storage_dir>/conversations.manifest.json (+ .jsonl journal)
+        <storage_dir>/conversations.index.json
+
+    Agent and shared memory files are replaced atomically (temp file, fsync,
+    rename). With group_commit, those writes are batched by a
+    GroupCommitWriter instead of each paying its own fsync. Conversation
+    files are written atomically too, but never batched, so they can be
+    read back as soon as save_conversation() returns. Appends to
+    keyed-list memory (molecular knowledge) go to a .delta.jsonl file, one
+    line per append, which is folded into the .json file every
+    DELTA_COMPACT_EVERY appends and whenever the full object is saved.
+
+    The manifest lists every conversation's timestamp, owner and size, so
+    counting, listing and per-user history never list the conversations
+    directory. Each save or delete appends a line to its journal, which is
+    folded into the snapshot every MANIFEST_COMPACT_EVERY lines. Deleting
+    both manifest files rebuilds them from the conversation files on the
+    next start. The full-text index is snapshotted every INDEX_SAVE_EVERY
+    changes and at exit, and loading it only reads the conversations it
+    lacks.
+
+    Deleted agent memory is renamed into <storage_dir>/.trash, which is
+    cheap on the request path; collect_garbage() empties it later.
+    """
+
+    name = "json"
+
+    def __init__(self, storage_dir: str = "./memory", group_commit: bool = False):
+        """
+        Initialize the JSON backend.
+
+        Args:
+            storage_dir (str): Base directory for storing memories
+            group_commit (bool): Batch memory file writes in the background
+        """
+        self.storage_dir = storage_dir
+        self.agent_memory_dir = os.path.join(storage_dir, "agent_memory")
+        self.shared_memory_dir = os.path.join(storage_dir, "shared_memory")
+        self.conversation_dir = os.path.join(storage_dir, "conversations")
+        self.trash_dir = os.path.join(storage_dir, ".trash")
+
+        # Create directories if they don't exist
+        for directory in [self.storage_dir, self.agent_memory_dir,
+                          self.shared_memory_dir, self.conversation_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+        # Conversation manifest ({id: (timestamp, user_id, bytes)}) and the
+        # per-user (timestamp, id) lists derived from it, loaded on first use
+        self.manifest_path = os.path.join(storage_dir, "conversations.manifest.json")
+        self.manifest_journal_path = os.path.join(storage_dir, "conversations.manifest.jsonl")
+        self._manifest: Optional[Dict[str, Tuple[str, Optional[str], int]]] = None
+        self._user_conversations: Dict[Optional[str], List[Tuple[str, str]]] = {}
+        self._journal_lines = 0
+        self._manifest_lock = threading.RLock()
+
+        # Full-text index, loaded from its snapshot on first search
+        self.index_path = os.path.join(storage_dir, "conversations.index.json")
+        self._index: Optional[InvertedIndex] = None
+        self._index_unsaved = 0
+        self._index_lock = threading.Lock()
+        self._writer = GroupCommitWriter() if group_commit else None
+
+        # Bytes on disk: conversations are counted from the manifest, and the
+        # memory files are measured once on first use and then tracked per
+        # file through every write, append, removal and delete
+        self._file_sizes: Optional[Dict[str, int]] = None
+        self._memory_bytes = 0
+        self._conversation_bytes = 0
+        self._disk_lock = threading.Lock()
+
+        # Lines in each delta file since it was last folded in
+        self._delta_counts: Dict[str, int] = {}
+        self._delta_lock = threading.Lock()
+
+    def load_agent_memories(self) -> Dict[str, Dict[str, Any]]:
+        memories = {}
+        for agent_name in os.listdir(self.agent_memory_dir):
+            agent_dir = os.path.join(self.agent_memory_dir, agent_name)
+            if os.path.isdir(agent_dir):
+                memories[agent_name] = {}
+                for memory_file in os.listdir(agent_dir):
+                    if memory_file.endswith('.json'):
+                        memory_type = memory_file.split('.')[0]  # e.g., 'plan', 'execution', 'molecular'
+                        with open(os.path.join(agent_dir, memory_file), 'r') as f:
+                            memories[agent_name][memory_type] = json.load(f)
+                # Replay appends made since each memory type was last saved in full
+                for memory_file in os.listdir(agent_dir):
+                    if memory_file.endswith('.delta.jsonl'):
+                        memory_type = memory_file[:-len('.delta.jsonl')]
+                        memory = memories[agent_name].setdefault(memory_type, {})
+                        self._replay_delta(os.path.join(agent_dir, memory_file), memory)
+        return memories
+
+    def _replay_delta(self, delta_path: str, memory: Dict[str, Any]) -> None:
+        hashes = build_hashes(memory)
+        count = 0
+        with open(delta_path, 'r') as f:
+            for line in f:
+                try:
+                    delta = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    continue
+                apply_delta(memory, delta, hashes)
+                count += 1
+        with self._delta_lock:
+            self._delta_counts[delta_path] = count
+
+    def save_agent_memory(self, agent_name: str, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        file_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}.json")
+        delta_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}.delta.jsonl")
+        with self._delta_lock:
+            if not os.path.exists(delta_path):
+                self._write_json(file_path, memory_data)
+                return
+            # The full object supersedes the delta file, once it is durably on disk
+            if not self._write_json(file_path, memory_data, wait=True):
+                return
+            self._remove_file(delta_path)
+            self._delta_counts.pop(delta_path, None)
+
+    def append_agent_memory(self, agent_name: str, memory_type: str, delta: Dict[str, List[Any]],
+                            memory_data: Dict[str, Any]) -> None:
+        delta_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}.delta.jsonl")
+        with self._delta_lock:
+            count = self._delta_counts.get(delta_path, 0)
+        if count >= DELTA_COMPACT_EVERY:
+            self.save_agent_memory(agent_name, memory_type, memory_data)
+            return
+
+        line = json.dumps(delta) + "\n"
+        with self._delta_lock:
+            try:
+                os.makedirs(os.path.dirname(delta_path), exist_ok=True)
+                with open(delta_path, 'a') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._delta_counts[delta_path] = self._delta_counts.get(delta_path, 0) + 1
+                self._account_write(delta_path, len(line.encode("utf-8")))
+            except Exception as e:
+                print(f"Error appending to {delta_path}: {e}")
+
+    def delete_agent_memory(self, agent_name: Optional[str] = None, memory_type: Optional[str] = None) -> None:
+        if self._writer is not None:
+            # Commit queued writes first so they can't recreate deleted files
+            self._writer.flush()
+        with self._delta_lock:
+            self._delta_counts = {}
+        if agent_name and memory_type:
+            for suffix in (".json", ".delta.jsonl"):
+                file_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}{suffix}")
+                if os.path.exists(file_path):
+                    self._trash(file_path)
+        elif agent_name:
+            agent_dir = os.path.join(self.agent_memory_dir, agent_name)
+            if os.path.exists(agent_dir):
+                self._trash(agent_dir)
+        elif memory_type:
+            for agent_name in os.listdir(self.agent_memory_dir):
+                for suffix in (".json", ".delta.jsonl"):
+                    file_path = os.path.join(self.agent_memory_dir, agent_name, f"{memory_type}{suffix}")
+                    if os.path.exists(file_path):
+                        self._trash(file_path)
+        else:
+            if os.path.exists(self.agent_memory_dir):
+                self._trash(self.agent_memory_dir)
+            os.makedirs(self.agent_memory_dir, exist_ok=True)
+
+    def _trash(self, path: str) -> None:
+        """Move a file or directory into the trash, for collect_garbage() to delete."""
+        os.makedirs(self.trash_dir, exist_ok=True)
+        os.rename(path, os.path.join(self.trash_dir, f"{uuid.uuid4().hex}-{os.path.basename(path)}"))
+        self._forget_sizes(path)
+
+    def load_shared_memories(self) -> Dict[str, Any]:
+        memories = {}
+        for memory_file in os.listdir(self.shared_memory_dir):
+            if memory_file.endswith('.json'):
+                memory_type = memory_file.split('.')[0]
+                with open(os.path.join(self.shared_memory_dir, memory_file), 'r') as f:
+                    memories[memory_type] = json.load(f)
+        return memories
+
+    def save_shared_memory(self, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        file_path = os.path.join(self.shared_memory_dir, f"{memory_type}.json")
+        self._write_json(file_path, memory_data)
+
+    def _write_json(self, file_path: str, data: Dict[str, Any], wait: bool = False) -> bool:
+        """
+        Replace a memory file atomically, through the group-commit writer if
+        enabled (wait blocks until it is committed). Returns False on failure.
+        """
+        try:
+            content = json.dumps(data, indent=2).encode("utf-8")
+            self._account_write(file_path, len(content), replaces=True)
+            if self._writer is not None:
+                self._writer.write(file_path, content, wait=wait)
+            else:
+                atomic_write(file_path, content)
+            return True
+        except Exception as e:
+            print(f"Error saving to {file_path}: {e}")
+            return False
+
+    def _remove_file(self, file_path: str) -> bool:
+        """Delete a file and take its size off the disk usage counter."""
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Error removing {file_path}: {e}")
+            return False
+        self._forget_sizes(file_path)
+        return True
+
+    def _account_write(self, file_path: str, size: int, replaces: bool = False) -> None:
+        """Adjust the disk usage counter for a memory file written (or appended to) with size bytes."""
+        with self._disk_lock:
+            if self._file_sizes is None:
+                return
+            previous = self._file_sizes.get(file_path, 0)
+            self._file_sizes[file_path] = size if replaces else previous + size
+            self._memory_bytes += self._file_sizes[file_path] - previous
+
+    def _forget_sizes(self, path: str) -> None:
+        """Take a removed memory file, or every file under a removed directory, off the counter."""
+        with self._disk_lock:
+            if self._file_sizes is None:
+                return
+            prefix = path + os.sep
+            for file_path in [p for p in self._file_sizes if p == path or p.startswith(prefix)]:
+                self._memory_bytes -= self._file_sizes.pop(file_path)
+
+    def save_conversation(self, conversation: Dict[str, Any]) -> None:
+        size = self._write_conversation(conversation)
+        if size is None:
+            return
+
+        self._manifest_changed(conversation["id"], (conversation["timestamp"], conversation.get("user_id"), size))
+        # Waits out an in-progress build so the new conversation can't be missed
+        with self._index_lock:
+            index = self._index
+            if index is not None:
+                self._index_unsaved += 1
+                should_save = self._index_unsaved >= INDEX_SAVE_EVERY
+        if index is not None:
+            index.add(conversation["id"], conversation_text(conversation))
+            if should_save:
+                self._save_search_index()
+
+    def _write_conversation(self, conversation: Dict[str, Any]) -> Optional[int]:
+        """Persist a conversation record. Returns its size in bytes, or None if it couldn't be written."""
+        file_path = os.path.join(self.conversation_dir, f"{conversation['id']}.json")
+        try:
+            content = json.dumps(conversation, indent=2).encode("utf-8")
+            atomic_write(file_path, content)
+            return len(content)
+        except Exception as e:
+            print(f"Error saving conversation to {file_path}: {e}")
+            return None
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        if self.get_conversation(conversation_id) is None or not self._delete_conversation_record(conversation_id):
+            return False
+
+        self._manifest_changed(conversation_id, None)
+        with self._index_lock:
+            if self._index is not None:
+                self._index.remove(conversation_id)
+                self._index_unsaved += 1
+        return True
+
+    def _delete_conversation_record(self, conversation_id: str) -> bool:
+        """Remove a persisted conversation record. Returns False if it couldn't be removed."""
+        return self._remove_file(os.path.join(self.conversation_dir, f"{conversation_id}.json"))
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        file_path = os.path.join(self.conversation_dir, f"{conversation_id}.json")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def recent_conversations(self, limit: int) -> List[Dict[str, Any]]:
+        with self._manifest_lock:
+            newest = heapq.nlargest(limit, self._conversation_manifest().items(), key=lambda item: item[1][0])
+        return [c for c in (self.get_conversation(cid) for cid, _ in newest) if c is not None]
+
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        for conv_file in os.listdir(self.conversation_dir):
+            if conv_file.endswith('.json'):
+                try:
+                    with open(os.path.join(self.conversation_dir, conv_file), 'r') as f:
+                        yield json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Warning: Skipping unreadable conversation {conv_file}: {e}")
+
+    def search_conversations(self, query: str, limit: int = 5, offset: int = 0,
+                             user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        index = self._search_index()
+        doc_ids = None if user_id is None else self.user_conversation_ids(user_id)
+        results = []
+        for conversation_id, _ in index.search(query, limit, offset, doc_ids=doc_ids):
+            conversation = self.get_conversation(conversation_id)
+            if conversation is not None:
+                results.append(conversation)
+        return results
+
+    def list_conversations(self, user_id: Optional[str] = None, limit: int = 20,
+                           offset: int = 0) -> List[Dict[str, Any]]:
+        if user_id is None:
+            return self.recent_conversations(offset + limit)[offset:]
+        with self._manifest_lock:
+            self._conversation_manifest()
+            entries = self._user_conversations.get(user_id, [])
+            # Lists are kept in ascending timestamp order, so the newest are at the end
+            end = max(0, len(entries) - offset)
+            page = entries[max(0, end - limit):end][::-1]
+        return [c for c in (self.get_conversation(cid) for _, cid in page) if c is not None]
+
+    def user_conversation_ids(self, user_id: str) -> List[str]:
+        with self._manifest_lock:
+            self._conversation_manifest()
+            return [cid for _, cid in self._user_conversations.get(user_id, [])]
+
+    def count_conversations(self) -> int:
+        with self._manifest_lock:
+            return len(self._conversation_manifest())
+
+    def conversation_ids(self) -> List[str]:
+        with self._manifest_lock:
+            return list(self._conversation_manifest())
+
+    def conversation_entries(self) -> List[Tuple[str, str, Optional[str], int]]:
+        # The manifest already holds every (timestamp, user, size), so no record is read
+        with self._manifest_lock:
+            entries = [
+                (timestamp, conversation_id, user_id, size)
+                for conversation_id, (timestamp, user_id, size) in self._conversation_manifest().items()
+            ]
+        entries.sort()
+        return entries
+
+    def _conversation_manifest(self) -> Dict[str, Tuple[str, Optional[str], int]]:
+        """
+        Get {conversation_id: (timestamp, user_id, bytes)} and the per-user
+        lists, loading them the first time. Caller holds the manifest lock.
+        """
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+            self._user_conversations = {}
+            self._conversation_bytes = 0
+            for conversation_id, (timestamp, user_id, size) in self._manifest.items():
+                self._user_conversations.setdefault(user_id, []).append((timestamp, conversation_id))
+                self._conversation_bytes += size
+            for entries in self._user_conversations.values():
+                entries.sort()
+            if self._journal_lines >= MANIFEST_COMPACT_EVERY:
+                self._write_manifest()
+        return self._manifest
+
+    def _load_manifest(self) -> Dict[str, Tuple[str, Optional[str], int]]:
+        """Read the manifest snapshot and replay its journal, or build it from the files once."""
+        if not os.path.exists(self.manifest_path) and not os.path.exists(self.manifest_journal_path):
+            # First start on a directory written before the manifest existed
+            manifest = {
+                conversation["id"]: (conversation["timestamp"], conversation.get("user_id"),
+                                     self._conversation_file_size(conversation["id"]))
+                for conversation in self.iter_conversations()
+            }
+            self._manifest = manifest
+            self._write_manifest()
+            return manifest
+
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                manifest = {cid: tuple(entry) for cid, entry in json.load(f).items()}
+        lines = 0
+        if os.path.exists(self.manifest_journal_path):
+            with open(self.manifest_journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        continue
+                    if change.get("deleted"):
+                        manifest.pop(change["id"], None)
+                    else:
+                        manifest[change["id"]] = (change["timestamp"], change.get("user_id"), change["bytes"])
+                    lines += 1
+        self._journal_lines = lines
+        return manifest
+
+    def _conversation_file_size(self, conversation_id: str) -> int:
+        """Bytes a conversation file occupies."""
+        try:
+            return os.path.getsize(os.path.join(self.conversation_dir, f"{conversation_id}.json"))
+        except OSError:
+            return 0
+
+    def _manifest_changed(self, conversation_id: str, entry: Optional[Tuple[str, Optional[str], int]]) -> None:
+        """Record a saved (entry) or deleted (None) conversation in the manifest and the user lists."""
+        with self._manifest_lock:
+            if self._manifest is not None:
+                previous = self._manifest.pop(conversation_id, None)
+                if previous is not None:
+                    self._conversation_bytes -= previous[2]
+                    entries = self._user_conversations.get(previous[1], [])
+                    position = bisect.bisect_left(entries, (previous[0], conversation_id))
+                    if position < len(entries) and entries[position] == (previous[0], conversation_id):
+                        del entries[position]
+                if entry is not None:
+                    self._manifest[conversation_id] = entry
+                    self._conversation_bytes += entry[2]
+                    bisect.insort(self._user_conversations.setdefault(entry[1], []), (entry[0], conversation_id))
+            self._journal_manifest_change(conversation_id, entry)
+
+    def _journal_manifest_change(self, conversation_id: str,
+                                 entry: Optional[Tuple[str, Optional[str], int]]) -> None:
+        """Append a manifest change to the journal, folding it in every MANIFEST_COMPACT_EVERY lines."""
+        if (self._manifest is None and not os.path.exists(self.manifest_path)
+                and not os.path.exists(self.manifest_journal_path)):
+            # Once a journal exists the files are no longer scanned, so build the manifest first
+            self._conversation_manifest()
+        if entry is None:
+            change = {"id": conversation_id, "deleted": True}
+        else:
+            change = {"id": conversation_id, "timestamp": entry[0], "user_id": entry[1], "bytes": entry[2]}
+        try:
+            with open(self.manifest_journal_path, 'a') as f:
+                f.write(json.dumps(change) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_lines += 1
+        except Exception as e:
+            print(f"Error appending to {self.manifest_journal_path}: {e}")
+            return
+        if self._manifest is not None and self._journal_lines >= MANIFEST_COMPACT_EVERY:
+            self._write_manifest()
+
+    def _write_manifest(self) -> None:
+        """Replace the manifest snapshot and empty the journal it supersedes. Caller holds the manifest lock."""
+        try:
+            atomic_write_json(self.manifest_path, {cid: list(entry) for cid, entry in self._manifest.items()})
+            # A crash before this truncation only replays changes the snapshot already holds
+            with open(self.manifest_journal_path, 'w'):
+                pass
+            self._journal_lines = 0
+        except Exception as e:
+            print(f"Error saving conversation manifest to {self.manifest_path}: {e}")
+
+    def _search_index(self) -> InvertedIndex:
+        """
+        Get the full-text index, loading its snapshot the first time and
+        indexing only the conversations the snapshot lacks.
+        """
+        with self._index_lock:
+            if self._index is not None:
+                return self._index
+
+            with self._manifest_lock:
+                conversation_ids = set(self._conversation_manifest())
+            index = None
+            if os.path.exists(self.index_path):
+                try:
+                    index = InvertedIndex.load(self.index_path)
+                except Exception as e:
+                    print(f"Warning: Could not load search index from {self.index_path}: {e}")
+            if index is None:
+                index = InvertedIndex()
+
+            stale = [doc_id for doc_id in index.doc_ids() if doc_id not in conversation_ids]
+            for doc_id in stale:
+                index.remove(doc_id)
+            missing = [cid for cid in conversation_ids if cid not in index]
+            for conversation_id in missing:
+                conversation = self.get_conversation(conversation_id)
+                if conversation is not None:
+                    index.add(conversation_id, conversation_text(conversation))
+
+            self._index_unsaved = len(stale) + len(missing)
+            self._index = index
+            atexit.register(self._save_search_index)
+            return index
+
+    def _save_search_index(self) -> None:
+        """Write the search index snapshot if it changed."""
+        with self._index_lock:
+            if self._index is None or self._index_unsaved == 0:
+                return
+            self._index_unsaved = 0
+            index = self._index
+        try:
+            index.save(self.index_path)
+        except Exception as e:
+            print(f"Error saving search index to {self.index_path}: {e}")
+
+    def collect_garbage(self, temp_file_age: float = 3600) -> None:
+        """
+        Empty the trash, and delete .bak copies left from before memory files
+        were written atomically and temp files abandoned by interrupted writes.
+        """
+        if os.path.isdir(self.trash_dir):
+            for name in os.listdir(self.trash_dir):
+                path = os.path.join(self.trash_dir, name)
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError as e:
+                    print(f"Error emptying trash entry {path}: {e}")
+
+        cutoff = time.time() - temp_file_age
+        for directory in (self.agent_memory_dir, self.shared_memory_dir, self.conversation_dir):
+            for root, _, files in os.walk(directory):
+                for file_name in files:
+                    path = os.path.join(root, file_name)
+                    if file_name.endswith(".bak"):
+                        self._remove_file(path)
+                    elif file_name.startswith(".") and file_name.endswith(".tmp"):
+                        try:
+                            stale = os.path.getmtime(path) < cutoff
+                        except OSError:
+                            continue
+                        if stale:
+                            self._remove_file(path)
+
+    def disk_usage(self) -> int:
+        with self._manifest_lock:
+            self._conversation_manifest()
+            conversation_bytes = self._conversation_bytes
+        return self._memory_disk_usage() + conversation_bytes
+
+    def _memory_disk_usage(self) -> int:
+        """Bytes of the agent and shared memory files."""
+        with self._disk_lock:
+            if self._file_sizes is None:
+                # The only scan; writes, removals and deletes keep it current after this
+                sizes = {}
+                for directory in (self.agent_memory_dir, self.shared_memory_dir):
+                    for root, _, files in os.walk(directory):
+                        for file_name in files:
+                            path = os.path.join(root, file_name)
+                            try:
+                                sizes[path] = os.path.getsize(path)
+                            except OSError:
+                                pass
+                self._file_sizes = sizes
+                self._memory_bytes = sum(sizes.values())
+            return self._memory_bytes
+
+    def close(self) -> None:
+        self._save_search_index()
+        if self._writer is not None:
+            self._writer.close()
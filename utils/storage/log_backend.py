@@ -0,0 +1,109 @@
+# utils/storage/log_backend.py
+
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import os
+
+from utils.storage.json_backend import JSONBackend
+from utils.storage.segment_log import SegmentedLog
+
+
+class LogBackend(JSONBackend):
+    """
+    JSON files for agent and shared memory, with conversations appended to
+    a segmented log instead of written one file each.
+
+        <storage_dir>/agent_memory/<agent_name>/<memory_type>.json
+        <storage_dir>/shared_memory/<memory_type>.json
+        <storage_dir>/conversation_log/segment-<n>.log (+ .idx once sealed)
+
+    Recording a conversation is one append rather than a file create, and
+    reading one back is one pread at an offset held in memory. Conversation
+    files left by the JSON backend are imported the first time the log is
+    opened. Full-text search and per-user history use the same in-process
+    indexes as the JSON backend, with the manifest rebuilt from the log's
+    index (which records each conversation's owner) instead of kept in its
+    own files.
+    """
+
+    name = "log"
+
+    def __init__(self, storage_dir: str = "./memory", group_commit: bool = False,
+                 segment_bytes: int = 64 * 1024 * 1024, compaction_interval: Optional[float] = 300):
+        """
+        Initialize the log backend.
+
+        Args:
+            storage_dir (str): Base directory for storing memories
+            group_commit (bool): Batch memory file writes in the background
+            segment_bytes (int): Size at which a log segment is sealed
+            compaction_interval (Optional[float]): Seconds between background compaction passes
+        """
+        super().__init__(storage_dir, group_commit=group_commit)
+        self.log = SegmentedLog(
+            os.path.join(storage_dir, "conversation_log"),
+            segment_bytes=segment_bytes,
+            compaction_interval=compaction_interval,
+            meta_field="user_id"
+        )
+        if len(self.log) == 0:
+            self._import_conversation_files()
+
+    def _write_conversation(self, conversation: Dict[str, Any]) -> Optional[int]:
+        try:
+            self.log.put(conversation["id"], conversation, conversation.get("timestamp"))
+            return self.log.record_size(conversation["id"])
+        except Exception as e:
+            print(f"Error appending conversation {conversation.get('id')} to {self.log.directory}: {e}")
+            return None
+
+    def _delete_conversation_record(self, conversation_id: str) -> bool:
+        try:
+            return self.log.delete(conversation_id)
+        except Exception as e:
+            print(f"Error deleting conversation {conversation_id} from {self.log.directory}: {e}")
+            return False
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        return self.log.get(conversation_id)
+
+    def recent_conversations(self, limit: int) -> List[Dict[str, Any]]:
+        return self.log.recent(limit)
+
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        return self.log.iter_records()
+
+    def count_conversations(self) -> int:
+        return len(self.log)
+
+    def _load_manifest(self) -> Dict[str, Tuple[str, Optional[str], int]]:
+        # The log is the durable record, so the manifest is rebuilt from its
+        # index, which holds each conversation's timestamp, owner and size
+        return {
+            conversation_id: (timestamp, user_id, size)
+            for conversation_id, timestamp, user_id, size in self.log.entries()
+        }
+
+    def _journal_manifest_change(self, conversation_id: str,
+                                 entry: Optional[Tuple[str, Optional[str], int]]) -> None:
+        pass
+
+    def collect_garbage(self, temp_file_age: float = 3600) -> None:
+        super().collect_garbage(temp_file_age)
+        self.log.compact()
+
+    def disk_usage(self) -> int:
+        return self._memory_disk_usage() + self.log.get_stats()["disk_bytes"]
+
+    def close(self) -> None:
+        super().close()
+        self.log.close()
+
+    def _import_conversation_files(self) -> None:
+        """Append conversations stored as individual JSON files, oldest first."""
+        conversations = list(super().iter_conversations())
+        if not conversations:
+            return
+        conversations.sort(key=lambda c: c.get("timestamp", ""))
+        for conversation in conversations:
+            self.log.put(conversation["id"], conversation, conversation.get("timestamp"))
+        print(f"Imported {len(conversations)} conversation files into {self.log.directory}")
@@ -0,0 +1,292 @@
+# utils/storage/retention.py
+
+from typing import Dict, Any, List, Optional, Tuple, Callable
+import os
+import time
+import datetime
+import threading
+
+from utils.storage.base import StorageBackend
+from utils.storage.archive import ConversationArchive
+
+
+def _env_number(name: str, cast: Callable[[str], Any] = int) -> Optional[Any]:
+    """Read an optional numeric setting; unset or empty means no limit."""
+    value = os.getenv(name, "").strip()
+    return cast(value) if value else None
+
+
+class RetentionPolicy:
+    """
+    Limits on the live conversation store, overall and per user, and on
+    accumulated agent knowledge.
+
+    Conversations older than max_age are retired, then each user's newest
+    conversations are kept up to their count and byte limits, then the whole
+    store's newest up to its limits. Conversations without a user only fall
+    under the store-wide limits. Keyed-list agent knowledge (items appended
+    per key, like the molecular agent's) keeps its newest keys and each
+    key's newest items. Every limit is optional (None disables it).
+    """
+
+    def __init__(self, max_age: Optional[float] = None, max_conversations: Optional[int] = None,
+                 max_bytes: Optional[int] = None, user_max_conversations: Optional[int] = None,
+                 user_max_bytes: Optional[int] = None, knowledge_max_keys: Optional[int] = None,
+                 knowledge_max_items: Optional[int] = None):
+        """
+        Initialize the policy.
+
+        Args:
+            max_age (Optional[float]): Seconds a conversation is kept
+            max_conversations (Optional[int]): Conversations kept in the store
+            max_bytes (Optional[int]): Bytes of conversations kept in the store
+            user_max_conversations (Optional[int]): Conversations kept per user
+            user_max_bytes (Optional[int]): Bytes of conversations kept per user
+            knowledge_max_keys (Optional[int]): Keys kept in keyed-list agent knowledge
+            knowledge_max_items (Optional[int]): Items kept per key of agent knowledge
+        """
+        self.max_age = max_age
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.user_max_conversations = user_max_conversations
+        self.user_max_bytes = user_max_bytes
+        self.knowledge_max_keys = knowledge_max_keys
+        self.knowledge_max_items = knowledge_max_items
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Build the policy from MEMORY_RETENTION_* environment variables."""
+        max_age_days = _env_number("MEMORY_RETENTION_MAX_AGE_DAYS", float)
+        return cls(
+            max_age=max_age_days * 86400 if max_age_days is not None else None,
+            max_conversations=_env_number("MEMORY_RETENTION_MAX_CONVERSATIONS"),
+            max_bytes=_env_number("MEMORY_RETENTION_MAX_BYTES"),
+            user_max_conversations=_env_number("MEMORY_RETENTION_USER_MAX_CONVERSATIONS"),
+            user_max_bytes=_env_number("MEMORY_RETENTION_USER_MAX_BYTES"),
+            knowledge_max_keys=_env_number("MEMORY_RETENTION_KNOWLEDGE_MAX_KEYS"),
+            knowledge_max_items=_env_number("MEMORY_RETENTION_KNOWLEDGE_MAX_ITEMS")
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.limits_conversations or self.limits_knowledge
+
+    @property
+    def limits_conversations(self) -> bool:
+        return any(limit is not None for limit in (
+            self.max_age, self.max_conversations, self.max_bytes,
+            self.user_max_conversations, self.user_max_bytes
+        ))
+
+    @property
+    def limits_knowledge(self) -> bool:
+        return self.knowledge_max_keys is not None or self.knowledge_max_items is not None
+
+    def select_expired(self, entries: List[Tuple[str, str, Optional[str], int]],
+                       now: Optional[datetime.datetime] = None) -> List[str]:
+        """
+        Pick the conversations the policy retires.
+
+        Args:
+            entries (List[Tuple[str, str, Optional[str], int]]): (timestamp, id,
+                user_id, bytes) of every conversation, oldest first
+            now (Optional[datetime.datetime]): Current time, for the age limit
+
+        Returns:
+            List[str]: IDs of the conversations to retire, oldest first
+        """
+        expired = set()
+
+        if self.max_age is not None:
+            # Timestamps are naive local ISO strings, which sort chronologically
+            cutoff = ((now or datetime.datetime.now()) - datetime.timedelta(seconds=self.max_age)).isoformat()
+            for timestamp, conversation_id, _, _ in entries:
+                if timestamp >= cutoff:
+                    break
+                expired.add(conversation_id)
+
+        if self.user_max_conversations is not None or self.user_max_bytes is not None:
+            by_user: Dict[str, List[Tuple[str, str, Optional[str], int]]] = {}
+            for entry in entries:
+                if entry[2] is not None and entry[1] not in expired:
+                    by_user.setdefault(entry[2], []).append(entry)
+            for user_entries in by_user.values():
+                _trim(user_entries, self.user_max_conversations, self.user_max_bytes, expired)
+
+        if self.max_conversations is not None or self.max_bytes is not None:
+            remaining = [entry for entry in entries if entry[1] not in expired]
+            _trim(remaining, self.max_conversations, self.max_bytes, expired)
+
+        return [conversation_id for _, conversation_id, _, _ in entries if conversation_id in expired]
+
+    def trim_knowledge(self, knowledge: Dict[str, Any]) -> int:
+        """
+        Apply the knowledge limits to keyed-list agent memory, in place.
+
+        Keys are dropped oldest first (in the order they were added), then
+        each remaining key's list keeps its newest items.
+
+        Args:
+            knowledge (Dict[str, Any]): Key -> list of items, oldest first
+
+        Returns:
+            int: Number of items dropped
+        """
+        dropped = 0
+        if self.knowledge_max_keys is not None and len(knowledge) > self.knowledge_max_keys:
+            for key in list(knowledge)[:len(knowledge) - self.knowledge_max_keys]:
+                items = knowledge.pop(key)
+                dropped += len(items) if isinstance(items, list) else 1
+        if self.knowledge_max_items is not None:
+            for items in knowledge.values():
+                if isinstance(items, list) and len(items) > self.knowledge_max_items:
+                    dropped += len(items) - self.knowledge_max_items
+                    del items[:len(items) - self.knowledge_max_items]
+        return dropped
+
+
+def _trim(entries: List[Tuple[str, str, Optional[str], int]], max_count: Optional[int],
+          max_bytes: Optional[int], expired: set) -> None:
+    """Keep the newest entries within the limits; add the rest to expired."""
+    count, total = 0, 0
+    for _, conversation_id, _, size in reversed(entries):
+        count += 1
+        total += size
+        if (max_count is not None and count > max_count) or (max_bytes is not None and total > max_bytes):
+            expired.add(conversation_id)
+
+
+class MemoryCompactor:
+    """
+    Background thread that enforces retention and reclaims disk space.
+
+    Each pass retires the conversations the policy selects (writing them to
+    the archive first, when there is one, then deleting them through
+    delete_conversation so caches and search indexes follow), applies the
+    knowledge limits through trim_knowledge, trims the archive, and calls
+    backend.collect_garbage() to empty trash, remove stale temp files and
+    compact storage. Passes run every interval
+    seconds; wake() asks for one soon, e.g. after memory was trashed.
+    """
+
+    def __init__(self, backend: StorageBackend, policy: RetentionPolicy,
+                 delete_conversation: Callable[[str], bool],
+                 archive: Optional[ConversationArchive] = None,
+                 interval: Optional[float] = 3600, batch_size: int = 1000,
+                 on_oldest: Optional[Callable[[Optional[str]], None]] = None,
+                 trim_knowledge: Optional[Callable[[RetentionPolicy], int]] = None):
+        """
+        Initialize the compactor and start its thread.
+
+        Args:
+            backend (StorageBackend): Backend to compact
+            policy (RetentionPolicy): Conversation retention limits
+            delete_conversation (Callable[[str], bool]): Deletes a conversation everywhere
+            archive (Optional[ConversationArchive]): Where retired conversations go; None discards them
+            interval (Optional[float]): Seconds between passes; None runs passes only on wake()
+            batch_size (int): Conversations archived and deleted per step
+            on_oldest (Optional[Callable[[Optional[str]], None]]): Told the oldest
+                remaining timestamp after conversations are retired
+            trim_knowledge (Optional[Callable[[RetentionPolicy], int]]): Applies the
+                policy's knowledge limits to stored agent memory; returns items dropped
+        """
+        self.backend = backend
+        self.policy = policy
+        self.delete_conversation = delete_conversation
+        self.archive = archive
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_oldest = on_oldest
+        self.trim_knowledge = trim_knowledge
+
+        self._pass_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.runs = 0
+        self.archived = 0
+        self.deleted = 0
+        self.trimmed = 0
+        self.last_run: Optional[float] = None
+
+        self._thread = None
+        if interval:
+            self._thread = threading.Thread(target=self._run, name="memory-compactor", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Ask for a compaction pass soon, off the caller's thread."""
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            threading.Thread(target=self._run_pass, name="memory-compactor-pass", daemon=True).start()
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Run one compaction pass.
+
+        Returns:
+            Dict[str, int]: Conversations archived and deleted in this pass
+        """
+        with self._pass_lock:
+            archived, deleted, trimmed = 0, 0, 0
+            if self.policy.limits_conversations:
+                entries = self.backend.conversation_entries()
+                expired = self.policy.select_expired(entries)
+                for start in range(0, len(expired), self.batch_size):
+                    batch = expired[start:start + self.batch_size]
+                    if self.archive is not None:
+                        # Archived before deleting, so a crash can't lose them
+                        conversations = [c for c in map(self.backend.get_conversation, batch) if c is not None]
+                        self.archive.write(conversations)
+                        archived += len(conversations)
+                    deleted += sum(1 for conversation_id in batch if self.delete_conversation(conversation_id))
+
+                if expired and self.on_oldest is not None:
+                    expired_ids = set(expired)
+                    remaining = (timestamp for timestamp, cid, _, _ in entries if cid not in expired_ids)
+                    self.on_oldest(next(remaining, None))
+
+            if self.policy.limits_knowledge and self.trim_knowledge is not None:
+                trimmed = self.trim_knowledge(self.policy)
+
+            if self.archive is not None:
+                self.archive.enforce_retention()
+            self.backend.collect_garbage()
+
+            self.runs += 1
+            self.archived += archived
+            self.deleted += deleted
+            self.trimmed += trimmed
+            self.last_run = time.time()
+            return {"archived": archived, "deleted": deleted}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "runs": self.runs,
+            "archived": self.archived,
+            "deleted": self.deleted,
+            "trimmed": self.trimmed,
+            "last_run": self.last_run,
+            "interval": self.interval
+        }
+        if self.archive is not None:
+            stats["archive"] = self.archive.get_stats()
+        return stats
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _run_pass(self) -> None:
+        try:
+            self.run_once()
+        except Exception as e:
+            print(f"Error compacting memory: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self._run_pass()
@@ -0,0 +1,377 @@
+# utils/storage/segment_log.py
+
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from collections import OrderedDict
+import os
+import json
+import heapq
+import struct
+import zlib
+import threading
+
+from utils.durable_write import fsync_directory
+
+# Record header: payload length and CRC32 of the payload, big-endian
+_HEADER = struct.Struct(">II")
+
+
+class SegmentedLog:
+    """
+    Append-only, segmented key-value log of JSON records.
+
+    Every put or delete appends one record (length prefix, CRC32, compact
+    JSON payload) to the active segment with a single write call. Once the
+    active segment reaches segment_bytes it is fsynced, sealed, and given
+    an offset index file, so startup reads the small .idx files instead of
+    rescanning sealed segments. Only the active segment is scanned on
+    startup, and a torn record at its tail (from a crash mid-write) is
+    truncated away.
+
+    An in-memory map from key to (segment, offset, length) serves random
+    reads with one pread. It also holds each record's timestamp and the
+    value of its meta_field (e.g. the record's owner), which are written to
+    the .idx files too, so entries() lists them without reading any record. A background compactor rewrites the live records
+    of sealed segments whose live fraction has fallen below
+    compaction_threshold, then deletes them.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 compaction_interval: Optional[float] = 300, compaction_threshold: float = 0.5,
+                 fsync_writes: bool = False, meta_field: Optional[str] = None):
+        """
+        Initialize the log, recovering any existing segments.
+
+        Args:
+            directory (str): Directory holding the segment and index files
+            segment_bytes (int): Size at which the active segment is sealed and a new one started
+            compaction_interval (Optional[float]): Seconds between background compaction passes; None disables them
+            compaction_threshold (float): Sealed segments with a smaller live fraction are compacted
+            fsync_writes (bool): fsync after every record instead of only when sealing segments
+            meta_field (Optional[str]): Record field kept in the index and returned by entries()
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.compaction_threshold = compaction_threshold
+        self.fsync_writes = fsync_writes
+        self.meta_field = meta_field
+
+        self._lock = threading.RLock()
+        # Serializes compaction passes (the background thread and explicit calls)
+        self._compact_lock = threading.Lock()
+        # key -> (segment id, offset, record length, timestamp, meta), oldest write first
+        self._index: "OrderedDict[str, Tuple[int, int, int, Optional[str], Any]]" = OrderedDict()
+        # segment id -> {"fd", "size", "live_bytes"}
+        self._segments: Dict[int, Dict[str, int]] = {}
+        self._active_id = 0
+        self._append_fd = -1
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if compaction_interval:
+            self._compactor = threading.Thread(
+                target=self._compaction_loop, args=(compaction_interval,), name="segment-log-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    # Public API
+
+    def put(self, key: str, value: Dict[str, Any], timestamp: Optional[str] = None) -> None:
+        """
+        Append a record for a key, superseding any previous one.
+
+        Args:
+            key (str): Record key
+            value (Dict[str, Any]): JSON-serializable record
+            timestamp (Optional[str]): Sortable timestamp used to order recent() results
+        """
+        payload = {"k": key, "t": timestamp, "v": value}
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._segments[previous[0]]["live_bytes"] -= previous[2]
+            segment_id, offset, length = self._append(payload)
+            self._index[key] = (segment_id, offset, length, timestamp, self._meta(payload))
+            self._segments[segment_id]["live_bytes"] += length
+
+    def delete(self, key: str) -> bool:
+        """Append a tombstone for a key. Returns False if the key wasn't present."""
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is None:
+                return False
+            self._segments[previous[0]]["live_bytes"] -= previous[2]
+            self._append({"k": key, "d": 1})
+            return True
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Read the current record for a key, or None."""
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return None
+            return self._read(location[0], location[1], location[2])["v"]
+
+    def record_size(self, key: str) -> int:
+        """Bytes the current record for a key occupies in the log (0 if absent)."""
+        with self._lock:
+            location = self._index.get(key)
+            return location[2] if location is not None else 0
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Return up to limit records with the newest timestamps, newest first."""
+        with self._lock:
+            newest = heapq.nlargest(limit, self._index.items(), key=lambda item: item[1][3] or "")
+            return [self._read(seg, offset, length)["v"] for _, (seg, offset, length, _, _) in newest]
+
+    def entries(self) -> List[Tuple[str, Optional[str], Any, int]]:
+        """
+        Describe every live record from the in-memory index, without reading it.
+
+        Returns:
+            List[Tuple[str, Optional[str], Any, int]]: (key, timestamp, meta,
+                record length) for each record, oldest write first
+        """
+        with self._lock:
+            return [(key, location[3], location[4], location[2]) for key, location in self._index.items()]
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over every live record, reading each segment sequentially."""
+        with self._lock:
+            segment_ids = sorted(self._segments)
+        for segment_id in segment_ids:
+            if not os.path.exists(self._segment_path(segment_id)):
+                # Compacted away since the listing
+                continue
+            for offset, length, payload in self._scan(segment_id):
+                if "d" in payload:
+                    continue
+                with self._lock:
+                    location = self._index.get(payload["k"])
+                    live = location is not None and location[0] == segment_id and location[1] == offset
+                if live:
+                    yield payload["v"]
+
+    def compact(self) -> int:
+        """
+        Rewrite sealed segments that are mostly dead records.
+
+        Returns:
+            int: Number of segments removed
+        """
+        with self._compact_lock:
+            with self._lock:
+                candidates = [
+                    segment_id for segment_id, segment in sorted(self._segments.items())
+                    if segment_id != self._active_id
+                    and segment["live_bytes"] < self.compaction_threshold * segment["size"]
+                ]
+
+            removed = 0
+            for segment_id in candidates:
+                for offset, length, payload in self._scan(segment_id):
+                    key = payload["k"]
+                    with self._lock:
+                        if "d" in payload:
+                            # A tombstone still matters while an older segment may hold the key
+                            if key not in self._index and any(s < segment_id for s in self._segments):
+                                self._append(payload)
+                            continue
+                        location = self._index.get(key)
+                        if location is None or location[0] != segment_id or location[1] != offset:
+                            continue
+                        new_segment, new_offset, new_length = self._append(payload)
+                        # Assigning in place keeps the key's position in the write order
+                        self._index[key] = (new_segment, new_offset, new_length, location[3], location[4])
+                        self._segments[new_segment]["live_bytes"] += new_length
+
+                with self._lock:
+                    # The copies must be durable before the only other copy is deleted
+                    os.fsync(self._append_fd)
+                    fsync_directory(self.directory)
+                    segment = self._segments.pop(segment_id)
+                    os.close(segment["fd"])
+                    for path in (self._segment_path(segment_id), self._index_path(segment_id)):
+                        if os.path.exists(path):
+                            os.remove(path)
+                removed += 1
+            if removed:
+                fsync_directory(self.directory)
+            return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get log statistics.
+
+        Returns:
+            Dict[str, Any]: Record count, segment count, on-disk bytes and live fraction
+        """
+        with self._lock:
+            disk_bytes = sum(segment["size"] for segment in self._segments.values())
+            live_bytes = sum(segment["live_bytes"] for segment in self._segments.values())
+            return {
+                "records": len(self._index),
+                "segments": len(self._segments),
+                "disk_bytes": disk_bytes,
+                "live_fraction": round(live_bytes / disk_bytes, 4) if disk_bytes else 1.0
+            }
+
+    def close(self) -> None:
+        """Stop compaction, fsync the active segment and close all files."""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+        with self._lock:
+            if self._append_fd >= 0:
+                os.fsync(self._append_fd)
+                os.close(self._append_fd)
+                self._append_fd = -1
+            for segment in self._segments.values():
+                os.close(segment["fd"])
+            self._segments.clear()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    # Internals
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_id:08d}.log")
+
+    def _index_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_id:08d}.idx")
+
+    def _append(self, payload: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Append one record to the active segment. Caller holds the lock."""
+        data = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        record = _HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        segment = self._segments[self._active_id]
+        if segment["size"] > 0 and segment["size"] + len(record) > self.segment_bytes:
+            self._rotate()
+            segment = self._segments[self._active_id]
+
+        offset = segment["size"]
+        os.write(self._append_fd, record)
+        if self.fsync_writes:
+            os.fsync(self._append_fd)
+        segment["size"] += len(record)
+        return self._active_id, offset, len(record)
+
+    def _meta(self, payload: Dict[str, Any]) -> Any:
+        """The meta_field value of a record payload (None for tombstones)."""
+        if self.meta_field is None or "d" in payload:
+            return None
+        return payload["v"].get(self.meta_field)
+
+    def _read(self, segment_id: int, offset: int, length: int) -> Dict[str, Any]:
+        """Read one record. Caller holds the lock."""
+        record = os.pread(self._segments[segment_id]["fd"], length, offset)
+        return json.loads(record[_HEADER.size:])
+
+    def _scan(self, segment_id: int) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """Yield (offset, length, payload) for each intact record in a segment."""
+        with open(self._segment_path(segment_id), "rb") as f:
+            offset = 0
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                size, crc = _HEADER.unpack(header)
+                data = f.read(size)
+                if len(data) < size or zlib.crc32(data) != crc:
+                    # Torn or corrupt record: nothing after it can be trusted
+                    return
+                yield offset, _HEADER.size + size, json.loads(data)
+                offset += _HEADER.size + size
+
+    def _rotate(self) -> None:
+        """Seal the active segment and start a new one. Caller holds the lock."""
+        os.fsync(self._append_fd)
+        os.close(self._append_fd)
+        self._write_segment_index(self._active_id)
+        self._open_segment(self._active_id + 1)
+
+    def _open_segment(self, segment_id: int) -> None:
+        path = self._segment_path(segment_id)
+        self._append_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segments[segment_id] = {"fd": os.open(path, os.O_RDONLY), "size": os.path.getsize(path), "live_bytes": 0}
+        self._active_id = segment_id
+
+    def _write_segment_index(self, segment_id: int) -> None:
+        """Write the offset index of a sealed segment, in record order."""
+        path = self._index_path(segment_id)
+        with open(path + ".tmp", "w") as f:
+            for offset, length, payload in self._scan(segment_id):
+                deleted = "d" in payload
+                f.write(json.dumps([
+                    payload["k"], offset, length, None if deleted else payload.get("t"), deleted, self._meta(payload)
+                ]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _apply(self, segment_id: int, key: str, offset: int, length: int,
+               timestamp: Optional[str], deleted: bool, meta: Any = None) -> None:
+        """Replay one record into the in-memory index during recovery."""
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._segments[previous[0]]["live_bytes"] -= previous[2]
+        if not deleted:
+            self._index[key] = (segment_id, offset, length, timestamp, meta)
+            self._segments[segment_id]["live_bytes"] += length
+
+    def _recover(self) -> None:
+        """Rebuild the in-memory index from index files and the active segment."""
+        segment_ids = sorted(
+            int(name[len("segment-"):-len(".log")]) for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".log")
+        )
+        if not segment_ids:
+            self._open_segment(1)
+            return
+
+        active_id = segment_ids[-1]
+        for segment_id in segment_ids:
+            path = self._segment_path(segment_id)
+            self._segments[segment_id] = {"fd": os.open(path, os.O_RDONLY), "size": os.path.getsize(path), "live_bytes": 0}
+
+            index_path = self._index_path(segment_id)
+            if segment_id != active_id and os.path.exists(index_path):
+                with open(index_path) as f:
+                    entries = [json.loads(line) for line in f]
+                # Index files written before meta was recorded are rebuilt by the scan below
+                if all(len(entry) == 6 for entry in entries):
+                    for key, offset, length, timestamp, deleted, meta in entries:
+                        self._apply(segment_id, key, offset, length, timestamp, deleted, meta)
+                    continue
+
+            end = 0
+            for offset, length, payload in self._scan(segment_id):
+                self._apply(segment_id, payload["k"], offset, length, payload.get("t"), "d" in payload,
+                            self._meta(payload))
+                end = offset + length
+            if end < self._segments[segment_id]["size"]:
+                print(f"Warning: Truncating {self._segments[segment_id]['size'] - end} bytes of torn records from {path}")
+                os.truncate(path, end)
+                self._segments[segment_id]["size"] = end
+            if segment_id != active_id:
+                self._write_segment_index(segment_id)
+
+        os.close(self._segments[active_id]["fd"])
+        del self._segments[active_id]
+        live_bytes = sum(location[2] for location in self._index.values() if location[0] == active_id)
+        self._open_segment(active_id)
+        self._segments[active_id]["live_bytes"] = live_bytes
+
+    def _compaction_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compacting segment log {self.directory}: {e}")
@@ -0,0 +1,371 @@
+# utils/storage/sqlite_backend.py
+
+from typing import Dict, Any, List, Optional, Iterator, Set, Tuple
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from utils.storage.base import StorageBackend
+from utils.storage.delta import DELTA_COMPACT_EVERY, apply_delta, build_hashes
+from utils.storage.inverted_index import tokenize, conversation_text
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite storage in WAL mode.
+
+    Conversations, agent memory and shared memory live in indexed tables of
+    a single database file, so startup reads only what it asks for (the
+    newest conversations come straight off the timestamp index) and every
+    write is a transaction. Conversation text is kept in an FTS5 table,
+    updated in the same transaction, for BM25-ranked search. WAL lets several worker processes read while
+    one writes, and writers wait on the busy timeout instead of failing.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str = "./memory/memory.db"):
+        """
+        Initialize the SQLite backend.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        # (seq, payload hash) of the delta rows per (agent, memory type) that
+        # this process loaded or appended since the last full rewrite; their
+        # items are already in its copy. The hash tells a row apart from a
+        # later one that reused its seq after the rows were deleted
+        self._delta_rows: Dict[Tuple[str, str], Set[Tuple[int, int]]] = {}
+        self._delta_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            # seq is an explicit rowid so the full-text index can key on it (VACUUM keeps it stable)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    user_id TEXT,
+                    timestamp TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+            if "user_id" not in columns:
+                conn.execute("ALTER TABLE conversations ADD COLUMN user_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, timestamp)")
+
+            # The owner column lets a user-scoped search intersect doclists inside FTS5
+            fts_columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations_fts)")}
+            if fts_columns and "owner" not in fts_columns:
+                conn.execute("DROP TABLE conversations_fts")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(body, owner)")
+            if fts_columns != {"body", "owner"}:
+                # Index conversations stored before the current full-text schema
+                for seq, payload in conn.execute("SELECT seq, payload FROM conversations").fetchall():
+                    conversation = json.loads(payload)
+                    conn.execute(
+                        "INSERT INTO conversations_fts (rowid, body, owner) VALUES (?, ?, ?)",
+                        (seq, conversation_text(conversation), conversation.get("user_id") or "")
+                    )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS agent_memory (
+                    agent_name TEXT NOT NULL,
+                    memory_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (agent_name, memory_type)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_memory_type ON agent_memory (memory_type)")
+            # Items appended to keyed-list memory since its row was last rewritten
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS agent_memory_delta (
+                    seq INTEGER PRIMARY KEY,
+                    agent_name TEXT NOT NULL,
+                    memory_type TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_agent_memory_delta ON agent_memory_delta (agent_name, memory_type)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_memory (
+                    memory_type TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Counters kept in the same transaction as the rows they count,
+            # so reading one doesn't scan the table
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO metadata (key, value) "
+                "SELECT 'conversation_count', COUNT(*) FROM conversations"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection (sqlite3 connections aren't shareable across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_agent_memories(self) -> Dict[str, Dict[str, Any]]:
+        memories = {}
+        rows = self._connection().execute("SELECT agent_name, memory_type, payload FROM agent_memory")
+        for agent_name, memory_type, payload in rows:
+            memories.setdefault(agent_name, {})[memory_type] = json.loads(payload)
+
+        # Replay appends made since each memory type was last saved in full
+        hashes, seen = {}, {}
+        rows = self._connection().execute(
+            "SELECT seq, agent_name, memory_type, payload FROM agent_memory_delta ORDER BY seq"
+        )
+        for seq, agent_name, memory_type, payload in rows:
+            memory = memories.setdefault(agent_name, {}).setdefault(memory_type, {})
+            key = (agent_name, memory_type)
+            if key not in hashes:
+                hashes[key] = build_hashes(memory)
+            apply_delta(memory, json.loads(payload), hashes[key])
+            seen.setdefault(key, set()).add((seq, hash(payload)))
+        with self._delta_lock:
+            self._delta_rows = seen
+        return memories
+
+    def save_agent_memory(self, agent_name: str, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        conn = self._connection()
+        try:
+            with conn:
+                # Take the write lock first, so no other worker can append a
+                # delta between reading the deltas and deleting them
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute(
+                    "SELECT seq, payload FROM agent_memory_delta WHERE agent_name = ? AND memory_type = ? "
+                    "ORDER BY seq",
+                    (agent_name, memory_type)
+                ).fetchall()
+                with self._delta_lock:
+                    seen = self._delta_rows.get((agent_name, memory_type), set())
+                    # Other workers' appends aren't in this process's copy. Only those
+                    # are folded in, so items this process removed stay removed
+                    unseen = [payload for seq, payload in rows if (seq, hash(payload)) not in seen]
+                if unseen:
+                    memory_data = json.loads(json.dumps(memory_data))
+                    hashes = build_hashes(memory_data)
+                    for payload in unseen:
+                        apply_delta(memory_data, json.loads(payload), hashes)
+                conn.execute(
+                    "INSERT OR REPLACE INTO agent_memory (agent_name, memory_type, payload, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (agent_name, memory_type, json.dumps(memory_data), time.time())
+                )
+                # The full row supersedes the deltas it now includes, in the same transaction
+                conn.execute(
+                    "DELETE FROM agent_memory_delta WHERE agent_name = ? AND memory_type = ?",
+                    (agent_name, memory_type)
+                )
+            with self._delta_lock:
+                self._delta_rows.pop((agent_name, memory_type), None)
+        except Exception as e:
+            print(f"Error saving agent memory {agent_name}/{memory_type}: {e}")
+
+    def append_agent_memory(self, agent_name: str, memory_type: str, delta: Dict[str, List[Any]],
+                            memory_data: Dict[str, Any]) -> None:
+        key = (agent_name, memory_type)
+        with self._delta_lock:
+            count = len(self._delta_rows.get(key, ()))
+        if count >= DELTA_COMPACT_EVERY:
+            self.save_agent_memory(agent_name, memory_type, memory_data)
+            return
+
+        conn = self._connection()
+        payload = json.dumps(delta)
+        try:
+            with conn:
+                seq = conn.execute(
+                    "INSERT INTO agent_memory_delta (agent_name, memory_type, payload) VALUES (?, ?, ?)",
+                    (agent_name, memory_type, payload)
+                ).lastrowid
+            with self._delta_lock:
+                self._delta_rows.setdefault(key, set()).add((seq, hash(payload)))
+        except Exception as e:
+            print(f"Error appending agent memory {agent_name}/{memory_type}: {e}")
+
+    def delete_agent_memory(self, agent_name: Optional[str] = None, memory_type: Optional[str] = None) -> None:
+        conditions, params = [], []
+        if agent_name:
+            conditions.append("agent_name = ?")
+            params.append(agent_name)
+        if memory_type:
+            conditions.append("memory_type = ?")
+            params.append(memory_type)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._connection()
+        with conn:
+            conn.execute(f"DELETE FROM agent_memory{where}", params)
+            conn.execute(f"DELETE FROM agent_memory_delta{where}", params)
+        with self._delta_lock:
+            self._delta_rows = {}
+
+    def load_shared_memories(self) -> Dict[str, Any]:
+        rows = self._connection().execute("SELECT memory_type, payload FROM shared_memory")
+        return {memory_type: json.loads(payload) for memory_type, payload in rows}
+
+    def save_shared_memory(self, memory_type: str, memory_data: Dict[str, Any]) -> None:
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_memory (memory_type, payload, updated_at) VALUES (?, ?, ?)",
+                    (memory_type, json.dumps(memory_data), time.time())
+                )
+        except Exception as e:
+            print(f"Error saving shared memory {memory_type}: {e}")
+
+    def save_conversation(self, conversation: Dict[str, Any]) -> None:
+        conn = self._connection()
+        try:
+            with conn:
+                payload = json.dumps(conversation)
+                row = conn.execute("SELECT seq FROM conversations WHERE id = ?", (conversation["id"],)).fetchone()
+                user_id = conversation.get("user_id")
+                if row:
+                    seq = row[0]
+                    conn.execute(
+                        "UPDATE conversations SET user_id = ?, timestamp = ?, payload = ? WHERE seq = ?",
+                        (user_id, conversation["timestamp"], payload, seq)
+                    )
+                    conn.execute("DELETE FROM conversations_fts WHERE rowid = ?", (seq,))
+                else:
+                    seq = conn.execute(
+                        "INSERT INTO conversations (id, user_id, timestamp, payload) VALUES (?, ?, ?, ?)",
+                        (conversation["id"], user_id, conversation["timestamp"], payload)
+                    ).lastrowid
+                    conn.execute("UPDATE metadata SET value = value + 1 WHERE key = 'conversation_count'")
+                conn.execute(
+                    "INSERT INTO conversations_fts (rowid, body, owner) VALUES (?, ?, ?)",
+                    (seq, conversation_text(conversation), user_id or "")
+                )
+        except Exception as e:
+            print(f"Error saving conversation {conversation['id']}: {e}")
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT seq FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if not row:
+                return False
+            conn.execute("DELETE FROM conversations_fts WHERE rowid = ?", (row[0],))
+            conn.execute("DELETE FROM conversations WHERE seq = ?", (row[0],))
+            conn.execute("UPDATE metadata SET value = value - 1 WHERE key = 'conversation_count'")
+        return True
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT payload FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent_conversations(self, limit: int) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT payload FROM conversations ORDER BY timestamp DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        # A dedicated cursor streams rows instead of materializing the table
+        for (payload,) in self._connection().execute("SELECT payload FROM conversations"):
+            yield json.loads(payload)
+
+    def search_conversations(self, query: str, limit: int = 5, offset: int = 0,
+                             user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Quote each term so user input can't inject FTS5 query syntax; any term may match
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = "body : (" + " OR ".join(f'"{term}"' for term in terms) + ")"
+        where, params = "conversations_fts MATCH ?", []
+        if user_id is not None:
+            # The owner phrase narrows the match inside FTS5; the column check makes it exact
+            match = f'owner : "{_quote(user_id)}" AND {match}'
+            where += " AND c.user_id = ?"
+            params.append(user_id)
+        rows = self._connection().execute(
+            "SELECT c.payload FROM conversations_fts "
+            "JOIN conversations c ON c.seq = conversations_fts.rowid "
+            f"WHERE {where} ORDER BY bm25(conversations_fts, 1.0, 0.0) LIMIT ? OFFSET ?",
+            (match, *params, limit, offset)
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def list_conversations(self, user_id: Optional[str] = None, limit: int = 20,
+                           offset: int = 0) -> List[Dict[str, Any]]:
+        if user_id is None:
+            rows = self._connection().execute(
+                "SELECT payload FROM conversations ORDER BY timestamp DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT payload FROM conversations WHERE user_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                (user_id, limit, offset)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def user_conversation_ids(self, user_id: str) -> List[str]:
+        rows = self._connection().execute("SELECT id FROM conversations WHERE user_id = ?", (user_id,))
+        return [conversation_id for (conversation_id,) in rows]
+
+    def count_conversations(self) -> int:
+        return self._connection().execute(
+            "SELECT value FROM metadata WHERE key = 'conversation_count'"
+        ).fetchone()[0]
+
+    def conversation_ids(self) -> List[str]:
+        return [conversation_id for (conversation_id,) in self._connection().execute("SELECT id FROM conversations")]
+
+    def conversation_entries(self) -> List[Tuple[str, str, Optional[str], int]]:
+        return self._connection().execute(
+            "SELECT timestamp, id, user_id, length(payload) FROM conversations ORDER BY timestamp, id"
+        ).fetchall()
+
+    def collect_garbage(self) -> None:
+        # Fold the WAL back into the database and shrink it, then let
+        # incremental vacuum return free pages if the database allows it
+        conn = self._connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def disk_usage(self) -> int:
+        conn = self._connection()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        wal_path = self.db_path + "-wal"
+        return page_count * page_size + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _quote(value: str) -> str:
+    """Escape a value for use inside an FTS5 double-quoted string."""
+    return value.replace('"', '""')
@@ -0,0 +1,210 @@
+# utils/storage/vector_index.py
+
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+
+import numpy as np
+
+
+class VectorIndex:
+    """
+    Approximate nearest-neighbour index over unit-length float32 vectors.
+
+    Vectors live contiguously in one growable float32 matrix; deletes move
+    the last row into the freed slot, so the matrix never has holes. Below
+    train_threshold vectors every query is an exact matrix product. Above
+    it, the index trains an inverted-file (IVF) layer: k-means centroids
+    partition the vectors into lists, and a query only scores the lists of
+    its nprobe nearest centroids. List membership is a per-row int32
+    array, so gathering candidates is one vectorised mask. New vectors
+    join their nearest list immediately, and the centroids are retrained
+    once the index has grown fourfold since the last training.
+    """
+
+    def __init__(self, dim: int, nprobe: int = 16, train_threshold: int = 20000,
+                 max_lists: int = 4096, initial_capacity: int = 1024):
+        """
+        Initialize the vector index.
+
+        Args:
+            dim (int): Vector dimensionality
+            nprobe (int): Number of IVF lists scored per query
+            train_threshold (int): Vector count at which the IVF layer is first trained
+            max_lists (int): Upper bound on the number of IVF lists (about sqrt(n) are used)
+            initial_capacity (int): Initial number of rows in the vector matrix
+        """
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.max_lists = max_lists
+
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(initial_capacity, dtype=np.int32)
+        self._trained_size = 0
+
+    def add(self, doc_id: str, vector: np.ndarray) -> None:
+        """Add a vector, replacing any previous vector with the same ID."""
+        self.add_batch([doc_id], vector.reshape(1, -1))
+
+    def add_batch(self, doc_ids: List[str], vectors: np.ndarray) -> None:
+        """Add several vectors at once."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for doc_id in doc_ids:
+                self.remove(doc_id)
+
+            start = len(self._ids)
+            self._reserve(start + len(doc_ids))
+            self._vectors[start:start + len(doc_ids)] = vectors
+            for offset, doc_id in enumerate(doc_ids):
+                self._slots[doc_id] = start + offset
+                self._ids.append(doc_id)
+
+            if self._centroids is not None:
+                self._assignments[start:start + len(doc_ids)] = self._nearest_lists(vectors)
+
+            size = len(self._ids)
+            if size >= self.train_threshold and (self._centroids is None or size >= 4 * self._trained_size):
+                self._train()
+
+    def remove(self, doc_id: str) -> bool:
+        """Remove a vector by ID. Returns False if it wasn't indexed."""
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None:
+                return False
+
+            last = len(self._ids) - 1
+            if slot != last:
+                # Move the last row into the freed slot
+                moved_id = self._ids[last]
+                self._vectors[slot] = self._vectors[last]
+                self._assignments[slot] = self._assignments[last]
+                self._ids[slot] = moved_id
+                self._slots[moved_id] = slot
+
+            self._ids.pop()
+            return True
+
+    def search(self, vector: np.ndarray, limit: int = 5, offset: int = 0,
+               doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Find the vectors most similar to a query vector.
+
+        Args:
+            vector (np.ndarray): Unit-length query vector
+            limit (int): Maximum number of results
+            offset (int): Number of top results to skip, for pagination
+            doc_ids (Optional[Iterable[str]]): Only consider these documents
+                (scored exactly, without the IVF layer)
+
+        Returns:
+            List[Tuple[str, float]]: (doc_id, cosine similarity) pairs, best first
+        """
+        k = offset + limit
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or k <= 0:
+                return []
+
+            if doc_ids is not None:
+                candidates = np.fromiter(
+                    (self._slots[doc_id] for doc_id in doc_ids if doc_id in self._slots), dtype=np.int64
+                )
+                if candidates.size == 0:
+                    return []
+                scores = self._vectors[candidates] @ vector
+            elif self._centroids is None:
+                candidates = None
+                scores = self._vectors[:size] @ vector
+            else:
+                probed = np.zeros(len(self._centroids), dtype=bool)
+                probed[np.argsort(self._centroids @ vector)[::-1][:self.nprobe]] = True
+                candidates = np.flatnonzero(probed[self._assignments[:size]])
+                if candidates.size == 0:
+                    return []
+                scores = self._vectors[candidates] @ vector
+
+            k = min(k, scores.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])][offset:]
+            slots = top if candidates is None else candidates[top]
+            return [(self._ids[slot], float(score)) for slot, score in zip(slots, scores[top])]
+
+    def save(self, path: str) -> None:
+        """Write the vectors and IDs to an .npz file atomically."""
+        with self._lock:
+            size = len(self._ids)
+            vectors = self._vectors[:size].copy()
+            ids = np.array(self._ids, dtype=str)
+
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, vectors=vectors, ids=ids)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "VectorIndex":
+        """Load an index written by save(); the IVF layer is retrained as needed."""
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            ids = [str(doc_id) for doc_id in data["ids"]]
+        index = cls(vectors.shape[1], **kwargs)
+        if ids:
+            index.add_batch(ids, vectors)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def doc_ids(self) -> List[str]:
+        """Return the IDs of every indexed vector."""
+        with self._lock:
+            return list(self._ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slots
+
+    def _reserve(self, size: int) -> None:
+        """Grow the matrix (doubling) to hold at least size rows."""
+        capacity = self._vectors.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self._ids)] = self._vectors[:len(self._ids)]
+        self._vectors = vectors
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:len(self._ids)] = self._assignments[:len(self._ids)]
+        self._assignments = assignments
+
+    def _nearest_lists(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1)
+
+    def _train(self, iterations: int = 8, sample_per_list: int = 32) -> None:
+        """Train IVF centroids with spherical k-means and reassign every vector."""
+        size = len(self._ids)
+        num_lists = int(min(self.max_lists, max(1, np.sqrt(size))))
+        rng = np.random.default_rng(0)
+
+        sample = self._vectors[rng.choice(size, size=min(size, num_lists * sample_per_list), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=num_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Lists that attracted no vectors keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        self._centroids = centroids.astype(np.float32)
+        for start in range(0, size, 65536):
+            end = min(size, start + 65536)
+            self._assignments[start:end] = self._nearest_lists(self._vectors[start:end])
+        self._trained_size = size
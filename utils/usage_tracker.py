@@ -0,0 +1,266 @@
+# utils/usage_tracker.py
+
+from typing import Dict, Any, Optional, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+
+# Approximate list prices in USD per 1K tokens (prompt, completion).
+# TxGemma runs on our own Vertex endpoint, so it has no per-token price;
+# its cost shows up as endpoint time, which is tracked through latency.
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+# Usage record for the request currently being processed
+_current_request: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_request_usage", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) for APIs that don't report usage."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a call from the pricing table."""
+    # Match on the longest known prefix so "gpt-4-0613" is priced as "gpt-4"
+    prices = None
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(name):
+            prices = MODEL_PRICING[name]
+            break
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000.0
+
+
+def _empty_rollup() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cost_usd": 0.0,
+        "latency_seconds": 0.0
+    }
+
+
+def _add_to_rollup(rollup: Dict[str, Any], call: Dict[str, Any]) -> None:
+    rollup["calls"] += 1
+    rollup["prompt_tokens"] += call["prompt_tokens"]
+    rollup["completion_tokens"] += call["completion_tokens"]
+    rollup["total_tokens"] += call["prompt_tokens"] + call["completion_tokens"]
+    rollup["cost_usd"] = round(rollup["cost_usd"] + call["cost_usd"], 6)
+    rollup["latency_seconds"] = round(rollup["latency_seconds"] + call["latency_seconds"], 4)
+
+
+class UsageTracker:
+    """
+    Records prompt/completion tokens, cost and latency for every LLM call.
+
+    Calls are attributed to the request currently in flight (tracked with a
+    context variable so nested agents don't need the request passed in) and
+    rolled up per agent and per user. Only the rollups are persisted, and only
+    when they have changed and the flush interval has elapsed.
+    """
+
+    def __init__(self, storage_dir: str = "./memory/usage", flush_interval: float = 30.0):
+        """
+        Initialize the usage tracker.
+
+        Args:
+            storage_dir (str): Directory where usage rollups are persisted
+            flush_interval (float): Minimum seconds between rollup writes
+        """
+        self.storage_dir = storage_dir
+        self.flush_interval = flush_interval
+        self.rollup_path = os.path.join(storage_dir, "usage_rollups.json")
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.time()
+        self.rollups = {
+            "agents": {},
+            "users": {},
+            "totals": _empty_rollup()
+        }
+
+        self._load_rollups()
+        atexit.register(self.flush)
+
+    def _load_rollups(self):
+        """Load persisted rollups so totals survive restarts."""
+        if not os.path.exists(self.rollup_path):
+            return
+        try:
+            with open(self.rollup_path, 'r') as f:
+                stored = json.load(f)
+            for section in ("agents", "users"):
+                self.rollups[section].update(stored.get(section, {}))
+            if "totals" in stored:
+                self.rollups["totals"] = stored["totals"]
+        except Exception as e:
+            print(f"Warning: Could not load usage rollups from {self.rollup_path}: {e}")
+
+    def start_request(self, request_id: Optional[str] = None, user_id: Optional[str] = None) -> str:
+        """
+        Begin accounting for a new request in the current context.
+
+        Args:
+            request_id (Optional[str]): Identifier for the request; generated if omitted
+            user_id (Optional[str]): The user the request is billed to
+
+        Returns:
+            str: The request ID
+        """
+        request_id = request_id or str(uuid.uuid4())
+        _current_request.set({
+            "request_id": request_id,
+            "user_id": user_id,
+            "calls": []
+        })
+        return request_id
+
+    def end_request(self) -> Dict[str, Any]:
+        """
+        Finish the current request and fold its calls into the rollups.
+
+        Returns:
+            Dict[str, Any]: Per-request usage summary, broken down by agent
+        """
+        request = _current_request.get()
+        _current_request.set(None)
+        if request is None:
+            return {}
+
+        summary = self._summarize(request)
+
+        with self._lock:
+            user_key = request["user_id"] or "anonymous"
+            for call in request["calls"]:
+                _add_to_rollup(self.rollups["agents"].setdefault(call["agent"], _empty_rollup()), call)
+                _add_to_rollup(self.rollups["users"].setdefault(user_key, _empty_rollup()), call)
+                _add_to_rollup(self.rollups["totals"], call)
+            if request["calls"]:
+                self._dirty = True
+
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+        return summary
+
+    def record(self, agent: str, model: str, prompt_tokens: int, completion_tokens: int,
+               latency_seconds: float, estimated: bool = False) -> None:
+        """
+        Record a single LLM call against the current request.
+
+        Args:
+            agent (str): Component that made the call (e.g. 'router', 'synthesis')
+            model (str): Model name used for the call
+            prompt_tokens (int): Tokens sent to the model
+            completion_tokens (int): Tokens generated by the model
+            latency_seconds (float): Wall-clock duration of the call
+            estimated (bool): Whether token counts are local estimates
+        """
+        call = {
+            "agent": agent,
+            "model": model,
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens),
+            "latency_seconds": round(latency_seconds, 4),
+            "estimated": estimated
+        }
+
+        request = _current_request.get()
+        if request is not None:
+            request["calls"].append(call)
+        else:
+            # Calls outside a request (e.g. standalone scripts) still count globally
+            with self._lock:
+                _add_to_rollup(self.rollups["agents"].setdefault(agent, _empty_rollup()), call)
+                _add_to_rollup(self.rollups["totals"], call)
+                self._dirty = True
+
+    @contextmanager
+    def track_openai_call(self, agent: str, model: str) -> Iterator[None]:
+        """
+        Record token usage for LangChain OpenAI calls made inside the block.
+
+        Args:
+            agent (str): Component making the call
+            model (str): Model name used for the call
+        """
+        try:
+            from langchain.callbacks import get_openai_callback
+        except ImportError:
+            get_openai_callback = None
+
+        start_time = time.time()
+        if get_openai_callback is None:
+            yield
+            self.record(agent, model, 0, 0, time.time() - start_time, estimated=True)
+            return
+
+        with get_openai_callback() as cb:
+            yield
+        self.record(agent, model, cb.prompt_tokens, cb.completion_tokens, time.time() - start_time)
+
+    def get_rollups(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get aggregated usage per agent, per user and overall.
+
+        Args:
+            user_id (Optional[str]): If given, the per-user breakdown holds only this user
+
+        Returns:
+            Dict[str, Any]: A copy of the current rollups
+        """
+        with self._lock:
+            rollups = json.loads(json.dumps(self.rollups))
+        if user_id is not None:
+            rollups["users"] = {user_id: rollups["users"].get(user_id, _empty_rollup())}
+        return rollups
+
+    def flush(self) -> None:
+        """Persist the rollups if they have changed since the last write."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self.rollups, indent=2)
+            self._dirty = False
+            self._last_flush = time.time()
+
+        try:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            tmp_path = self.rollup_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.rollup_path)
+        except Exception as e:
+            print(f"Error saving usage rollups to {self.rollup_path}: {e}")
+
+    def _summarize(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the per-request usage summary returned to the caller."""
+        summary = {
+            "request_id": request["request_id"],
+            "agents": {},
+            **_empty_rollup()
+        }
+        for call in request["calls"]:
+            _add_to_rollup(summary["agents"].setdefault(call["agent"], _empty_rollup()), call)
+            _add_to_rollup(summary, call)
+        return summary
+
+
+# Create a global instance of the usage tracker
+usage_tracker = UsageTracker()